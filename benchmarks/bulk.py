@@ -0,0 +1,51 @@
+"""Bulk parsing benchmark
+
+Compares parsing a generated frame log with :mod:`pysaleryd.bulk` to decoding
+each frame with ``Message.decode`` and ``SystemProperty.from_str``. Run with
+``python benchmarks/bulk.py``.
+"""
+
+import argparse
+import random
+import time
+
+from pysaleryd.bulk import DEFAULT_CHUNK_SIZE, parse_frame_log
+from pysaleryd.data import Message, SystemProperty
+
+FRAMES = (
+    "#MF: {}+ 0+ 3+30\r",
+    "#*TC: {}.5+ 0+ 100+0\r",
+    "#IA: {}+0+10\r",
+    "#$MB: {}\r",
+    "#*SC: 4.1.{}\r",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    frames = [
+        random.choice(FRAMES).format(random.randint(0, 30)) for _ in range(args.frames)
+    ]
+    data = "".join(frames).encode()
+
+    started = time.perf_counter()
+    parse_frame_log(data, args.chunk_size)
+    bulk = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for frame in frames:
+        message = Message.decode(frame)
+        SystemProperty.from_str(message.key, message.payload)
+    single = time.perf_counter() - started
+
+    print(f"{'parser':<10}{'seconds':>10}{'frames/s':>14}")
+    for name, seconds in (("bulk", bulk), ("per frame", single)):
+        print(f"{name:<10}{seconds:>10.2f}{args.frames / seconds:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
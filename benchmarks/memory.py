@@ -0,0 +1,68 @@
+"""Memory benchmark for decoded messages and connection state
+
+Measures memory allocated per decoded frame and per connected unit using
+:mod:`tracemalloc`. Run with ``python benchmarks/memory.py``.
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+
+from pysaleryd.const import DataKey
+from pysaleryd.data import Message, SystemProperty
+from pysaleryd.helpers.connection import Connection
+
+FRAMES = [
+    f"#{key}: {i % 10}+ 0+ 10+{i % 3}\r"
+    for i, key in enumerate(k for k in DataKey if k != DataKey.NONE)
+]
+
+
+def measure(func, count: int) -> float:
+    """Return bytes allocated per item by func"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        keep = func(count)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del keep
+    return (after - before) / count
+
+
+def decode_frames(count: int) -> list:
+    return [Message.decode(FRAMES[i % len(FRAMES)]) for i in range(count)]
+
+
+def parse_properties(count: int) -> list:
+    messages = decode_frames(count)
+    return [SystemProperty.from_message(m) for m in messages]
+
+
+def connected_units(count: int) -> list:
+    async def create() -> list:
+        connections = []
+        for i in range(count):
+            connection = Connection(f"10.0.{i // 256}.{i % 256}", 3001)
+            for frame in FRAMES:
+                await connection._on_message(frame)
+            connections.append(connection)
+        return connections
+
+    return asyncio.run(create())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=100_000)
+    parser.add_argument("--units", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"Message per frame:        {measure(decode_frames, args.frames):8.1f} B")
+    print(f"SystemProperty per frame: {measure(parse_properties, args.frames):8.1f} B")
+    print(f"Connection per unit:      {measure(connected_units, args.units):8.1f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Transport benchmark for websocket options and event loops
+
+Streams tiny frames, like the ones sent by the unit, from a local server
+running in a separate process, and measures client CPU time per frame and
+latency from send to receive for each transport profile and event loop. Run
+with ``python benchmarks/transport.py``.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from websockets.asyncio.server import serve
+
+from pysaleryd.helpers.transport import TransportOptions, new_event_loop, run
+from pysaleryd.helpers.websocket import ReconnectingWebsocketClient
+
+PROFILES = {
+    "tuned": TransportOptions(),
+    "library-defaults": TransportOptions.library_defaults(),
+}
+
+
+def serve_frames(port: int, frames: int, rate: int, ready) -> None:
+    """Send frames stamped with monotonic time at rate on each connection"""
+
+    async def handler(ws) -> None:
+        await ws.recv()
+        burst = max(1, rate // 100)
+        for i in range(frames):
+            await ws.send(f"#MF: {time.monotonic_ns()}\r")
+            if not (i + 1) % burst:
+                await asyncio.sleep(0.01)
+        await ws.wait_closed()
+
+    async def main() -> None:
+        async with serve(handler, "127.0.0.1", port, compression="deflate"):
+            ready.set()
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+async def receive(port: int, frames: int, transport: TransportOptions) -> tuple:
+    """Receive frames, return CPU seconds per frame and latencies in ms"""
+    latencies = []
+    done = asyncio.Event()
+
+    async def on_message(message: str) -> None:
+        latencies.append((time.monotonic_ns() - int(message[5:-1])) / 1e6)
+        if len(latencies) == frames:
+            done.set()
+
+    async def on_connect() -> None:
+        await client.send("#:\r")
+
+    client = ReconnectingWebsocketClient(
+        "127.0.0.1", port, on_message, on_connect=on_connect, transport=transport
+    )
+    started = time.process_time()
+    async with client:
+        await done.wait()
+    return (time.process_time() - started) / frames, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=50_000)
+    parser.add_argument("--rate", type=int, default=5_000, help="frames per second")
+    parser.add_argument("--port", type=int, default=3099)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=serve_frames,
+        args=(args.port, args.frames, args.rate, ready),
+        daemon=True,
+    )
+    server.start()
+    ready.wait()
+
+    loops = ["asyncio"]
+    if type(new_event_loop(True)).__module__.startswith("uvloop"):
+        loops.append("uvloop")
+    try:
+        print(f"{'profile':<18}{'loop':<9}{'CPU/frame':>12}{'p50':>10}{'p99':>10}")
+        for name, transport in PROFILES.items():
+            for loop in loops:
+                cpu, latencies = run(
+                    receive(args.port, args.frames, transport), loop == "uvloop"
+                )
+                p50, p99 = (statistics.quantiles(latencies, n=100)[i] for i in (49, 98))
+                print(
+                    f"{name:<18}{loop:<9}{cpu * 1e6:>9.1f} us"
+                    f"{p50:>7.2f} ms{p99:>7.2f} ms"
+                )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
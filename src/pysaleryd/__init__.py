@@ -1,16 +1,16 @@
-import sys
+def __getattr__(name: str) -> str:
+    # Resolve version lazily, importing importlib.metadata is slow enough to
+    # be noticeable in the start up time of the command line interface
+    if name != "__version__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-if sys.version_info[:2] >= (3, 8):
-    # TODO: Import directly (no need for conditional) when `python_requires = >= 3.8`
-    from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
-else:
-    from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
+    from importlib.metadata import PackageNotFoundError, version
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = __name__
-    __version__ = version(dist_name)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = "unknown"
-finally:
-    del version, PackageNotFoundError
+    try:
+        # Change here if project is renamed and does not equal the package name
+        dist_name = __name__
+        __version__ = version(dist_name)
+    except PackageNotFoundError:  # pragma: no cover
+        __version__ = "unknown"
+    globals()["__version__"] = __version__
+    return __version__
@@ -0,0 +1,6 @@
+"""Run command line interface with ``python -m pysaleryd``"""
+
+from .cli import run
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,317 @@
+"""Incremental rolling aggregates of numeric values"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from .const import DataKey
+from .data import SystemProperty
+
+if TYPE_CHECKING:
+    from .client import Client
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+DEFAULT_AGGREGATE_KEYS: frozenset[DataKey] = frozenset(
+    {
+        DataKey.AIR_TEMPERATURE_AT_HEATER,
+        DataKey.AIR_TEMPERATURE_SUPPLY,
+        DataKey.FAN_SPEED_EXHAUST,
+        DataKey.FAN_SPEED_SUPPLY,
+        DataKey.HEAT_EXCHANGER_ROTOR_PERCENT,
+        DataKey.HEAT_EXCHANGER_ROTOR_RPM,
+        DataKey.HEATER_POWER_PERCENT,
+    }
+)
+"""Keys aggregated by default"""
+
+DEFAULT_WINDOWS: tuple[float, ...] = (60, 300, 3600)
+"""Window lengths in seconds aggregated by default"""
+
+
+class WindowStats:
+    """Statistics of a key over a window"""
+
+    __slots__ = ("key", "window", "start", "end", "count", "mean", "min", "max")
+
+    def __init__(
+        self,
+        key: DataKey,
+        window: float,
+        start: float,
+        end: float,
+        count: int,
+        total: float,
+        min_value: float,
+        max_value: float,
+    ) -> None:
+        self.key = key
+        self.window = window
+        self.start = start
+        self.end = end
+        self.count = count
+        self.mean = total / count if count else math.nan
+        self.min = min_value
+        self.max = max_value
+
+    def __repr__(self) -> str:
+        return (
+            f"WindowStats(key={self.key!r}, window={self.window}, "
+            f"count={self.count}, mean={self.mean}, min={self.min}, max={self.max})"
+        )
+
+
+class RollingWindow:
+    """Sliding window statistics kept in a ring of time buckets
+
+    Adding a value is constant time. The window slides one bucket at a time,
+    so values older than the window length are dropped with a resolution of
+    length / buckets.
+    """
+
+    __slots__ = ("length", "_width", "_ids", "_count", "_sum", "_min", "_max")
+
+    def __init__(self, length: float, buckets: int = 60) -> None:
+        """Initiate window
+
+        :param length: window length in seconds
+        :type length: float
+        :param buckets: number of buckets, defaults to 60
+        :type buckets: int, optional
+        """
+        self.length = length
+        self._width = length / buckets
+        self._ids = [-1] * buckets
+        self._count = [0] * buckets
+        self._sum = [0.0] * buckets
+        self._min = [math.inf] * buckets
+        self._max = [-math.inf] * buckets
+
+    def add(self, timestamp: float, value: float) -> None:
+        """Add value
+
+        :param timestamp: time of value
+        :type timestamp: float
+        :param value: value
+        :type value: float
+        """
+        bucket = int(timestamp // self._width)
+        slot = bucket % len(self._ids)
+        if self._ids[slot] != bucket:
+            self._ids[slot] = bucket
+            self._count[slot] = 1
+            self._sum[slot] = value
+            self._min[slot] = value
+            self._max[slot] = value
+            return
+        self._count[slot] += 1
+        self._sum[slot] += value
+        if value < self._min[slot]:
+            self._min[slot] = value
+        if value > self._max[slot]:
+            self._max[slot] = value
+
+    def stats(self, timestamp: float) -> tuple[int, float, float, float]:
+        """Statistics of values within window ending at timestamp
+
+        :param timestamp: end of window
+        :type timestamp: float
+        :return: count, sum, min and max
+        :rtype: tuple[int, float, float, float]
+        """
+        last = int(timestamp // self._width)
+        first = last - len(self._ids)
+        count, total, low, high = 0, 0.0, math.inf, -math.inf
+        for slot, bucket in enumerate(self._ids):
+            if first < bucket <= last:
+                count += self._count[slot]
+                total += self._sum[slot]
+                low = min(low, self._min[slot])
+                high = max(high, self._max[slot])
+        return count, total, low, high
+
+
+class _Tumbling:
+    """Statistics of the current aligned window, emitted when it ends"""
+
+    __slots__ = ("window_id", "count", "sum", "min", "max")
+
+    def __init__(self) -> None:
+        self.window_id = -1
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+
+class Aggregator:
+    """Rolling mean, min and max of numeric keys over several windows
+
+    Cost per update is constant for any window length. Aggregate records of
+    aligned windows are emitted to handlers when the first update after the
+    end of a window is received. Aggregates are of one unit, so an aggregator
+    is attached to one client.
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[DataKey] = DEFAULT_AGGREGATE_KEYS,
+        windows: Iterable[float] = DEFAULT_WINDOWS,
+        buckets: int = 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initiate aggregator
+
+        :param keys: keys to aggregate, defaults to DEFAULT_AGGREGATE_KEYS
+        :type keys: Iterable[DataKey], optional
+        :param windows: window lengths in seconds, defaults to DEFAULT_WINDOWS
+        :type windows: Iterable[float], optional
+        :param buckets: buckets per window, defaults to 60
+        :type buckets: int, optional
+        :param clock: time source, defaults to time.time
+        :type clock: Callable[[], float], optional
+        """
+        self._windows = tuple(windows)
+        self._clock = clock
+        self._rolling = {
+            key: {window: RollingWindow(window, buckets) for window in self._windows}
+            for key in keys
+        }
+        self._tumbling = {
+            key: {window: _Tumbling() for window in self._windows}
+            for key in self._rolling
+        }
+        self._handlers: set[Callable[[WindowStats], None]] = set()
+        self._client: Client | None = None
+
+    def attach(self, client: Client) -> None:
+        """Aggregate updates received by client
+
+        :param client: client
+        :type client: Client
+        :raises RuntimeError: if another client is attached
+        """
+        if self._client is not None:
+            raise RuntimeError("Aggregator is already attached to a client")
+        client.add_update_handler(self.add)
+        self._client = client
+
+    def detach(self, client: Client) -> None:
+        """Stop aggregating updates received by client
+
+        :param client: client
+        :type client: Client
+        """
+        if client is not self._client:
+            raise ValueError("Client is not attached to aggregator")
+        client.remove_update_handler(self.add)
+        self._client = None
+
+    def add_handler(self, handler: Callable[[WindowStats], None]) -> None:
+        """Add handler called with aggregate record when a window ends
+
+        :param handler: handler function. Must be safe to call from event loop
+        :type handler: Callable[[WindowStats], None]
+        """
+        self._handlers.add(handler)
+
+    def remove_handler(self, handler: Callable[[WindowStats], None]) -> None:
+        """Remove handler
+
+        :param handler: handler to remove
+        :type handler: Callable[[WindowStats], None]
+        """
+        self._handlers.remove(handler)
+
+    def add(self, key: DataKey, payload: str) -> None:
+        """Add update
+
+        :param key: key
+        :type key: DataKey
+        :param payload: payload
+        :type payload: str
+        """
+        if key not in self._rolling:
+            return
+        value = SystemProperty.from_str(key, payload).value
+        if isinstance(value, (int, float)):
+            self.add_value(key, float(value), self._clock())
+
+    def add_value(self, key: DataKey, value: float, timestamp: float) -> None:
+        """Add numeric value of key
+
+        :param key: key
+        :type key: DataKey
+        :param value: value
+        :type value: float
+        :param timestamp: time of value
+        :type timestamp: float
+        """
+        if (rolling := self._rolling.get(key)) is None:
+            return
+        tumbling = self._tumbling[key]
+        for window, rolling_window in rolling.items():
+            rolling_window.add(timestamp, value)
+            current = tumbling[window]
+            window_id = int(timestamp // window)
+            if window_id != current.window_id:
+                if current.count:
+                    self._emit(key, window, current)
+                current.window_id = window_id
+                current.count = 0
+                current.sum = 0.0
+                current.min = math.inf
+                current.max = -math.inf
+            current.count += 1
+            current.sum += value
+            if value < current.min:
+                current.min = value
+            if value > current.max:
+                current.max = value
+
+    def _emit(self, key: DataKey, window: float, current: _Tumbling) -> None:
+        if not self._handlers:
+            return
+        start = current.window_id * window
+        record = WindowStats(
+            key,
+            window,
+            start,
+            start + window,
+            current.count,
+            current.sum,
+            current.min,
+            current.max,
+        )
+        for handler in self._handlers:
+            try:
+                handler(record)
+            except Exception:
+                _LOGGER.exception("Failed to call handler %s", handler)
+
+    def get(
+        self, key: DataKey, window: float, timestamp: float | None = None
+    ) -> WindowStats | None:
+        """Get statistics of key over sliding window
+
+        :param key: key
+        :type key: DataKey
+        :param window: window length, one of windows
+        :type window: float
+        :param timestamp: end of window, defaults to now
+        :type timestamp: float | None, optional
+        :return: statistics, None if key or window is not aggregated
+        :rtype: WindowStats | None
+        """
+        try:
+            rolling_window = self._rolling[key][window]
+        except KeyError:
+            return None
+        end = self._clock() if timestamp is None else timestamp
+        count, total, low, high = rolling_window.stats(end)
+        if not count:
+            low = high = math.nan
+        return WindowStats(key, window, end - window, end, count, total, low, high)
@@ -0,0 +1,337 @@
+"""Vectorized parsing of recorded frames into NumPy arrays
+
+Frames are parsed in chunks with array operations instead of decoding each
+line with :meth:`~pysaleryd.data.Message.decode` and
+:meth:`~pysaleryd.data.SystemProperty.from_str`, so logs larger than memory
+can be streamed. Requires NumPy, install with ``pip install pysaleryd[numpy]``.
+
+Two layouts are read, also mixed in the same log:
+
+- plain frames, ``#MF: 1+ 0+ 2+30\\r``, one after the other
+- JSON lines written by ``pysaleryd record``, ``{"t": 1.5, "frame": "#MF: 1\\r"}``
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from typing import IO, TYPE_CHECKING, Iterator
+
+from .const import DataKey
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+"""Bytes parsed at a time, small enough for intermediate arrays to stay in
+cache"""
+
+_FIELDS = ("value", "min_value", "max_value", "extra")
+
+_CR, _LF = ord("\r"), ord("\n")
+_HASH, _COLON, _PLUS = ord("#"), ord(":"), ord("+")
+_QUOTE, _BACKSLASH, _COMMA, _BRACE = ord('"'), ord("\\"), ord(","), ord("{")
+_ACK = (ord("$"), ord("!"))
+_MAX_KEY_LENGTH = 8
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "NumPy is required to parse frames in bulk, "
+            "install with `pip install pysaleryd[numpy]`"
+        ) from e
+    return numpy
+
+
+class FrameColumns:
+    """Columns of the frames of one key
+
+    Values are parsed like :meth:`~pysaleryd.data.SystemProperty.from_str`,
+    missing or non numeric values are NaN.
+    """
+
+    __slots__ = ("index", "timestamp", *_FIELDS)
+
+    def __init__(
+        self,
+        index: np.ndarray,
+        timestamp: np.ndarray,
+        value: np.ndarray,
+        min_value: np.ndarray,
+        max_value: np.ndarray,
+        extra: np.ndarray,
+    ) -> None:
+        """Initiate columns
+
+        :param index: position of frames in log, int64
+        :type index: np.ndarray
+        :param timestamp: seconds since recording started, NaN for plain
+            frames, float64
+        :type timestamp: np.ndarray
+        :param value: value, float64
+        :type value: np.ndarray
+        :param min_value: min value, float64
+        :type min_value: np.ndarray
+        :param max_value: max value, float64
+        :type max_value: np.ndarray
+        :param extra: extra value, float64
+        :type extra: np.ndarray
+        """
+        self.index = index
+        self.timestamp = timestamp
+        self.value = value
+        self.min_value = min_value
+        self.max_value = max_value
+        self.extra = extra
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self) -> str:
+        return f"FrameColumns(frames={len(self)})"
+
+    @classmethod
+    def concatenate(cls, parts: list[FrameColumns]) -> FrameColumns:
+        """Join columns of consecutive chunks
+
+        :param parts: columns in log order
+        :type parts: list[FrameColumns]
+        :return: joined columns
+        :rtype: FrameColumns
+        """
+        np = _numpy()
+        return cls(
+            *(
+                np.concatenate([getattr(part, name) for part in parts])
+                for name in cls.__slots__
+            )
+        )
+
+
+def _parse_numbers(np, buf: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """Parse spans of buf as numbers, like ``SystemProperty.from_str``. Spans
+    that are not numeric are NaN"""
+    count = len(starts)
+    result = np.full(count, np.nan)
+    # Bytes of all spans laid out one span after the other
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    total = int(lengths.sum())
+    if total == 0:
+        return result
+    span = np.repeat(np.arange(count), lengths)
+    index = np.arange(total)
+    char = buf[index + np.repeat(starts - offsets, lengths)]
+
+    is_digit = (char >= 48) & (char <= 57)
+    is_dot = char == 46
+    is_space = (char == 32) | (char == 9)
+    n_digits = np.bincount(span[is_digit], minlength=count)
+    n_dots = np.bincount(span[is_dot], minlength=count)
+    n_other = np.bincount(span[~(is_digit | is_dot | is_space)], minlength=count)
+
+    # Surrounding whitespace is stripped, whitespace inside is not numeric
+    solid = np.flatnonzero(~is_space)
+    if len(solid) == 0:
+        return result
+    solid_span = span[solid]
+    n_solid = np.bincount(solid_span, minlength=count)
+    first = np.searchsorted(solid_span, np.arange(count))
+    last = np.minimum(first + n_solid - 1, len(solid) - 1)
+    width = solid[last] - solid[np.minimum(first, last)] + 1
+    valid = (n_digits > 0) & (n_dots <= 1) & (n_other == 0) & (width == n_solid)
+
+    # Mantissa of all digits, divided by ten to the power of fraction digits
+    digits = np.flatnonzero(is_digit)
+    digit_span = span[digits]
+    rank = np.arange(1, len(digits) + 1) - (np.cumsum(n_digits) - n_digits)[digit_span]
+    dot_count = np.cumsum(is_dot)
+    begin = np.minimum(offsets, total - 1)
+    dots_before = dot_count[begin] - is_dot[begin]
+    fraction = dot_count[digits] > dots_before[digit_span]
+    n_fraction = np.bincount(digit_span[fraction], minlength=count)
+    powers = 10.0 ** np.arange(n_digits.max() + 1)
+    weight = powers[n_digits[digit_span] - rank]
+    mantissa = np.bincount(digit_span, (char[digits] - 48) * weight, count)
+    result[valid] = mantissa[valid] / powers[n_fraction[valid]]
+    return result
+
+
+def _first_after(np, positions: np.ndarray, after: np.ndarray, before: np.ndarray):
+    """First of sorted positions at or after ``after`` and before ``before``,
+    -1 if none"""
+    if len(positions) == 0:
+        return np.full(len(after), -1, dtype=np.int64)
+    at = np.minimum(np.searchsorted(positions, after), len(positions) - 1)
+    found = positions[at]
+    return np.where((found >= after) & (found < before), found, -1)
+
+
+def _parse_chunk(
+    np, data: bytes, first_index: int
+) -> tuple[dict[DataKey, FrameColumns], int]:
+    """Parse complete lines of data, return columns and number of frames"""
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    # Lines end at CR or LF, empty lines are skipped
+    line_end = np.flatnonzero((buf == _CR) | (buf == _LF))
+    line_start = np.concatenate(([0], line_end[:-1] + 1))
+
+    # Frame starts at first # of line and ends at end of line, or at the
+    # closing quote or escaped CR of a JSON line
+    hashes = np.flatnonzero(buf == _HASH)
+    start = _first_after(np, hashes, line_start, line_end)
+    lines = np.flatnonzero(start >= 0)
+    start = start[lines]
+    end = line_end[lines]
+    closing = np.flatnonzero((buf == _QUOTE) | (buf == _BACKSLASH))
+    quoted = _first_after(np, closing, start, end)
+    end = np.where(quoted >= 0, quoted, end)
+
+    colons = np.flatnonzero(buf == _COLON)
+    colon = _first_after(np, colons, start, end)
+    keep = colon >= 0
+    lines, start, end, colon = lines[keep], start[keep], end[keep], colon[keep]
+
+    # Key codes are packed into integers and looked up once per distinct code
+    key_start = start + 1
+    if len(key_start):
+        key_start += np.isin(buf[np.minimum(key_start, len(buf) - 1)], _ACK)
+    key_length = colon - key_start
+    keep = (key_length >= 0) & (key_length <= _MAX_KEY_LENGTH)
+    lines, start, end, colon = lines[keep], start[keep], end[keep], colon[keep]
+    key_start, key_length = key_start[keep], key_length[keep]
+    code = np.zeros(len(lines), dtype=np.uint64)
+    for i in range(_MAX_KEY_LENGTH):
+        byte = buf[np.minimum(key_start + i, len(buf) - 1)].astype(np.uint64)
+        code |= np.where(i < key_length, byte, 0).astype(np.uint64) << np.uint64(8 * i)
+    codes, key_id = np.unique(code, return_inverse=True)
+    keys: list[DataKey | None] = []
+    for packed in codes.tolist():
+        text = packed.to_bytes(_MAX_KEY_LENGTH, "little").rstrip(b"\0")
+        try:
+            keys.append(DataKey(text.decode("ascii")))
+        except (UnicodeDecodeError, ValueError):
+            keys.append(None)
+
+    # Fields of payload are separated by +, missing fields stay NaN
+    pluses = np.flatnonzero(buf == _PLUS)
+    first_plus = np.searchsorted(pluses, colon)
+    n_pluses = np.searchsorted(pluses, end) - first_plus
+    padded = np.append(pluses, 0)
+    rows, span_starts, span_ends = [], [], []
+    for k in range(len(_FIELDS)):
+        present = np.flatnonzero(n_pluses >= k)
+        if k == 0:
+            field_start = colon + 1
+        else:
+            field_start = padded[np.minimum(first_plus + k - 1, len(pluses))] + 1
+        field_end = np.where(
+            n_pluses > k, padded[np.minimum(first_plus + k, len(pluses))], end
+        )
+        rows.append(present + k * len(lines))
+        span_starts.append(field_start[present])
+        span_ends.append(field_end[present])
+
+    # Timestamp of JSON lines is the first member, {"t": 1.5, ...
+    json_lines = np.flatnonzero(buf[line_start[lines]] == _BRACE)
+    line_colon = _first_after(
+        np, colons, line_start[lines[json_lines]], start[json_lines]
+    )
+    comma = _first_after(
+        np, np.flatnonzero(buf == _COMMA), line_colon + 1, start[json_lines]
+    )
+    timed = np.flatnonzero((line_colon >= 0) & (comma >= 0))
+    rows.append(json_lines[timed] + len(_FIELDS) * len(lines))
+    span_starts.append(line_colon[timed] + 1)
+    span_ends.append(comma[timed])
+
+    # All numbers of the chunk are parsed at once
+    numbers = np.full((len(_FIELDS) + 1) * len(lines), np.nan)
+    numbers[np.concatenate(rows)] = _parse_numbers(
+        np, buf, np.concatenate(span_starts), np.concatenate(span_ends)
+    )
+    *columns, timestamp = numbers.reshape(len(_FIELDS) + 1, len(lines))
+
+    # Index of frame in log, counting lines with a frame
+    index = first_index + np.arange(len(lines), dtype=np.int64)
+    order = np.argsort(key_id, kind="stable")
+    bounds = np.searchsorted(key_id[order], np.arange(len(keys) + 1))
+    result: dict[DataKey, FrameColumns] = {}
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        rows = order[bounds[i] : bounds[i + 1]]
+        result[key] = FrameColumns(
+            index[rows], timestamp[rows], *(column[rows] for column in columns)
+        )
+    return result, len(lines)
+
+
+def _chunks(source: str | bytes | os.PathLike | IO, chunk_size: int):
+    """Read source in chunks of complete lines"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as log:
+            yield from _chunks(log, chunk_size)
+        return
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    rest = b""
+    while data := stream.read(chunk_size):
+        if isinstance(data, str):
+            data = data.encode()
+        data = rest + data
+        cut = max(data.rfind(b"\r"), data.rfind(b"\n")) + 1
+        rest = data[cut:]
+        if cut:
+            yield data[:cut]
+    if rest:
+        yield rest + b"\n"
+
+
+def iter_frame_columns(
+    source: str | bytes | os.PathLike | IO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict[DataKey, FrameColumns]]:
+    """Parse frames chunk by chunk, for logs larger than memory
+
+    :param source: path of log, file opened in text or binary mode, or frames
+        as bytes
+    :type source: str | bytes | os.PathLike | IO
+    :param chunk_size: bytes parsed at a time, defaults to DEFAULT_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :yield: columns of frames in chunk by key
+    :rtype: Iterator[dict[DataKey, FrameColumns]]
+    """
+    np = _numpy()
+    first_index = 0
+    for data in _chunks(source, chunk_size):
+        columns, count = _parse_chunk(np, data, first_index)
+        first_index += count
+        yield columns
+
+
+def parse_frame_log(
+    source: str | bytes | os.PathLike | IO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[DataKey, FrameColumns]:
+    """Parse all frames of log into columns by key
+
+    :param source: path of log, file opened in text or binary mode, or frames
+        as bytes
+    :type source: str | bytes | os.PathLike | IO
+    :param chunk_size: bytes parsed at a time, defaults to DEFAULT_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: columns of frames by key
+    :rtype: dict[DataKey, FrameColumns]
+    """
+    parts: dict[DataKey, list[FrameColumns]] = {}
+    for columns in iter_frame_columns(source, chunk_size):
+        for key, part in columns.items():
+            parts.setdefault(key, []).append(part)
+    return {
+        key: part[0] if len(part) == 1 else FrameColumns.concatenate(part)
+        for key, part in parts.items()
+    }
@@ -0,0 +1,334 @@
+"""Command line interface
+
+Modules are imported by the subcommands that need them, so ``--help`` and
+argument errors do not pay for importing the client and websockets.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+
+def _connect_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("host", help="ip address or host name of the unit")
+    parser.add_argument("-p", "--port", type=int, default=3001, help="websocket port")
+
+
+def _run(coro) -> None:
+    from .helpers.transport import run
+
+    try:
+        run(coro)
+    except KeyboardInterrupt:
+        pass
+
+
+def _key(value: str):
+    """Argument type of key by name or code"""
+    from .const import DataKey
+
+    if value in DataKey.__members__:
+        return DataKey[value]
+    try:
+        return DataKey(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"unknown key {value!r}") from None
+
+
+async def _sleep(duration: float | None) -> None:
+    import asyncio
+
+    if duration is None:
+        await asyncio.Event().wait()
+    else:
+        await asyncio.sleep(duration)
+
+
+def _monitor(args: argparse.Namespace) -> int:
+    """Stream decoded updates as JSON lines"""
+    import json
+    import time
+
+    from .client import Client
+    from .const import DataKey
+    from .data import SystemProperty
+
+    keys = set(args.keys) if args.keys else None
+
+    def print_update(key: DataKey, payload: str) -> None:
+        if keys is not None and key not in keys:
+            return
+        prop = SystemProperty.from_str(key, payload)
+        line = {
+            "time": round(time.time(), 3),
+            "key": str(key),
+            "name": key.name,
+            "value": prop.value,
+            "min_value": prop.min_value,
+            "max_value": prop.max_value,
+            "extra": prop.extra,
+        }
+        print(json.dumps(line), flush=True)
+
+    async def monitor() -> None:
+        async with Client(args.host, args.port) as client:
+            client.add_update_handler(print_update)
+            await _sleep(args.duration)
+
+    _run(monitor())
+    return 0
+
+
+def _record(args: argparse.Namespace) -> int:
+    """Capture raw frames to a JSON lines file"""
+    import json
+    import time
+
+    from .const import CommandPriority, DataKey
+    from .data import Message
+    from .helpers.websocket import ReconnectingWebsocketClient
+
+    async def record() -> None:
+        started = time.monotonic()
+        count = 0
+        with open(args.output, "w", encoding="utf-8") as file:
+
+            async def on_message(frame: str) -> None:
+                nonlocal count
+                line = {"t": round(time.monotonic() - started, 4), "frame": frame}
+                file.write(json.dumps(line) + "\n")
+                count += 1
+
+            async def on_connect() -> None:
+                await ws.send(
+                    Message(DataKey.NONE, "").encode(), CommandPriority.CONTROL
+                )
+
+            ws = ReconnectingWebsocketClient(
+                args.host, args.port, on_message, on_connect=on_connect
+            )
+            try:
+                async with ws:
+                    await _sleep(args.duration)
+            finally:
+                print(f"Recorded {count} frames to {args.output}", file=sys.stderr)
+
+    _run(record())
+    return 0
+
+
+def _replay(args: argparse.Namespace) -> int:
+    """Serve recorded frames, emulating a unit"""
+    import asyncio
+    import json
+
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+
+    with open(args.input, encoding="utf-8") as file:
+        frames = [json.loads(line) for line in file if line.strip()]
+
+    async def acknowledge(ws) -> None:
+        async for message in ws:
+            if isinstance(message, str) and message.startswith("#"):
+                key, _, payload = message[1:].strip().partition(":")
+                if key:
+                    await ws.send(f"#${key}: {payload}\r")
+
+    async def handler(ws) -> None:
+        await ws.recv()
+        acks = asyncio.create_task(acknowledge(ws))
+        try:
+            while True:
+                previous = 0.0
+                for frame in frames:
+                    if args.speed > 0 and frame["t"] > previous:
+                        await asyncio.sleep((frame["t"] - previous) / args.speed)
+                    else:
+                        await asyncio.sleep(0)
+                    previous = frame["t"]
+                    await ws.send(frame["frame"])
+                if not args.loop:
+                    await ws.wait_closed()
+                    break
+        except ConnectionClosed:
+            pass
+        finally:
+            acks.cancel()
+
+    async def replay() -> None:
+        async with serve(handler, args.bind, args.port, compression=None):
+            print(
+                f"Replaying {len(frames)} frames on ws://{args.bind}:{args.port}",
+                file=sys.stderr,
+            )
+            await _sleep(args.duration)
+
+    _run(replay())
+    return 0
+
+
+def _send(args: argparse.Namespace) -> int:
+    """Send command and wait for acknowledgement"""
+    from .client import Client
+    from .const import DeliveryStatus
+
+    key = args.key
+    status = None
+
+    async def send() -> None:
+        nonlocal status
+        async with Client(args.host, args.port) as client:
+            delivery = await client.send_command(key, args.value)
+            status = await delivery.wait(args.timeout)
+
+    _run(send())
+    print(status)
+    return 0 if status == DeliveryStatus.ACKNOWLEDGED else 1
+
+
+def _bench(args: argparse.Namespace) -> int:
+    """Measure update throughput and command round trip latency"""
+    import statistics
+    import time
+
+    from .client import Client
+    from .const import DataKey, DeliveryStatus
+
+    updates = 0
+    latencies: list[float] = []
+    error: str | None = None
+
+    def count(key: DataKey, payload: str) -> None:
+        nonlocal updates
+        updates += 1
+
+    async def bench() -> None:
+        nonlocal error
+        async with Client(args.host, args.port) as client:
+            client.add_update_handler(count)
+            started = time.perf_counter()
+            await _sleep(args.duration)
+            elapsed = time.perf_counter() - started
+            print(f"updates:  {updates} ({updates / elapsed:.1f}/s)")
+            value = (await client.wait_for(DataKey.MODE_FAN, timeout=10)).value
+            if not isinstance(value, (int, str)):
+                error = f"{DataKey.MODE_FAN.name} has no value to send"
+                return
+            for _ in range(args.commands):
+                sent = time.perf_counter()
+                delivery = await client.send_command(DataKey.MODE_FAN, value)
+                if await delivery.wait(5) == DeliveryStatus.ACKNOWLEDGED:
+                    latencies.append((time.perf_counter() - sent) * 1000)
+        if len(latencies) > 1:
+            print(
+                f"commands: {len(latencies)}/{args.commands} acknowledged, "
+                f"mean {statistics.mean(latencies):.1f} ms, "
+                f"max {max(latencies):.1f} ms"
+            )
+        else:
+            print(f"commands: {len(latencies)}/{args.commands} acknowledged")
+
+    _run(bench())
+    if error is not None:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _discover(args: argparse.Namespace) -> int:
+    """Find units on network"""
+    from .discovery import main
+
+    main([args.network, *(f"--port={port}" for port in args.ports or ())])
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build argument parser"""
+    parser = argparse.ArgumentParser(
+        prog="pysaleryd", description="Monitor and control Saleryd HRV units"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0, help="increase log level"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    monitor = commands.add_parser("monitor", help=_monitor.__doc__)
+    _connect_args(monitor)
+    monitor.add_argument(
+        "-k",
+        "--keys",
+        nargs="+",
+        type=_key,
+        help="key names or codes to print, e.g. MODE_FAN",
+    )
+    monitor.add_argument("-d", "--duration", type=float, help="seconds to run")
+    monitor.set_defaults(func=_monitor)
+
+    record = commands.add_parser("record", help=_record.__doc__)
+    _connect_args(record)
+    record.add_argument("-o", "--output", required=True, help="file to write")
+    record.add_argument("-d", "--duration", type=float, help="seconds to record")
+    record.set_defaults(func=_record)
+
+    replay = commands.add_parser("replay", help=_replay.__doc__)
+    replay.add_argument("input", help="file written by record")
+    replay.add_argument("-p", "--port", type=int, default=3001)
+    replay.add_argument("--bind", default="127.0.0.1", help="address to listen on")
+    replay.add_argument(
+        "--speed", type=float, default=1.0, help="playback speed, 0 for max"
+    )
+    replay.add_argument("--loop", action="store_true", help="repeat recording")
+    replay.add_argument("-d", "--duration", type=float, help="seconds to serve")
+    replay.set_defaults(func=_replay)
+
+    send = commands.add_parser("send", help=_send.__doc__)
+    _connect_args(send)
+    send.add_argument(
+        "key", type=_key, help="key name or code, e.g. FIREPLACE_MODE or MB"
+    )
+    send.add_argument("value")
+    send.add_argument("-t", "--timeout", type=float, default=10.0)
+    send.set_defaults(func=_send)
+
+    bench = commands.add_parser("bench", help=_bench.__doc__)
+    _connect_args(bench)
+    bench.add_argument("-d", "--duration", type=float, default=10.0)
+    bench.add_argument("-n", "--commands", type=int, default=20)
+    bench.set_defaults(func=_bench)
+
+    discover = commands.add_parser("discover", help=_discover.__doc__)
+    discover.add_argument("network", help='network to scan, e.g. "192.168.1.0/24"')
+    discover.add_argument("-p", "--port", type=int, action="append", dest="ports")
+    discover.set_defaults(func=_discover)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run command line interface
+
+    :param argv: arguments, defaults to None (sys.argv)
+    :type argv: list[str] | None, optional
+    :return: exit code
+    :rtype: int
+    """
+    args = build_parser().parse_args(argv)
+    if args.verbose:
+        import logging
+
+        logging.basicConfig(
+            level=logging.DEBUG if args.verbose > 1 else logging.INFO,
+            stream=sys.stderr,
+        )
+    return args.func(args)
+
+
+def run() -> None:
+    """Entry point of console script"""
+    sys.exit(main())
+
+
+if __name__ == "__main__":
+    run()
@@ -2,15 +2,32 @@
 
 import asyncio
 import logging
-from typing import Callable, Coroutine
+import os
+from functools import partial
+from typing import Callable, Coroutine, Iterable
 
 from websockets.protocol import State
 
-from .const import DataKey, MessageContext
-from .data import Message, ParseError, UnsupportedMessageType
-from .helpers.error_cache import ErrorCache
-from .helpers.task import TaskList
-from .helpers.websocket import ReconnectingWebsocketClient
+from .const import (
+    DEFAULT,
+    DEFAULT_READY_KEYS,
+    CommandPriority,
+    DataKey,
+    DefaultType,
+    MessageContext,
+)
+from .data import DataSnapshot, Message, SystemProperty
+from .helpers.cadence import Cadence, CadenceScheduler
+from .helpers.clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
+from .helpers.connection import Connection, get_connection
+from .helpers.delivery import Delivery
+from .helpers.error_cache import ERROR_FRAME_KEYS, ErrorChange
+from .helpers.log import LogBudget
+from .helpers.scheduler import QueueStats
+from .helpers.snapshot import load_snapshot, save_snapshot
+from .helpers.task import RestartPolicy, TaskSupervisor
+from .helpers.transport import TransportOptions
+from .helpers.waiters import Waiters
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
@@ -24,6 +41,18 @@ class Client:
         port: int = 3001,
         update_interval: int = 30,
         connect_timeout: int = 15,
+        shared: bool = False,
+        snapshot_path: str | os.PathLike | None = None,
+        snapshot_interval: int = 60,
+        ready_keys: Iterable[DataKey] = DEFAULT_READY_KEYS,
+        send_rate: float | None = None,
+        send_burst: int = 5,
+        command_ttl: float | None = 60,
+        log_budget: LogBudget | None = None,
+        clock: Clock = DEFAULT_CLOCK,
+        transport: TransportOptions | None = None,
+        dispatch_window: float | None = None,
+        max_dispatch_delay: float | None = None,
     ):
         """Initiate client
 
@@ -31,16 +60,59 @@ class Client:
         :type ip: str
         :param port: port
         :type port: int
-        :param update_interval: update interval for calling handler, defaults to 30
+        :param update_interval: update interval for calling data handlers added
+            without a cadence, defaults to 30
         :type update_interval: int, optional
         :param connect_timeout: timeout when establishing connection, defaults to 15
         :type connect_timeout: int, optional
+        :param shared: share connection and data with other clients using the same
+            ip and port in this event loop, defaults to False
+        :type shared: bool, optional
+        :param snapshot_path: file to persist data to and restore data from on
+            connect, defaults to None
+        :type snapshot_path: str | os.PathLike | None, optional
+        :param snapshot_interval: interval for persisting data, defaults to 60
+        :type snapshot_interval: int, optional
+        :param ready_keys: keys that must be received before initial sync is
+            complete, defaults to DEFAULT_READY_KEYS
+        :type ready_keys: Iterable[DataKey], optional
+        :param send_rate: maximum commands sent per second, defaults to None
+            (no limit)
+        :type send_rate: float | None, optional
+        :param send_burst: number of commands that may be sent back to back,
+            defaults to 5
+        :type send_burst: int, optional
+        :param command_ttl: time in seconds after which unsent or unacknowledged
+            commands are dropped, defaults to 60
+        :type command_ttl: float | None, optional
+        :param log_budget: sampling of frame logging and rate limiting of
+            repeated warnings, defaults to None (log every frame at debug level,
+            repeated warnings at most once a minute)
+        :type log_budget: LogBudget | None, optional
+        :param clock: clock driving all timers of the client and its connection,
+            defaults to DEFAULT_CLOCK (real time). Use
+            :class:`~pysaleryd.helpers.clock.VirtualClock` to simulate time
+        :type clock: Clock, optional
+        :param transport: websocket transport options such as compression,
+            buffer sizes and socket options, defaults to None (low-overhead
+            defaults of :class:`~pysaleryd.helpers.transport.TransportOptions`)
+        :type transport: TransportOptions | None, optional
+        :param dispatch_window: seconds to coalesce acknowledged commands into a
+            single call of data handlers. Each acknowledgement within the window
+            extends it. Only the data handler calls triggered by
+            acknowledgements are coalesced, update handlers are still called
+            for every message, defaults to None (call data handlers on every
+            acknowledgement)
+        :type dispatch_window: float | None, optional
+        :param max_dispatch_delay: max seconds from the first coalesced
+            acknowledgement until handlers are called, defaults to None
+            (dispatch_window)
+        :type max_dispatch_delay: float | None, optional
         """
         self._update_interval = update_interval
+        self._clock = clock
         self._ip = ip
         self._port = port
-        self._data: dict[DataKey, str] = {}
-        self._error_cache = ErrorCache()
         self._on_data_handlers: set[
             Callable[
                 [dict[DataKey, str]], None | Coroutine[None, dict[DataKey, str], None]
@@ -49,16 +121,46 @@ class Client:
         self._on_state_change_handlers: set[
             Callable[[State], None | Coroutine[None, State, None]]
         ] = set()
+        self._on_update_handlers: set[Callable[[DataKey, str], None]] = set()
+        self._on_error_handlers: set[
+            Callable[[ErrorChange], None | Coroutine[None, ErrorChange, None]]
+        ] = set()
         self._connect_timeout = connect_timeout
-        self._tasks = TaskList()
-        self._websocket = ReconnectingWebsocketClient(
-            host=self._ip,
-            port=self._port,
-            connect_timeout=self._connect_timeout,
-            on_message=self._on_message,
-            on_connect=self._send_start_message,
-            on_state_change=self._on_state_change,
+        self._snapshot_path = snapshot_path
+        self._command_ttl = command_ttl
+        self._snapshot_interval = snapshot_interval
+        self._ready_keys = frozenset(ready_keys)
+        self._pending_keys: set[DataKey] = set()
+        self._ready = asyncio.Event()
+        self._sync_started: float | None = None
+        self._sync_duration: float | None = None
+        self._key_waiters: Waiters[DataKey, SystemProperty] = Waiters(clock)
+        self._state_waiters: Waiters[State | None, State | None] = Waiters(clock)
+        self._tasks = TaskSupervisor(clock=clock)
+        self._cadences = CadenceScheduler(self._on_cadence, clock)
+        self._cadence_handlers: set[Callable] = set()
+        self._changes_seen = 0
+        # Zero when acknowledgements are not coalesced
+        self._dispatch_window = dispatch_window or 0.0
+        self._max_dispatch_delay = (
+            max_dispatch_delay
+            if max_dispatch_delay is not None
+            else self._dispatch_window
+        )
+        self._dispatch_timer: asyncio.TimerHandle | VirtualTimerHandle | None = None
+        self._dispatch_deadline: float | None = None
+        self._connection = (get_connection if shared else Connection)(
+            self._ip,
+            self._port,
+            self._connect_timeout,
+            send_rate,
+            send_burst,
+            log_budget,
+            clock,
+            transport,
         )
+        self._websocket = self._connection.websocket
+        self._is_connected = False
 
     @property
     def state(self) -> State | None:
@@ -66,38 +168,214 @@ class Client:
         return self._websocket.state
 
     @property
-    def data(self) -> dict[DataKey, str]:
-        """Get data from system if connection is alive"""
+    def data(self) -> DataSnapshot:
+        """Get immutable snapshot of data from system if connection is alive"""
         if self.state == State.OPEN:
-            return self._data
-        loop = asyncio.get_event_loop()
-        loop.create_connection
+            return self._connection.snapshot()
+        return DataSnapshot()
+
+    @property
+    def queue_stats(self) -> dict[CommandPriority, QueueStats]:
+        """Send queue wait statistics by priority class"""
+        return self._websocket.queue_stats
+
+    @property
+    def errors(self) -> list[str]:
+        """Errors currently reported by the unit"""
+        return self._connection.errors.data
 
-        return dict()
+    @property
+    def error_history(self) -> list[ErrorChange]:
+        """Recent changes of errors reported by the unit, oldest first"""
+        return list(self._connection.errors.history)
+
+    @property
+    def stale(self) -> set[DataKey]:
+        """Keys restored from snapshot that have not yet been updated by the unit"""
+        return self._connection.stale
+
+    @property
+    def timestamps(self) -> dict[DataKey, float]:
+        """Time of last update for each key"""
+        return self._connection.timestamps
+
+    @property
+    def is_ready(self) -> bool:
+        """Initial sync is complete"""
+        return self._ready.is_set()
+
+    @property
+    def sync_duration(self) -> float | None:
+        """Time in seconds from connect until initial sync completed"""
+        return self._sync_duration
+
+    @property
+    def tasks(self) -> dict[str, float]:
+        """Age in seconds of live background tasks by name, including tasks of
+        the connection"""
+        return {**self._websocket.tasks, **self._tasks.ages}
+
+    async def ready(self, timeout: float | None = None) -> None:
+        """Wait until all ready_keys have been received from the unit
+
+        :param timeout: timeout in seconds, defaults to None
+        :type timeout: float | None, optional
+        :raises asyncio.TimeoutError: if sync is not complete within timeout
+        """
+        async with self._clock.timeout(timeout):
+            await self._ready.wait()
+
+    async def wait_for(
+        self,
+        key: DataKey,
+        predicate: Callable[[SystemProperty], bool] | None = None,
+        timeout: float | None = None,
+    ) -> SystemProperty:
+        """Wait for value of key to match predicate. Resolves immediately if the
+        current value received from the unit matches
+
+        :param key: key to wait for
+        :type key: DataKey
+        :param predicate: predicate the value must match, defaults to None
+        :type predicate: Callable[[SystemProperty], bool] | None, optional
+        :param timeout: timeout in seconds, defaults to None
+        :type timeout: float | None, optional
+        :raises asyncio.TimeoutError: if no matching value within timeout
+        :return: matching value
+        :rtype: SystemProperty
+        """
+        data = self._connection.data
+        if key in data and key not in self._connection.stale:
+            value = SystemProperty.from_str(key, data[key])
+            if predicate is None or predicate(value):
+                return value
+        return await self._key_waiters.wait(key, predicate, timeout)
+
+    async def wait_for_state(
+        self, state: State | None, timeout: float | None = None
+    ) -> None:
+        """Wait for connection to reach state
+
+        :param state: state to wait for
+        :type state: State | None
+        :param timeout: timeout in seconds, defaults to None
+        :type timeout: float | None, optional
+        :raises asyncio.TimeoutError: if state is not reached within timeout
+        """
+        if self.state != state:
+            await self._state_waiters.wait(state, timeout=timeout)
+
+    def _begin_sync(self) -> None:
+        """Begin tracking initial sync"""
+        self._ready.clear()
+        self._sync_started = self._clock.time()
+        self._sync_duration = None
+        self._pending_keys = set(self._ready_keys)
+        self._pending_keys.difference_update(
+            key for key in self._connection.data if key not in self._connection.stale
+        )
+        self._check_sync()
+
+    def _check_sync(self) -> None:
+        """Mark sync as complete when all ready_keys are received"""
+        if self._pending_keys or self._sync_started is None or self._ready.is_set():
+            return
+        self._sync_duration = self._clock.time() - self._sync_started
+        self._ready.set()
+        _LOGGER.debug("Initial sync completed in %.3f s", self._sync_duration)
 
     async def connect(self) -> None:
         """Connect to HRV and begin receiving"""
         try:
-            await self._websocket.connect()
-            self._tasks.add(asyncio.create_task(self._do_call_data_handlers()))
+            if self._snapshot_path is not None:
+                self._connection.restore(
+                    await asyncio.to_thread(load_snapshot, self._snapshot_path)
+                )
+            await self._connection.acquire(self)
+            self._is_connected = True
+            if self._sync_started is None:
+                # Connection was already open
+                self._begin_sync()
+            self._cadences.start()
+            if self._snapshot_path is not None:
+                self._tasks.spawn(
+                    self._do_save_snapshot,
+                    name="save_snapshot",
+                    restart=RestartPolicy(),
+                )
+                if self._connection.data:
+                    await self._call_data_handlers()
         except Exception:
             await self.close()
             raise
 
-    async def _send_start_message(self) -> None:
-        """Send start message to server to begin receiving data"""
-        message = Message(DataKey.NONE, "")
-        await self._websocket.send(message.encode())
-
-    async def _do_call_data_handlers(self) -> None:
-        """Call message handlers with data at update_interval"""
+    async def _save_snapshot(self) -> None:
+        """Persist data to snapshot file"""
+        if (path := self._snapshot_path) is None:
+            return
+        try:
+            await asyncio.to_thread(
+                save_snapshot,
+                path,
+                self._connection.snapshot(),
+                dict(self._connection.timestamps),
+            )
+        except OSError:
+            _LOGGER.warning(
+                "Failed to save snapshot %s", self._snapshot_path, exc_info=True
+            )
+
+    async def _do_save_snapshot(self) -> None:
+        """Persist data at snapshot_interval"""
         while True:
-            await asyncio.sleep(self._update_interval)
-            await self._call_data_handlers()
+            await self._clock.sleep(self._snapshot_interval)
+            await self._save_snapshot()
+
+    def _on_cadence(self, handlers: list[Callable]) -> None:
+        """Call data handlers that are due"""
+        self._tasks.spawn(
+            partial(self._call_data_handlers, handlers), name="call_data_handlers"
+        )
+
+    def _schedule_dispatch(self) -> None:
+        """Call data handlers when dispatch window has passed without new
+        acknowledgements, or at the latest max_dispatch_delay after the first"""
+        now = self._clock.time()
+        if self._dispatch_deadline is None:
+            self._dispatch_deadline = now + self._max_dispatch_delay
+        elif self._dispatch_timer is not None:
+            self._dispatch_timer.cancel()
+        due = min(now + self._dispatch_window, self._dispatch_deadline)
+        self._dispatch_timer = self._clock.call_later(due - now, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._dispatch_timer = None
+        self._dispatch_deadline = None
+        self._tasks.spawn(
+            partial(self._call_data_handlers, self._ack_handlers()),
+            name="dispatch_data_handlers",
+        )
+
+    def _ack_handlers(self) -> set[Callable]:
+        """Data handlers called when a command is acknowledged, handlers with a
+        cadence are only called according to it"""
+        if not self._cadence_handlers:
+            return self._on_data_handlers
+        return self._on_data_handlers - self._cadence_handlers
+
+    def _cancel_dispatch(self) -> None:
+        if self._dispatch_timer is not None:
+            self._dispatch_timer.cancel()
+        self._dispatch_timer = None
+        self._dispatch_deadline = None
 
-    async def _call_data_handlers(self) -> None:
-        """Call handlers with data asynchronously"""
-        for handler in self._on_data_handlers:
+    async def _call_data_handlers(self, handlers: Iterable[Callable] | None = None):
+        """Call handlers with data asynchronously
+
+        :param handlers: handlers to call, defaults to None (all data handlers)
+        :type handlers: Iterable[Callable] | None, optional
+        """
+        for handler in list(self._on_data_handlers if handlers is None else handlers):
             try:
                 if isinstance(result := handler(self.data), Coroutine):
                     await result
@@ -115,27 +393,70 @@ class Client:
 
     async def close(self) -> None:
         """Disconnect from system"""
-        if self._websocket:
-            await self._websocket.close()
+        if self._is_connected:
+            self._is_connected = False
+            self._ready.clear()
+            self._sync_started = None
+            if self._snapshot_path is not None and self._connection.data:
+                await self._save_snapshot()
+            await self._connection.release(self)
+        self._cadences.stop()
+        self._cancel_dispatch()
         await self._tasks.cancel()
 
     async def _on_state_change(self, state) -> None:
+        if state == State.OPEN:
+            self._begin_sync()
+        else:
+            self._ready.clear()
+            self._sync_started = None
+        self._state_waiters.notify(state, state)
         await self._call_state_change_handlers(state)
 
-    async def _on_message(self, msg: str) -> None:
-        """Update data"""
-        try:
-            message = Message.decode(msg)
-            if error := self._error_cache.handle(message):
-                self._data[DataKey.ERROR_MESSAGE] = str(error)
+    async def _on_error_change(self, change: ErrorChange) -> None:
+        """Call error handlers when errors reported by the unit change"""
+        # Error frames are only complete here, with the value held in data
+        if self._pending_keys:
+            self._pending_keys.discard(DataKey.ERROR_MESSAGE)
+            self._check_sync()
+        if DataKey.ERROR_MESSAGE in self._key_waiters:
+            self._key_waiters.notify(
+                DataKey.ERROR_MESSAGE,
+                SystemProperty.from_str(
+                    DataKey.ERROR_MESSAGE, str(list(change.errors))
+                ),
+            )
+        for handler in self._on_error_handlers:
+            try:
+                if isinstance(result := handler(change), Coroutine):
+                    await result
+            except BaseException:
+                _LOGGER.exception("Failed to call handler %s", handler)
+
+    async def _on_message(self, message: Message) -> None:
+        """Handle message after data has been updated"""
+        # Lines of error frames are handled by _on_error_change
+        if message.key not in ERROR_FRAME_KEYS:
+            if self._pending_keys:
+                self._pending_keys.discard(message.key)
+                self._check_sync()
+            if message.key in self._key_waiters:
+                self._key_waiters.notify(
+                    message.key, SystemProperty.from_str(message.key, message.payload)
+                )
+        for handler in self._on_update_handlers:
+            try:
+                handler(message.key, message.payload)
+            except Exception:
+                _LOGGER.exception("Failed to call handler %s", handler)
+        if self._connection.changes != self._changes_seen:
+            self._changes_seen = self._connection.changes
+            self._cadences.changed()
+        if message.message_context == MessageContext.ACK_OK:
+            if self._dispatch_window:
+                self._schedule_dispatch()
             else:
-                self._data[message.key] = message.payload
-                if message.message_context == MessageContext.ACK_OK:
-                    await self._call_data_handlers()
-        except ParseError as e:
-            _LOGGER.error(e, exc_info=True)
-        except UnsupportedMessageType as e:
-            _LOGGER.debug("Unsupported message type: %s", e, exc_info=True)
+                await self._call_data_handlers(self._ack_handlers())
 
     def add_state_change_handler(self, handler: Callable[[State], None | Coroutine]):
         """Add state change handler to be called when client state changes
@@ -160,14 +481,23 @@ class Client:
         handler: Callable[
             [dict[DataKey, str]], None | Coroutine[None, dict[DataKey, str], None]
         ],
+        cadence: Cadence | None = None,
     ) -> None:
-        """Add data handler to be called at update interval
+        """Add data handler to be called at update interval, or with its own
+        cadence. Handlers without a cadence are also called when a command is
+        acknowledged
 
         :param handler: handler function. Must be safe to call from event loop
         :type handler: Callable[[dict[DataKey, str]], None | Coroutine]
+        :param cadence: when to call handler, defaults to None (update_interval)
+        :type cadence: Cadence | None, optional
         """
-
         self._on_data_handlers.add(handler)
+        if cadence is not None:
+            self._cadence_handlers.add(handler)
+        else:
+            self._cadence_handlers.discard(handler)
+        self._cadences.add(handler, cadence or Cadence(self._update_interval))
 
     def remove_data_handler(
         self,
@@ -181,23 +511,84 @@ class Client:
         :type handler: Callable[[dict[DataKey, str]], None | Coroutine]
         """
         self._on_data_handlers.remove(handler)
+        self._cadence_handlers.discard(handler)
+        self._cadences.remove(handler)
+
+    def add_error_handler(
+        self,
+        handler: Callable[[ErrorChange], None | Coroutine[None, ErrorChange, None]],
+    ) -> None:
+        """Add error handler to be called as soon as errors reported by the unit
+        change. Repeated identical error frames are not reported
+
+        :param handler: handler function. Must be safe to call from event loop
+        :type handler: Callable[[ErrorChange], None | Coroutine]
+        """
+        self._on_error_handlers.add(handler)
 
-    async def send_command(self, key: DataKey, payload: str | int) -> None:
-        """Send command to HRV unit
+    def remove_error_handler(
+        self,
+        handler: Callable[[ErrorChange], None | Coroutine[None, ErrorChange, None]],
+    ) -> None:
+        """Remove error handler
+
+        :param handler: handler to remove
+        :type handler: Callable[[ErrorChange], None | Coroutine]
+        """
+        self._on_error_handlers.remove(handler)
+
+    def add_update_handler(self, handler: Callable[[DataKey, str], None]) -> None:
+        """Add update handler to be called with key and payload of every message
+        received
+
+        :param handler: handler function. Called from the receive loop, must be
+            fast and safe to call from event loop
+        :type handler: Callable[[DataKey, str], None]
+        """
+        self._on_update_handlers.add(handler)
+
+    def remove_update_handler(self, handler: Callable[[DataKey, str], None]) -> None:
+        """Remove update handler
+
+        :param handler: handler to remove
+        :type handler: Callable[[DataKey, str], None]
+        """
+        self._on_update_handlers.remove(handler)
+
+    async def send_command(
+        self,
+        key: DataKey,
+        payload: str | int,
+        priority: CommandPriority = CommandPriority.INTERACTIVE,
+        ttl: float | None | DefaultType = DEFAULT,
+    ) -> Delivery:
+        """Send command to HRV unit. Waits up to 0.5 s for acknowledgement,
+        use the returned delivery to track status after that.
+
+        Commands not acknowledged are resent after reconnect until acknowledged
+        or expired.
 
         :param key: message type key
         :type key: MessageType
         :param payload: payload
         :type value: str | int
+        :param priority: priority class, defaults to CommandPriority.INTERACTIVE
+        :type priority: CommandPriority, optional
+        :param ttl: time to live in seconds, None never expires, defaults to
+            command_ttl
+        :type ttl: float | None | DefaultType, optional
+        :return: delivery of command
+        :rtype: Delivery
         """
         message = Message(key, str(payload))
-
-        async def ack_command() -> None:
-            """Should probably ack command here, just sleep for now"""
-            await asyncio.sleep(0.5)
-
-        await self._websocket.send(message.encode())
-        await asyncio.gather(ack_command())
+        delivery = await self._websocket.send(
+            message.encode(),
+            priority,
+            ack_key=key,
+            ttl=self._command_ttl if ttl is DEFAULT else ttl,
+        )
+        await delivery.wait(0.5)
+        return delivery
 
     async def __aenter__(self, *args, **kwargs) -> "Client":
         await self.connect()
@@ -0,0 +1,465 @@
+"""Collect data from many HRV units in worker processes"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Sequence, cast
+
+from .client import Client
+from .const import DataKey
+from .data import Message, SystemProperty
+
+if TYPE_CHECKING:
+    from multiprocessing.context import ForkContext, ForkServerContext, SpawnContext
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+NUMERIC_KEYS: tuple[DataKey, ...] = tuple(
+    key
+    for key in DataKey
+    if key
+    not in {
+        DataKey.NONE,
+        DataKey.CONTROL_SYSTEM_VERSION,
+        DataKey.ERROR_FRAME_END,
+        DataKey.ERROR_FRAME_START,
+        DataKey.ERROR_MESSAGE,
+        DataKey.INSTALLER_EMAIL,
+        DataKey.INSTALLER_NAME,
+        DataKey.INSTALLER_PASSWORD,
+        DataKey.INSTALLER_PHONE,
+        DataKey.INSTALLER_WEBSITE,
+        DataKey.MODEL_NAME,
+        DataKey.PRODUCT_NUMBER,
+    }
+)
+"""Keys stored in :class:`SharedStateTable`, in column order"""
+
+_COLUMNS = {key: i for i, key in enumerate(NUMERIC_KEYS)}
+_HEADER = struct.Struct("<QQ")  # unit count, key count
+_SEQ = struct.Struct("<Q")
+_VALUE = struct.Struct("<d")
+# sequence, time of last update, values
+_ROW = struct.Struct("<Qd" + "d" * len(NUMERIC_KEYS))
+
+
+class SharedStateTable:
+    """Latest numeric values of units in shared memory
+
+    The table has one row per unit and one column per key in
+    :data:`NUMERIC_KEYS`. Missing values are NaN. Each row is guarded by a
+    seqlock: the writer makes the sequence odd while writing, readers retry
+    until they read the same even sequence before and after copying the row.
+    Each row must only have one writer.
+    """
+
+    def __init__(self, shm: SharedMemory, owner: bool = False) -> None:
+        self._shm = shm
+        self._owner = owner
+        if shm.buf is None:
+            raise ValueError("Shared memory block is closed")
+        self._buf: memoryview = shm.buf
+        self.unit_count, key_count = _HEADER.unpack_from(self._buf, 0)
+        if key_count != len(NUMERIC_KEYS):
+            raise ValueError("Shared state table layout does not match")
+
+    @classmethod
+    def create(cls, unit_count: int) -> SharedStateTable:
+        """Create table in new shared memory block
+
+        :param unit_count: number of units
+        :type unit_count: int
+        :return: table
+        :rtype: SharedStateTable
+        """
+        shm = SharedMemory(create=True, size=_HEADER.size + _ROW.size * unit_count)
+        buf = shm.buf
+        assert buf is not None
+        _HEADER.pack_into(buf, 0, unit_count, len(NUMERIC_KEYS))
+        empty = (0, 0.0) + (math.nan,) * len(NUMERIC_KEYS)
+        for unit in range(unit_count):
+            _ROW.pack_into(buf, _HEADER.size + _ROW.size * unit, *empty)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedStateTable:
+        """Attach to existing table
+
+        :param name: name of shared memory block
+        :type name: str
+        :return: table
+        :rtype: SharedStateTable
+        """
+        shm = SharedMemory(name=name)
+        # Only the creating process should unlink the block
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+        return cls(shm)
+
+    @property
+    def name(self) -> str:
+        """Name of shared memory block"""
+        return self._shm.name
+
+    def _offset(self, unit: int) -> int:
+        if not 0 <= unit < self.unit_count:
+            raise IndexError(f"Unit {unit} out of range")
+        return _HEADER.size + _ROW.size * unit
+
+    def reset(self, unit: int) -> None:
+        """Make sequence of row even after a writer died while writing
+
+        :param unit: unit index
+        :type unit: int
+        """
+        offset = self._offset(unit)
+        (seq,) = _SEQ.unpack_from(self._buf, offset)
+        if seq & 1:
+            _SEQ.pack_into(self._buf, offset, seq + 1)
+
+    def write(self, unit: int, key: DataKey, value: float, timestamp: float) -> None:
+        """Write value of key for unit
+
+        :param unit: unit index
+        :type unit: int
+        :param key: key, must be in :data:`NUMERIC_KEYS`
+        :type key: DataKey
+        :param value: value
+        :type value: float
+        :param timestamp: time of update
+        :type timestamp: float
+        """
+        offset = self._offset(unit)
+        buf = self._buf
+        (seq,) = _SEQ.unpack_from(buf, offset)
+        _SEQ.pack_into(buf, offset, seq + 1)
+        _VALUE.pack_into(buf, offset + 8, timestamp)
+        _VALUE.pack_into(buf, offset + 16 + 8 * _COLUMNS[key], value)
+        _SEQ.pack_into(buf, offset, seq + 2)
+
+    def read_row(self, unit: int) -> tuple[float, tuple[float, ...]]:
+        """Read consistent row of unit
+
+        :param unit: unit index
+        :type unit: int
+        :return: time of last update and values in :data:`NUMERIC_KEYS` order
+        :rtype: tuple[float, tuple[float, ...]]
+        """
+        offset = self._offset(unit)
+        buf = self._buf
+        while True:
+            seq, updated, *values = _ROW.unpack_from(buf, offset)
+            if not seq & 1 and _SEQ.unpack_from(buf, offset)[0] == seq:
+                return updated, tuple(values)
+            time.sleep(0)
+
+    def read(self, unit: int) -> dict[DataKey, float]:
+        """Read values of unit
+
+        :param unit: unit index
+        :type unit: int
+        :return: values that have been received
+        :rtype: dict[DataKey, float]
+        """
+        _, values = self.read_row(unit)
+        return {
+            key: value
+            for key, value in zip(NUMERIC_KEYS, values)
+            if not math.isnan(value)
+        }
+
+    def close(self) -> None:
+        """Detach from table, remove it if this process created it"""
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _TableClient(Client):
+    """Client writing numeric values to shared state table"""
+
+    def __init__(self, table: SharedStateTable, unit: int, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._table = table
+        self._unit = unit
+
+    async def _on_message(self, message: Message) -> None:
+        await super()._on_message(message)
+        if message.key in _COLUMNS:
+            value = SystemProperty.from_str(message.key, message.payload).value
+            if isinstance(value, (int, float)):
+                self._table.write(self._unit, message.key, value, time.time())
+
+
+async def _collect_unit(
+    table: SharedStateTable,
+    unit: int,
+    host: str,
+    port: int,
+    client_kwargs: dict[str, Any],
+) -> None:
+    """Connect to unit, retrying until connected, and collect data"""
+    client = _TableClient(table, unit, host, port, **client_kwargs)
+    retry_interval = 1.0
+    while True:
+        try:
+            await client.connect()
+            break
+        except (OSError, asyncio.TimeoutError) as e:
+            _LOGGER.warning("Failed to connect to %s:%s: %s", host, port, e)
+            await asyncio.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, 60)
+    try:
+        await asyncio.Future()
+    finally:
+        await client.close()
+
+
+async def _collect(
+    table: SharedStateTable,
+    units: list[tuple[int, str, int]],
+    client_kwargs: dict[str, Any],
+    stop: Any,
+    inbox: Any,
+) -> None:
+    tasks: dict[int, asyncio.Task] = {}
+
+    def add(unit: int, host: str, port: int) -> None:
+        if unit not in tasks:
+            # Previous writer of the row has died
+            table.reset(unit)
+            tasks[unit] = asyncio.create_task(
+                _collect_unit(table, unit, host, port, client_kwargs)
+            )
+
+    for unit in units:
+        add(*unit)
+    try:
+        while not stop.is_set():
+            # Units moved here from failed workers
+            while True:
+                try:
+                    add(*inbox.get_nowait())
+                except queue.Empty:
+                    break
+            await asyncio.sleep(0.5)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+def _run_worker(
+    name: str,
+    units: list[tuple[int, str, int]],
+    client_kwargs: dict[str, Any],
+    stop: Any,
+    inbox: Any,
+) -> None:
+    """Worker process entry point"""
+    table = SharedStateTable.attach(name)
+    try:
+        asyncio.run(_collect(table, units, client_kwargs, stop, inbox))
+    finally:
+        table.close()
+
+
+class _Worker:
+    """Worker process and its assigned units"""
+
+    def __init__(self, index: int, inbox: Any) -> None:
+        self.index = index
+        self.inbox = inbox
+        self.units: list[int] = []
+        self.process: multiprocessing.process.BaseProcess | None = None
+        self.restarts = 0
+        self.started = 0.0
+        self.restart_at = 0.0
+        self.failed = False
+
+
+class Collector:
+    """Collect data from many units spread over worker processes
+
+    Each worker runs a :class:`~pysaleryd.client.Client` per assigned unit and
+    publishes numeric values to a :class:`SharedStateTable`, readable from any
+    process by attaching to :attr:`name`. A supervisor thread restarts crashed
+    workers with backoff, and moves units of workers that keep crashing to
+    the remaining workers.
+    """
+
+    def __init__(
+        self,
+        units: Sequence[str | tuple[str, int]],
+        workers: int | None = None,
+        max_restarts: int = 5,
+        restart_backoff: float = 1.0,
+        start_method: str = "spawn",
+        **client_kwargs,
+    ) -> None:
+        """Initiate collector
+
+        :param units: hosts, or host and port, of units. Row index in table is
+            position in this list
+        :type units: Sequence[str | tuple[str, int]]
+        :param workers: number of worker processes, defaults to number of CPUs
+        :type workers: int | None, optional
+        :param max_restarts: restarts in a row before units of a worker are
+            moved to other workers. Restarts are counted again once a worker
+            ran longer than the largest backoff, defaults to 5
+        :type max_restarts: int, optional
+        :param restart_backoff: initial delay before restarting a worker,
+            doubled on each restart, defaults to 1.0
+        :type restart_backoff: float, optional
+        :param start_method: multiprocessing start method, defaults to "spawn"
+        :type start_method: str, optional
+        :param client_kwargs: options passed to :class:`~pysaleryd.client.Client`
+        """
+        self._units = [
+            (unit, 3001) if isinstance(unit, str) else tuple(unit) for unit in units
+        ]
+        # Contexts of all start methods create processes
+        self._context = cast(
+            "SpawnContext | ForkContext | ForkServerContext",
+            multiprocessing.get_context(start_method),
+        )
+        worker_count = max(1, min(workers or os.cpu_count() or 1, len(self._units)))
+        self._workers = [_Worker(i, self._context.Queue()) for i in range(worker_count)]
+        for unit in range(len(self._units)):
+            self._workers[unit % worker_count].units.append(unit)
+        self._max_restarts = max_restarts
+        self._restart_backoff = restart_backoff
+        self._client_kwargs = client_kwargs
+        self._stop = self._context.Event()
+        self._closing = threading.Event()
+        self._supervisor: threading.Thread | None = None
+        self.table: SharedStateTable | None = None
+
+    @property
+    def name(self) -> str | None:
+        """Name of shared state table"""
+        return self.table.name if self.table is not None else None
+
+    @property
+    def assignments(self) -> dict[int, list[int]]:
+        """Units assigned to each running worker"""
+        return {w.index: list(w.units) for w in self._workers if not w.failed}
+
+    def _start_worker(self, worker: _Worker) -> None:
+        assert self.table is not None
+        units = [(unit, *self._units[unit]) for unit in worker.units]
+        worker.process = self._context.Process(
+            target=_run_worker,
+            args=(
+                self.table.name,
+                units,
+                self._client_kwargs,
+                self._stop,
+                worker.inbox,
+            ),
+            name=f"pysaleryd-collector-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started = time.monotonic()
+
+    def _stop_worker(self, worker: _Worker) -> None:
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join()
+        worker.process = None
+
+    def start(self) -> None:
+        """Create table, start workers and supervisor"""
+        self.table = SharedStateTable.create(len(self._units))
+        for worker in self._workers:
+            self._start_worker(worker)
+        self._supervisor = threading.Thread(
+            target=self._supervise, name="pysaleryd-supervisor", daemon=True
+        )
+        self._supervisor.start()
+
+    def _supervise(self) -> None:
+        while not self._closing.wait(0.5):
+            self._check_workers()
+
+    def _check_workers(self) -> None:
+        """Restart crashed workers and rebalance units of failed workers"""
+        now = time.monotonic()
+        for worker in self._workers:
+            if worker.failed or worker.process is None:
+                continue
+            if worker.process.is_alive():
+                continue
+            if worker.restart_at == 0.0:
+                if now - worker.started > (
+                    self._restart_backoff * 2**self._max_restarts
+                ):
+                    # Healthy since the last restart
+                    worker.restarts = 0
+                _LOGGER.warning(
+                    "Worker %s exited with code %s",
+                    worker.index,
+                    worker.process.exitcode,
+                )
+                worker.restart_at = now + self._restart_backoff * 2**worker.restarts
+            if now < worker.restart_at:
+                continue
+            worker.restart_at = 0.0
+            if worker.restarts >= self._max_restarts and self._rebalance(worker):
+                continue
+            worker.restarts += 1
+            self._start_worker(worker)
+
+    def _rebalance(self, failed: _Worker) -> bool:
+        """Move units of failed worker to running workers, without restarting
+        them"""
+        alive = [w for w in self._workers if not w.failed and w is not failed]
+        if not alive:
+            return False
+        _LOGGER.error(
+            "Worker %s failed %s times, moving its units", failed.index, failed.restarts
+        )
+        failed.failed = True
+        failed.process = None
+        for i, unit in enumerate(failed.units):
+            worker = alive[i % len(alive)]
+            worker.units.append(unit)
+            # Also received after a restart, when the unit is already assigned
+            worker.inbox.put((unit, *self._units[unit]))
+        failed.units = []
+        return True
+
+    def close(self) -> None:
+        """Stop workers and supervisor, remove table"""
+        self._closing.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        self._stop.set()
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(5)
+            self._stop_worker(worker)
+            worker.inbox.close()
+            worker.inbox.cancel_join_thread()
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def __enter__(self) -> Collector:
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        self.close()
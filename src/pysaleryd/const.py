@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from enum import StrEnum
+from enum import Enum, IntEnum, StrEnum
 
 
 class MessageSeparator(StrEnum):
@@ -90,3 +90,55 @@ class DataKey(StrEnum):
     TARGET_TEMPERATURE_NORMAL = "TD"
 
     NONE = ""
+
+
+DEFAULT_READY_KEYS: frozenset[DataKey] = frozenset(
+    {
+        DataKey.AIR_TEMPERATURE_SUPPLY,
+        DataKey.CONTROL_SYSTEM_VERSION,
+        DataKey.FIREPLACE_MODE,
+        DataKey.MODE_FAN,
+        DataKey.MODE_HEATER,
+        DataKey.MODE_TEMPERATURE,
+        DataKey.MODEL_NAME,
+        DataKey.TARGET_TEMPERATURE_NORMAL,
+    }
+)
+"""Keys that must be received before initial sync is considered complete"""
+
+
+class DefaultType(Enum):
+    """Type of :data:`DEFAULT`"""
+
+    DEFAULT = "DEFAULT"
+
+
+DEFAULT = DefaultType.DEFAULT
+"""Argument falls back to the option of the client, where None is a valid value"""
+
+
+class CommandPriority(IntEnum):
+    """Priority class of outgoing messages. Lower value is sent first"""
+
+    CONTROL = 0
+    """Keepalive and start messages, not rate limited"""
+    INTERACTIVE = 1
+    """User initiated commands"""
+    BULK = 2
+    """Scripted or automated commands"""
+
+
+class DeliveryStatus(StrEnum):
+    """Delivery status of outgoing message"""
+
+    PENDING = "PENDING"
+    """Queued, or to be resent after reconnect"""
+    SENT = "SENT"
+    """Sent, waiting for acknowledgement if tracked"""
+    ACKNOWLEDGED = "ACKNOWLEDGED"
+    REJECTED = "REJECTED"
+    EXPIRED = "EXPIRED"
+    """Dropped because deadline passed before delivery"""
+    OVERFLOWED = "OVERFLOWED"
+    """Sent, but no longer tracked because too many messages were waiting for
+    acknowledgement"""
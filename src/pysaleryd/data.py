@@ -20,6 +20,8 @@ class UnsupportedMessageType(BaseException):
 class BaseMessage:
     """Base message class"""
 
+    __slots__ = ("key", "payload", "message_context")
+
     def __init__(
         self,
         key: str | DataKey,
@@ -34,6 +36,8 @@ class BaseMessage:
 class Message(BaseMessage):
     """Message from HRV system"""
 
+    __slots__ = ()
+
     @classmethod
     def decode(cls, msg: str) -> Message:
         """Decode message from string"""
@@ -64,6 +68,8 @@ class Message(BaseMessage):
 class SystemProperty:
     """HRV System property with value, min, max and extra values"""
 
+    __slots__ = ("key", "value", "min_value", "max_value", "extra")
+
     def __init__(
         self,
         key: DataKey,
@@ -112,6 +118,36 @@ class SystemProperty:
 class ErrorSystemProperty:
     """HRV System error property"""
 
+    __slots__ = ("key", "value")
+
     def __init__(self, key: DataKey, value: list[str] | None = None):
         self.key = key
         self.value = value
+
+
+class DataSnapshot(dict[DataKey, str]):
+    """Immutable versioned snapshot of data received from HRV system
+
+    Snapshots taken at the same version are the same object, so comparing
+    versions or identity is cheap.
+    """
+
+    __slots__ = ("version",)
+
+    def __init__(self, data: dict[DataKey, str] | None = None, version: int = 0):
+        dict.__init__(self, data or {})
+        self.version = version
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("DataSnapshot is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __eq__(self, other: object) -> bool:
+        return self is other or dict.__eq__(self, other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self), self.version))
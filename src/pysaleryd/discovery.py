@@ -0,0 +1,217 @@
+"""Discovery of HRV units on the local network"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ipaddress
+import logging
+from typing import Any, Awaitable, Callable, Iterable
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from .const import DataKey
+from .data import Message, ParseError, UnsupportedMessageType
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS: tuple[int, ...] = (3001,)
+"""Websocket ports probed by default"""
+
+_IDENTITY_KEYS = frozenset({DataKey.CONTROL_SYSTEM_VERSION, DataKey.MODEL_NAME})
+
+
+class DiscoveredUnit:
+    """HRV unit confirmed by handshake"""
+
+    __slots__ = ("host", "port", "model", "version")
+
+    def __init__(self, host: str, port: int, model: str, version: str) -> None:
+        self.host = host
+        self.port = port
+        self.model = model
+        self.version = version
+
+    def __repr__(self) -> str:
+        return (
+            f"DiscoveredUnit(host={self.host!r}, port={self.port}, "
+            f"model={self.model!r}, version={self.version!r})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, DiscoveredUnit):
+            return NotImplemented
+        return (self.host, self.port, self.model, self.version) == (
+            other.host,
+            other.port,
+            other.model,
+            other.version,
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.host, self.port, self.model, self.version))
+
+    @property
+    def config(self) -> dict[str, Any]:
+        """Keyword arguments for :class:`~pysaleryd.client.Client`"""
+        return {"ip": self.host, "port": self.port}
+
+
+def _expand_hosts(hosts: str | Iterable[str]) -> list[str]:
+    """Expand network in CIDR notation, or a single host, to hosts"""
+    if not isinstance(hosts, str):
+        return list(hosts)
+    try:
+        network = ipaddress.ip_network(hosts, strict=False)
+    except ValueError:
+        return [hosts]
+    if network.num_addresses == 1:
+        return [str(network.network_address)]
+    return [str(host) for host in network.hosts()]
+
+
+def _host_key(host: str) -> tuple:
+    """Sort key ordering ip addresses numerically before host names"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return (1, 0, host)
+    return (0, address.version, int(address))
+
+
+async def _is_open(host: str, port: int, timeout: float) -> bool:
+    """Check if TCP port accepts connections"""
+    try:
+        async with asyncio.timeout(timeout):
+            _, writer = await asyncio.open_connection(host, port)
+    except (OSError, TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _handshake(host: str, port: int, timeout: float) -> DiscoveredUnit | None:
+    """Send start message and read identity of unit"""
+    identity: dict[DataKey, str] = {}
+    try:
+        async with asyncio.timeout(timeout):
+            async with connect(
+                f"ws://{host}:{port}", open_timeout=None, ping_interval=None
+            ) as ws:
+                await ws.send(Message(DataKey.NONE, "").encode())
+                async for frame in ws:
+                    if not isinstance(frame, str):
+                        continue
+                    try:
+                        message = Message.decode(frame)
+                    except (ParseError, UnsupportedMessageType):
+                        continue
+                    if message.key in _IDENTITY_KEYS:
+                        identity[message.key] = message.payload
+                        if len(identity) == len(_IDENTITY_KEYS):
+                            break
+    except (OSError, TimeoutError, WebSocketException) as e:
+        _LOGGER.debug("Handshake with %s:%s failed: %r", host, port, e)
+        return None
+    if len(identity) != len(_IDENTITY_KEYS):
+        return None
+    return DiscoveredUnit(
+        host,
+        port,
+        identity[DataKey.MODEL_NAME],
+        identity[DataKey.CONTROL_SYSTEM_VERSION],
+    )
+
+
+async def discover(
+    hosts: str | Iterable[str],
+    ports: Iterable[int] = DEFAULT_PORTS,
+    concurrency: int = 256,
+    connect_timeout: float = 0.5,
+    handshake_timeout: float = 5.0,
+    on_found: Callable[[DiscoveredUnit], None | Awaitable[None]] | None = None,
+) -> list[DiscoveredUnit]:
+    """Scan hosts and ports concurrently for HRV units
+
+    Each host and port is first probed with a plain TCP connect. Open ports are
+    confirmed by the start handshake, reading the model name and control system
+    version sent by the unit. At most ``concurrency`` probes are in flight.
+
+    :param hosts: network in CIDR notation, e.g. "192.168.1.0/24", a single
+        host, or hosts
+    :type hosts: str | Iterable[str]
+    :param ports: websocket ports to probe, defaults to DEFAULT_PORTS
+    :type ports: Iterable[int], optional
+    :param concurrency: max probes in flight, defaults to 256
+    :type concurrency: int, optional
+    :param connect_timeout: timeout of TCP connect, defaults to 0.5
+    :type connect_timeout: float, optional
+    :param handshake_timeout: timeout of handshake with open ports, defaults
+        to 5.0
+    :type handshake_timeout: float, optional
+    :param on_found: called with each unit as it is confirmed, defaults to None
+    :type on_found: Callable[[DiscoveredUnit], None | Awaitable[None]] | None,
+        optional
+    :return: units found, ordered by host and port
+    :rtype: list[DiscoveredUnit]
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    found: list[DiscoveredUnit] = []
+
+    async def probe(host: str, port: int) -> None:
+        async with semaphore:
+            if not await _is_open(host, port, connect_timeout):
+                return
+            unit = await _handshake(host, port, handshake_timeout)
+        if unit is None:
+            return
+        _LOGGER.info("Found %s", unit)
+        found.append(unit)
+        if on_found is not None:
+            try:
+                if isinstance(result := on_found(unit), Awaitable):
+                    await result
+            except Exception:
+                _LOGGER.exception("Failed to call handler %s", on_found)
+
+    ports = tuple(ports)
+    await asyncio.gather(
+        *(probe(host, port) for host in _expand_hosts(hosts) for port in ports)
+    )
+    return sorted(found, key=lambda u: (_host_key(u.host), u.port))
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Print units found on network"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("network", help='network to scan, e.g. "192.168.1.0/24"')
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        action="append",
+        dest="ports",
+        help="port to probe, may be repeated (default: 3001)",
+    )
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args(argv)
+    units = asyncio.run(
+        discover(
+            args.network,
+            args.ports or DEFAULT_PORTS,
+            args.concurrency,
+            args.timeout,
+        )
+    )
+    for unit in units:
+        print(f"{unit.host}:{unit.port}\t{unit.model}\t{unit.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""Export decoded updates in columnar batches"""
+
+from __future__ import annotations
+
+import abc
+import json
+import logging
+import math
+import os
+import queue
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import IO, TYPE_CHECKING, Iterator
+
+from .const import DataKey
+from .data import SystemProperty
+
+if TYPE_CHECKING:
+    from .client import Client
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+KEYS: tuple[DataKey, ...] = tuple(DataKey)
+"""Dictionary of the key column, a key is stored as its index in this tuple"""
+
+_KEY_INDEX = {key: i for i, key in enumerate(KEYS)}
+
+COLUMNS: tuple[str, ...] = (
+    "timestamp",
+    "key",
+    "value",
+    "min_value",
+    "max_value",
+    "extra",
+    "payload",
+)
+"""Columns of exported updates"""
+
+
+def _as_float(value: int | float | str | None) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+class Batch:
+    """Columnar batch of updates. Missing or non numeric values are NaN"""
+
+    __slots__ = COLUMNS
+
+    def __init__(self) -> None:
+        self.timestamp = array("d")
+        self.key = array("H")
+        self.value = array("d")
+        self.min_value = array("d")
+        self.max_value = array("d")
+        self.extra = array("d")
+        self.payload: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.key)
+
+    def append(self, timestamp: float, key: DataKey, payload: str) -> None:
+        """Append update
+
+        :param timestamp: time of update
+        :type timestamp: float
+        :param key: key
+        :type key: DataKey
+        :param payload: payload
+        :type payload: str
+        """
+        prop = SystemProperty.from_str(key, payload)
+        self.timestamp.append(timestamp)
+        self.key.append(_KEY_INDEX[key])
+        self.value.append(_as_float(prop.value))
+        self.min_value.append(_as_float(prop.min_value))
+        self.max_value.append(_as_float(prop.max_value))
+        self.extra.append(_as_float(prop.extra))
+        self.payload.append(payload)
+
+
+class ExportStats:
+    """Export statistics"""
+
+    __slots__ = (
+        "rows",
+        "batches",
+        "dropped_rows",
+        "last_flush_latency",
+        "max_flush_latency",
+    )
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.batches = 0
+        self.dropped_rows = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"ExportStats(rows={self.rows}, batches={self.batches}, "
+            f"dropped_rows={self.dropped_rows}, "
+            f"last_flush_latency={self.last_flush_latency:.4f}, "
+            f"max_flush_latency={self.max_flush_latency:.4f})"
+        )
+
+
+class ExportSink(abc.ABC):
+    """Buffer updates of a client in columnar batches and write them from a
+    background thread
+
+    A batch is flushed when it reaches batch_size rows or every flush_interval
+    seconds. When more than max_pending batches wait to be written, new
+    batches are dropped and counted in :attr:`stats` so the event loop is
+    never blocked. Subclasses implement :meth:`_write` and optionally
+    :meth:`_open` and :meth:`_close`, which are called from the writer thread.
+    Rows do not identify the unit, so a sink exports one client.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        flush_interval: float = 5.0,
+        max_pending: int = 10,
+    ) -> None:
+        """Initiate sink
+
+        :param batch_size: rows per batch, defaults to 1000
+        :type batch_size: int, optional
+        :param flush_interval: max seconds between flushes, defaults to 5.0
+        :type flush_interval: float, optional
+        :param max_pending: batches waiting to be written before dropping,
+            defaults to 10
+        :type max_pending: int, optional
+        """
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._batch = Batch()
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Batch | None] = queue.Queue(max_pending)
+        self._thread: threading.Thread | None = None
+        self._client: Client | None = None
+        self.stats = ExportStats()
+
+    def attach(self, client: Client) -> None:
+        """Export updates received by client
+
+        :param client: client
+        :type client: Client
+        :raises RuntimeError: if another client is attached
+        """
+        if self._client is not None:
+            raise RuntimeError("Sink is already attached to a client")
+        client.add_update_handler(self.add)
+        self._client = client
+
+    def detach(self, client: Client) -> None:
+        """Stop exporting updates received by client
+
+        :param client: client
+        :type client: Client
+        """
+        if client is not self._client:
+            raise ValueError("Client is not attached to sink")
+        client.remove_update_handler(self.add)
+        self._client = None
+
+    def add(self, key: DataKey, payload: str) -> None:
+        """Add update to current batch
+
+        :param key: key
+        :type key: DataKey
+        :param payload: payload
+        :type payload: str
+        """
+        with self._lock:
+            self._batch.append(time.time(), key, payload)
+            if len(self._batch) >= self._batch_size:
+                self._submit()
+
+    def _take(self) -> Batch | None:
+        """Take current batch if not empty. Lock must be held"""
+        if not self._batch:
+            return None
+        batch, self._batch = self._batch, Batch()
+        return batch
+
+    def _submit(self) -> None:
+        """Queue current batch for writing. Lock must be held"""
+        if (batch := self._take()) is None:
+            return
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            self.stats.dropped_rows += len(batch)
+            _LOGGER.warning("Export queue full, dropped %s rows", len(batch))
+
+    def start(self) -> None:
+        """Start writer thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"pysaleryd-{type(self).__name__}", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Detach client, write remaining updates and stop writer thread"""
+        if self._client is not None:
+            self.detach(self._client)
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        with self._lock:
+            batch = self._take()
+        if batch is not None and not self._put(thread, batch):
+            self.stats.dropped_rows += len(batch)
+            _LOGGER.warning("Export writer stopped, dropped %s rows", len(batch))
+        self._put(thread, None)
+        thread.join()
+
+    def _put(self, thread: threading.Thread, batch: Batch | None) -> bool:
+        """Queue batch, or end of batches, while writer thread is running"""
+        while thread.is_alive():
+            try:
+                self._queue.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        self._open()
+        try:
+            while True:
+                try:
+                    batch = self._queue.get(timeout=self._flush_interval)
+                except queue.Empty:
+                    with self._lock:
+                        batch = self._take()
+                    if batch is None:
+                        continue
+                if batch is None:
+                    break
+                self._flush(batch)
+        finally:
+            self._close()
+
+    def _flush(self, batch: Batch) -> None:
+        start = time.perf_counter()
+        try:
+            self._write(batch)
+        except Exception:
+            self.stats.dropped_rows += len(batch)
+            _LOGGER.exception("Failed to write %s rows", len(batch))
+            return
+        latency = time.perf_counter() - start
+        self.stats.rows += len(batch)
+        self.stats.batches += 1
+        self.stats.last_flush_latency = latency
+        self.stats.max_flush_latency = max(self.stats.max_flush_latency, latency)
+
+    def _open(self) -> None:
+        """Open output, called from writer thread"""
+
+    @abc.abstractmethod
+    def _write(self, batch: Batch) -> None:
+        """Write batch, called from writer thread"""
+
+    def _close(self) -> None:
+        """Close output, called from writer thread"""
+
+    def __enter__(self) -> ExportSink:
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        self.close()
+
+
+class SQLiteSink(ExportSink):
+    """Export updates to SQLite database
+
+    Updates are inserted into table with one transaction per batch. Keys are
+    stored as ids referencing table ``<table>_keys``, populated from
+    :class:`~pysaleryd.const.DataKey`.
+    """
+
+    def __init__(self, path: str | os.PathLike, table: str = "updates", **kwargs):
+        """Initiate sink
+
+        :param path: path of database
+        :type path: str | os.PathLike
+        :param table: name of table, defaults to "updates"
+        :type table: str, optional
+        :param kwargs: options passed to :class:`ExportSink`
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table}")
+        super().__init__(**kwargs)
+        self._path = path
+        self._table = table
+        self._db: sqlite3.Connection | None = None
+
+    def _open(self) -> None:
+        self._db = sqlite3.connect(self._path)
+        with self._db:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table}_keys "
+                "(id INTEGER PRIMARY KEY, name TEXT NOT NULL, code TEXT NOT NULL)"
+            )
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO {self._table}_keys VALUES (?, ?, ?)",
+                [(i, key.name, str(key)) for i, key in enumerate(KEYS)],
+            )
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "timestamp REAL NOT NULL, "
+                f"key INTEGER NOT NULL REFERENCES {self._table}_keys(id), "
+                "value REAL, min_value REAL, max_value REAL, extra REAL, payload TEXT)"
+            )
+
+    def _write(self, batch: Batch) -> None:
+        assert self._db is not None
+        # NaN is stored as NULL
+        with self._db:
+            self._db.executemany(
+                f"INSERT INTO {self._table} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(*(getattr(batch, column) for column in COLUMNS)),
+            )
+
+    def _close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_MAGIC = b"PSLRYD1\n"
+_GROUP = struct.Struct("<QI")  # byte length, rows
+_SIZE = struct.Struct("<I")
+
+
+def _to_le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class ColumnarFileSink(ExportSink):
+    """Export updates to append only columnar file
+
+    The file starts with a JSON header holding the key dictionary and columns.
+    Each batch is appended as a row group storing every column contiguously:
+    float64 arrays, uint16 key indexes and utf-8 payloads with uint32 offsets,
+    all little endian. Read with :func:`read_columnar`.
+    """
+
+    def __init__(self, path: str | os.PathLike, **kwargs):
+        """Initiate sink
+
+        :param path: path of file
+        :type path: str | os.PathLike
+        :param kwargs: options passed to :class:`ExportSink`
+        """
+        super().__init__(**kwargs)
+        self._path = path
+        self._file: IO[bytes] | None = None
+
+    def _open(self) -> None:
+        self._file = file = open(self._path, "ab")
+        if file.tell() == 0:
+            header = json.dumps(
+                {"keys": [[key.name, str(key)] for key in KEYS], "columns": COLUMNS}
+            ).encode()
+            file.write(_MAGIC + _SIZE.pack(len(header)) + header)
+
+    def _write(self, batch: Batch) -> None:
+        assert self._file is not None
+        encoded = [p.encode() for p in batch.payload]
+        offsets = array("I", [0])
+        for p in encoded:
+            offsets.append(offsets[-1] + len(p))
+        parts = [
+            _to_le(batch.timestamp),
+            _to_le(batch.key),
+            _to_le(batch.value),
+            _to_le(batch.min_value),
+            _to_le(batch.max_value),
+            _to_le(batch.extra),
+            _to_le(offsets),
+            b"".join(encoded),
+        ]
+        body = b"".join(_SIZE.pack(len(part)) + part for part in parts)
+        self._file.write(_GROUP.pack(len(body), len(batch)) + body)
+        self._file.flush()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_columnar(path: str | os.PathLike) -> Iterator[dict[str, list]]:
+    """Read row groups written by :class:`ColumnarFileSink`
+
+    :param path: path of file
+    :type path: str | os.PathLike
+    :yield: columns of row group, keys decoded to :class:`~pysaleryd.const.DataKey`
+    :rtype: Iterator[dict[str, list]]
+    """
+    with open(path, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a columnar export file")
+        (size,) = _SIZE.unpack(f.read(_SIZE.size))
+        header = json.loads(f.read(size))
+        keys = [DataKey(code) for _, code in header["keys"]]
+        while group := f.read(_GROUP.size):
+            length, _ = _GROUP.unpack(group)
+            body = memoryview(f.read(length))
+            parts = []
+            pos = 0
+            while pos < len(body):
+                (size,) = _SIZE.unpack_from(body, pos)
+                parts.append(bytes(body[pos + _SIZE.size : pos + _SIZE.size + size]))
+                pos += _SIZE.size + size
+            timestamp, key, value, min_value, max_value, extra, offsets, payload = parts
+            offsets_array = _from_le("I", offsets)
+            yield {
+                "timestamp": _from_le("d", timestamp).tolist(),
+                "key": [keys[i] for i in _from_le("H", key)],
+                "value": _from_le("d", value).tolist(),
+                "min_value": _from_le("d", min_value).tolist(),
+                "max_value": _from_le("d", max_value).tolist(),
+                "extra": _from_le("d", extra).tolist(),
+                "payload": [
+                    payload[start:end].decode()
+                    for start, end in zip(offsets_array, offsets_array[1:])
+                ],
+            }
@@ -0,0 +1,341 @@
+"""HTTP/JSON gateway serving the state of a client"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import secrets
+from http import HTTPStatus
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlsplit
+
+from websockets.protocol import State
+
+from .const import DataKey
+from .data import SystemProperty
+
+if TYPE_CHECKING:
+    from .client import Client
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+_MAX_BODY = 64 * 1024
+
+
+class _Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, list[str]],
+        headers: dict[str, str],
+        body: bytes,
+    ) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class _BadRequest(Exception):
+    """Malformed request"""
+
+
+class Gateway:
+    """HTTP/JSON gateway over one client
+
+    Consumers that cannot speak the websocket protocol poll the gateway instead
+    of the unit. The state is encoded once per version and served with an
+    ETag, so unchanged polls are answered with 304. The version is incremented
+    when a value or the connection state changes. Clients see it as an opaque
+    token that includes a random epoch of the gateway, so tokens from before a
+    restart never match.
+
+    Endpoints:
+
+    - ``GET /state`` decoded state. With ``If-None-Match`` or ``?version=`` and
+      ``?wait=seconds`` the request is held until the state changes (long-poll)
+    - ``GET /events`` server-sent events with the state on each change
+    - ``POST /command`` ``{"key": "MF", "value": 0}`` sent with
+      :meth:`~pysaleryd.client.Client.send_command`
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        max_wait: float = 60.0,
+        keepalive_interval: float = 15.0,
+    ) -> None:
+        """Initiate gateway
+
+        :param client: client to serve
+        :type client: Client
+        :param host: address to listen on, defaults to "127.0.0.1"
+        :type host: str, optional
+        :param port: port to listen on, 0 for any free port, defaults to 8080
+        :type port: int, optional
+        :param max_wait: max seconds a long-poll is held, defaults to 60.0
+        :type max_wait: float, optional
+        :param keepalive_interval: seconds between keepalive comments on event
+            streams, defaults to 15.0
+        :type keepalive_interval: float, optional
+        """
+        self._client = client
+        self._host = host
+        self._port = port
+        self._max_wait = max_wait
+        self._keepalive_interval = keepalive_interval
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._version = 0
+        self._epoch = secrets.token_hex(4)
+        self._values: dict[DataKey, str] = {}
+        self._body: tuple[int, bytes] | None = None
+        self._changed: asyncio.Future[None] | None = None
+
+    @property
+    def version(self) -> int:
+        """Version of served state"""
+        return self._version
+
+    @property
+    def port(self) -> int:
+        """Port the gateway listens on"""
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self) -> None:
+        """Start serving"""
+        self._client.add_update_handler(self._on_update)
+        self._client.add_state_change_handler(self._on_state_change)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._host, self._port
+        )
+        _LOGGER.info("Gateway listening on %s:%s", self._host, self.port)
+
+    async def close(self) -> None:
+        """Stop serving and close open connections"""
+        if self._server is None:
+            return
+        self._client.remove_update_handler(self._on_update)
+        self._client.remove_state_change_handler(self._on_state_change)
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+        self._notify()
+
+    async def __aenter__(self) -> Gateway:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def _on_update(self, key: DataKey, payload: str) -> None:
+        if self._values.get(key) != payload:
+            self._values[key] = payload
+            self._bump()
+
+    def _on_state_change(self, state: State | None) -> None:
+        self._bump()
+
+    def _bump(self) -> None:
+        self._version += 1
+        self._notify()
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set_result(None)
+            self._changed = None
+
+    async def _wait_for_change(self, version: int, timeout: float) -> bool:
+        """Wait until version differs, return False on timeout"""
+        try:
+            async with asyncio.timeout(timeout):
+                while self._version == version and self._server is not None:
+                    if self._changed is None:
+                        self._changed = asyncio.get_running_loop().create_future()
+                    await asyncio.shield(self._changed)
+        except TimeoutError:
+            return False
+        return self._version != version
+
+    def _token(self, version: int) -> str:
+        """Version token of ETag, ``?version=`` and events"""
+        return f"{self._epoch}-{version}"
+
+    def _state_body(self) -> tuple[int, bytes]:
+        """Encoded state, cached per version"""
+        if self._body is None or self._body[0] != self._version:
+            data = {}
+            for key, payload in self._client.data.items():
+                prop = SystemProperty.from_str(key, payload)
+                data[str(key)] = {
+                    "value": prop.value,
+                    "min_value": prop.min_value,
+                    "max_value": prop.max_value,
+                    "extra": prop.extra,
+                }
+            state = self._client.state
+            self._body = (
+                self._version,
+                json.dumps(
+                    {
+                        "version": self._token(self._version),
+                        "state": state.name if state is not None else None,
+                        "errors": self._client.errors,
+                        "data": data,
+                    }
+                ).encode(),
+            )
+        return self._body
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest as e:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, _error(e))
+                    break
+                if request is None:
+                    break
+                if not await self._dispatch(request, writer) or not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            _LOGGER.exception("Error handling gateway request")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> _Request | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError as e:
+            raise _BadRequest("Malformed request line") from e
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError as e:
+            raise _BadRequest("Invalid Content-Length") from e
+        if length > _MAX_BODY:
+            raise _BadRequest("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return _Request(method, url.path, parse_qs(url.query), headers, body)
+
+    async def _dispatch(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        """Handle request, return False if connection should be closed"""
+        route = (request.method, request.path)
+        if route == ("GET", "/state"):
+            await self._get_state(request, writer)
+        elif route == ("GET", "/events"):
+            await self._get_events(writer)
+            return False
+        elif route == ("POST", "/command"):
+            await self._post_command(request, writer)
+        elif request.path in ("/state", "/events", "/command"):
+            await self._respond(writer, HTTPStatus.METHOD_NOT_ALLOWED)
+        else:
+            await self._respond(writer, HTTPStatus.NOT_FOUND)
+        return True
+
+    async def _get_state(self, request: _Request, writer: asyncio.StreamWriter):
+        known: str | None = None
+        if "version" in request.query:
+            known = request.query["version"][0]
+        elif (etag := request.headers.get("if-none-match")) is not None:
+            known = etag.removeprefix("W/").strip('"')
+        try:
+            wait = min(float(request.query.get("wait", ["0"])[0]), self._max_wait)
+        except ValueError:
+            wait = 0.0
+        if known == self._token(self._version) and wait > 0:
+            await self._wait_for_change(self._version, wait)
+        version, body = self._state_body()
+        token = self._token(version)
+        headers = {"ETag": f'"{token}"', "Cache-Control": "no-cache"}
+        if known == token:
+            await self._respond(writer, HTTPStatus.NOT_MODIFIED, headers=headers)
+        else:
+            await self._respond(writer, HTTPStatus.OK, body, headers)
+
+    async def _get_events(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        version = None
+        while self._server is not None:
+            if version != self._version:
+                version, body = self._state_body()
+                writer.write(
+                    b"id: %s\nevent: state\ndata: %s\n\n"
+                    % (self._token(version).encode(), body)
+                )
+            elif not await self._wait_for_change(version, self._keepalive_interval):
+                writer.write(b": keepalive\n\n")
+            await writer.drain()
+
+    async def _post_command(self, request: _Request, writer: asyncio.StreamWriter):
+        try:
+            command = json.loads(request.body)
+            key = command["key"]
+            key = DataKey[key] if key in DataKey.__members__ else DataKey(key)
+            value = command["value"]
+        except (ValueError, KeyError, TypeError) as e:
+            await self._respond(
+                writer, HTTPStatus.BAD_REQUEST, _error(f"Invalid command: {e!r}")
+            )
+            return
+        delivery = await self._client.send_command(key, value)
+        await self._respond(
+            writer,
+            HTTPStatus.OK,
+            json.dumps({"key": str(key), "status": str(delivery.status)}).encode(),
+        )
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        head = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        if body:
+            head.append("Content-Type: application/json")
+        head.append(f"Content-Length: {len(body)}")
+        head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write("\r\n".join(head).encode("latin-1") + b"\r\n\r\n" + body)
+        await writer.drain()
+
+
+def _error(message: object) -> bytes:
+    return json.dumps({"error": str(message)}).encode()
@@ -0,0 +1,211 @@
+"""Per-handler call cadences driven by one timer heap"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from typing import Callable, Hashable
+
+from .clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
+
+
+class Cadence:
+    """When a data handler is called
+
+    Options can be combined, the handler is called when the first of them is
+    due.
+    """
+
+    __slots__ = ("interval", "on_change", "min_interval", "max_staleness")
+
+    def __init__(
+        self,
+        interval: float | None = None,
+        on_change: bool = False,
+        min_interval: float = 0.0,
+        max_staleness: float | None = None,
+    ) -> None:
+        """Initiate cadence
+
+        :param interval: call at fixed interval in seconds, defaults to None
+        :type interval: float | None, optional
+        :param on_change: call when a value has changed, defaults to False
+        :type on_change: bool, optional
+        :param min_interval: min seconds between calls on change, defaults to 0.0
+        :type min_interval: float, optional
+        :param max_staleness: call if not called for this many seconds, defaults
+            to None
+        :type max_staleness: float | None, optional
+        """
+        if interval is None and not on_change and max_staleness is None:
+            raise ValueError("Cadence must have interval, on_change or max_staleness")
+        self.interval = interval
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_staleness = max_staleness
+
+    def __repr__(self) -> str:
+        return (
+            f"Cadence(interval={self.interval}, on_change={self.on_change}, "
+            f"min_interval={self.min_interval}, max_staleness={self.max_staleness})"
+        )
+
+
+class _Entry:
+    __slots__ = ("handler", "cadence", "last_call", "changed", "due")
+
+    def __init__(self, handler: Hashable, cadence: Cadence, now: float) -> None:
+        self.handler = handler
+        self.cadence = cadence
+        self.last_call = now
+        self.changed = False
+        self.due: float | None = None
+
+    def next_due(self) -> float | None:
+        cadence = self.cadence
+        due = None
+        if cadence.interval is not None:
+            due = self.last_call + cadence.interval
+        if cadence.max_staleness is not None:
+            stale = self.last_call + cadence.max_staleness
+            due = stale if due is None else min(due, stale)
+        if self.changed:
+            change = self.last_call + cadence.min_interval
+            due = change if due is None else min(due, change)
+        return due
+
+
+class CadenceScheduler:
+    """Schedule calls of handlers with different cadences
+
+    All handlers share one heap of due times and one timer armed for the
+    earliest of them, so cost does not grow with the number of cadences.
+    Rescheduled entries are left in the heap and skipped when popped.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[list], None],
+        clock: Clock = DEFAULT_CLOCK,
+    ) -> None:
+        """Initiate scheduler
+
+        :param callback: called with the handlers that are due
+        :type callback: Callable[[list], None]
+        :param clock: clock of timers, defaults to DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        self._callback = callback
+        self._clock = clock
+        self._entries: dict[Hashable, _Entry] = {}
+        self._on_change: list[_Entry] = []
+        self._heap: list[tuple[float, int, _Entry]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | VirtualTimerHandle | None = None
+        self._timer_due: float | None = None
+        self._running = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, handler: Hashable) -> bool:
+        return handler in self._entries
+
+    def add(self, handler: Hashable, cadence: Cadence) -> None:
+        """Add or replace handler
+
+        :param handler: handler
+        :type handler: Hashable
+        :param cadence: cadence of calls
+        :type cadence: Cadence
+        """
+        self.remove(handler)
+        entry = _Entry(handler, cadence, self._clock.time())
+        self._entries[handler] = entry
+        if cadence.on_change:
+            self._on_change.append(entry)
+        self._schedule(entry)
+
+    def remove(self, handler: Hashable) -> None:
+        """Remove handler, if added
+
+        :param handler: handler
+        :type handler: Hashable
+        """
+        if (entry := self._entries.pop(handler, None)) is None:
+            return
+        entry.due = None
+        if entry.cadence.on_change:
+            self._on_change.remove(entry)
+
+    def changed(self) -> None:
+        """Notify that a value has changed"""
+        for entry in self._on_change:
+            if not entry.changed:
+                entry.changed = True
+                self._schedule(entry)
+
+    def start(self) -> None:
+        """Start calling handlers, restarting all cadences from now"""
+        self._running = True
+        now = self._clock.time()
+        for entry in self._entries.values():
+            entry.last_call = now
+            self._schedule(entry)
+        self._arm()
+
+    def stop(self) -> None:
+        """Stop calling handlers"""
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_due = None
+
+    def _schedule(self, entry: _Entry) -> None:
+        due = entry.next_due()
+        if due == entry.due:
+            return
+        entry.due = due
+        if due is None:
+            return
+        heapq.heappush(self._heap, (due, next(self._counter), entry))
+        self._arm()
+
+    def _arm(self) -> None:
+        """Arm timer for earliest due entry"""
+        if not self._running:
+            return
+        while self._heap and self._heap[0][2].due != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+        due = self._heap[0][0]
+        if self._timer_due is not None and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_due = due
+        self._timer = self._clock.call_later(due - self._clock.time(), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._timer_due = None
+        now = self._clock.time()
+        handlers = []
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, entry = heapq.heappop(self._heap)
+            if entry.due != due:
+                continue
+            handlers.append(entry.handler)
+            fired.append(entry)
+        for entry in fired:
+            entry.last_call = now
+            entry.changed = False
+            entry.due = None
+            self._schedule(entry)
+        self._arm()
+        if handlers:
+            self._callback(handlers)
@@ -0,0 +1,164 @@
+"""Clocks driving the timers of clients and connections"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+
+class Clock:
+    """Clock and timer scheduler in real time, backed by the event loop"""
+
+    def time(self) -> float:
+        """Monotonic time in seconds"""
+        return time.monotonic()
+
+    async def sleep(self, delay: float) -> None:
+        """Sleep for delay seconds"""
+        await asyncio.sleep(delay)
+
+    def call_later(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> asyncio.TimerHandle | VirtualTimerHandle:
+        """Schedule callback to be called after delay seconds
+
+        :param delay: delay in seconds
+        :type delay: float
+        :param callback: callback
+        :type callback: Callable[..., Any]
+        :return: handle that can be cancelled
+        :rtype: asyncio.TimerHandle | VirtualTimerHandle
+        """
+        return asyncio.get_running_loop().call_later(delay, callback, *args)
+
+    def timeout(self, delay: float | None):
+        """Async context manager raising TimeoutError when delay has passed
+
+        :param delay: delay in seconds, None for no timeout
+        :type delay: float | None
+        """
+        return asyncio.timeout(delay)
+
+
+DEFAULT_CLOCK = Clock()
+"""Real time clock used unless another clock is given"""
+
+
+class VirtualTimerHandle:
+    """Timer scheduled on a virtual clock"""
+
+    __slots__ = ("when", "_callback", "_args", "_cancelled")
+
+    def __init__(self, when: float, callback: Callable[..., Any], args: tuple):
+        self.when = when
+        self._callback = callback
+        self._args = args
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel timer"""
+        self._cancelled = True
+
+    def cancelled(self) -> bool:
+        """Timer has been cancelled"""
+        return self._cancelled
+
+    def _run(self) -> None:
+        self._callback(*self._args)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class VirtualClock(Clock):
+    """Clock where time only passes when advanced
+
+    Timers are kept in a heap and fired in order by :meth:`advance`, which lets
+    the event loop run the woken up tasks between timers. Hours of timer driven
+    behavior run in milliseconds, using the same code paths as real time.
+    """
+
+    settle_iterations = 20
+    """Event loop iterations run after each fired timer"""
+
+    def __init__(self, start: float = 0.0) -> None:
+        """Initiate clock
+
+        :param start: initial time, defaults to 0.0
+        :type start: float, optional
+        """
+        self._now = start
+        self._timers: list[tuple[float, int, VirtualTimerHandle]] = []
+        self._counter = itertools.count()
+
+    def time(self) -> float:
+        """Virtual time in seconds"""
+        return self._now
+
+    async def sleep(self, delay: float) -> None:
+        """Sleep until virtual time has advanced delay seconds"""
+        future = asyncio.get_running_loop().create_future()
+        handle = self.call_later(delay, _resolve, future)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    def call_later(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> VirtualTimerHandle:
+        """Schedule callback to be called when virtual time has advanced delay
+        seconds"""
+        handle = VirtualTimerHandle(self._now + max(delay, 0.0), callback, args)
+        heapq.heappush(self._timers, (handle.when, next(self._counter), handle))
+        return handle
+
+    @asynccontextmanager
+    async def timeout(self, delay: float | None) -> AsyncIterator[None]:
+        """Async context manager raising TimeoutError when virtual time has
+        advanced delay seconds"""
+        async with asyncio.timeout(None) as timeout:
+            # Rescheduling to a time in the past expires the timeout
+            handle = (
+                self.call_later(delay, timeout.reschedule, 0.0)
+                if delay is not None
+                else None
+            )
+            try:
+                yield
+            finally:
+                if handle is not None:
+                    handle.cancel()
+
+    @property
+    def pending(self) -> int:
+        """Number of scheduled timers"""
+        return sum(not handle.cancelled() for _, _, handle in self._timers)
+
+    async def advance(self, seconds: float) -> None:
+        """Advance virtual time, firing due timers in order
+
+        :param seconds: seconds to advance
+        :type seconds: float
+        """
+        end = self._now + seconds
+        await self._settle()
+        while self._timers and self._timers[0][0] <= end:
+            when, _, handle = heapq.heappop(self._timers)
+            if handle.cancelled():
+                continue
+            self._now = max(self._now, when)
+            handle._run()
+            await self._settle()
+        self._now = end
+        await self._settle()
+
+    async def _settle(self) -> None:
+        for _ in range(self.settle_iterations):
+            await asyncio.sleep(0)
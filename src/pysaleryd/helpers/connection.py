@@ -0,0 +1,270 @@
+"""Connection to HRV unit shared between clients"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from websockets.protocol import State
+
+from ..const import CommandPriority, DataKey, MessageContext
+from ..data import DataSnapshot, Message, ParseError, UnsupportedMessageType
+from .clock import DEFAULT_CLOCK, Clock
+from .error_cache import ERROR_FRAME_KEYS, ErrorCache
+from .log import LogBudget
+from .transport import TransportOptions
+from .websocket import ReconnectingWebsocketClient
+
+if TYPE_CHECKING:
+    from ..client import Client
+
+_LOGGER = logging.getLogger(__name__)
+
+_RegistryKey = tuple[asyncio.AbstractEventLoop | None, str, int]
+_REGISTRY: dict[_RegistryKey, Connection] = {}
+
+
+class Connection:
+    """Websocket connection and decoded state of one HRV unit
+
+    A connection is reference counted by the clients using it. The websocket
+    is opened when the first client connects and closed when the last client
+    disconnects.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        connect_timeout: int = 15,
+        send_rate: float | None = None,
+        send_burst: int = 5,
+        log_budget: LogBudget | None = None,
+        clock: Clock = DEFAULT_CLOCK,
+        transport: TransportOptions | None = None,
+    ) -> None:
+        self._host = host
+        self._port = port
+        self._options = (
+            connect_timeout,
+            send_rate,
+            send_burst,
+            log_budget,
+            clock,
+            transport,
+        )
+        self._registry_key: _RegistryKey | None = None
+        self._data = DataSnapshot()
+        self._is_frozen = False
+        # Incremented when a value changes, unlike version
+        self.changes = 0
+        self.timestamps: dict[DataKey, float] = {}
+        self.stale: set[DataKey] = set()
+        self._error_cache = ErrorCache()
+        self._clients: set[Client] = set()
+        self._lock = asyncio.Lock()
+        self.websocket = ReconnectingWebsocketClient(
+            host=host,
+            port=port,
+            connect_timeout=connect_timeout,
+            on_message=self._on_message,
+            on_connect=self._send_start_message,
+            on_state_change=self._on_state_change,
+            send_rate=send_rate,
+            send_burst=send_burst,
+            log_budget=log_budget,
+            clock=clock,
+            transport=transport,
+        )
+
+    @property
+    def state(self) -> State | None:
+        """State of the underlying websocket connection"""
+        return self.websocket.state
+
+    @property
+    def data(self) -> DataSnapshot:
+        """Current data. Updated in place until a snapshot is taken"""
+        return self._data
+
+    @property
+    def errors(self) -> ErrorCache:
+        """Errors reported by the unit"""
+        return self._error_cache
+
+    @property
+    def version(self) -> int:
+        """Version of data, incremented on every update"""
+        return self._data.version
+
+    def snapshot(self) -> DataSnapshot:
+        """Take immutable snapshot of current data
+
+        The current data is frozen and copied on the next update, so taking a
+        snapshot is constant time.
+
+        :return: snapshot of data
+        :rtype: DataSnapshot
+        """
+        self._is_frozen = True
+        return self._data
+
+    def _set(self, key: DataKey, payload: str) -> None:
+        """Set value, copying data first if it has been snapshotted"""
+        if self._is_frozen:
+            self._data = DataSnapshot(self._data, self._data.version)
+            self._is_frozen = False
+        if dict.get(self._data, key) != payload:
+            self.changes += 1
+        dict.__setitem__(self._data, key, payload)
+        self._data.version += 1
+
+    def __len__(self) -> int:
+        """Number of clients using the connection"""
+        return len(self._clients)
+
+    async def acquire(self, client: Client) -> None:
+        """Add client to connection, connect if it is the first client
+
+        :param client: client to add
+        :type client: Client
+        """
+        async with self._lock:
+            is_first = not self._clients
+            self._clients.add(client)
+            if is_first:
+                try:
+                    await self.websocket.connect()
+                except BaseException:
+                    self._clients.discard(client)
+                    await self.websocket.close()
+                    raise
+
+    async def release(self, client: Client) -> None:
+        """Remove client from connection, close if it was the last client
+
+        :param client: client to remove
+        :type client: Client
+        """
+        async with self._lock:
+            self._clients.discard(client)
+            if not self._clients:
+                await self.websocket.close()
+                key = self._registry_key
+                if key is not None and _REGISTRY.get(key) is self:
+                    del _REGISTRY[key]
+
+    def restore(self, snapshot: dict[DataKey, tuple[str, float]]) -> None:
+        """Restore data from snapshot. Restored keys are marked as stale
+        until updated by the unit
+
+        :param snapshot: payload and time of last update for each key
+        :type snapshot: dict[DataKey, tuple[str, float]]
+        """
+        for key, (payload, timestamp) in snapshot.items():
+            if key in self._data:
+                continue
+            self._set(key, payload)
+            self.timestamps[key] = timestamp
+            self.stale.add(key)
+
+    def _update(self, key: DataKey, payload: str) -> None:
+        self._set(key, payload)
+        self.timestamps[key] = time.time()
+        self.stale.discard(key)
+
+    async def _send_start_message(self) -> None:
+        """Send start message to server to begin receiving data"""
+        message = Message(DataKey.NONE, "")
+        await self.websocket.send(message.encode(), CommandPriority.CONTROL)
+
+    async def _on_state_change(self, state: State | None) -> None:
+        for client in list(self._clients):
+            await client._on_state_change(state)
+
+    async def _on_message(self, msg: str) -> None:
+        """Decode message, update data and notify clients"""
+        try:
+            message = Message.decode(msg)
+        except ParseError as e:
+            _LOGGER.error(e, exc_info=True)
+            return
+        except UnsupportedMessageType as e:
+            _LOGGER.debug("Unsupported message type: %s", e, exc_info=True)
+            return
+
+        if message.message_context != MessageContext.NONE:
+            self.websocket.acknowledge(
+                message.key, message.message_context == MessageContext.ACK_OK
+            )
+
+        if message.key in ERROR_FRAME_KEYS:
+            if (change := self._error_cache.handle(message)) is not None:
+                self._update(DataKey.ERROR_MESSAGE, str(list(change.errors)))
+                for client in list(self._clients):
+                    await client._on_error_change(change)
+        else:
+            self._update(message.key, message.payload)
+        for client in list(self._clients):
+            await client._on_message(message)
+
+
+def get_connection(
+    host: str,
+    port: int,
+    connect_timeout: int = 15,
+    send_rate: float | None = None,
+    send_burst: int = 5,
+    log_budget: LogBudget | None = None,
+    clock: Clock = DEFAULT_CLOCK,
+    transport: TransportOptions | None = None,
+) -> Connection:
+    """Get shared connection for host and port in the running event loop,
+    create it if needed. Options are only applied when the connection is
+    created, a warning is logged if they differ from the existing connection
+
+    :param host: host of the unit
+    :type host: str
+    :param port: port
+    :type port: int
+    :param connect_timeout: timeout when establishing connection, defaults to 15
+    :type connect_timeout: int, optional
+    :param send_rate: maximum messages sent per second, defaults to None
+    :type send_rate: float | None, optional
+    :param send_burst: number of messages that may be sent back to back,
+        defaults to 5
+    :type send_burst: int, optional
+    :param log_budget: logging budget of connection, defaults to None
+    :type log_budget: LogBudget | None, optional
+    :param clock: clock of timers, defaults to DEFAULT_CLOCK
+    :type clock: Clock, optional
+    :param transport: websocket transport options, defaults to None (tuned
+        defaults of :class:`TransportOptions`)
+    :type transport: TransportOptions | None, optional
+    :return: shared connection
+    :rtype: Connection
+    """
+    try:
+        loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    # Drop connections of closed event loops
+    for key in [key for key in _REGISTRY if key[0] is not None and key[0].is_closed()]:
+        del _REGISTRY[key]
+
+    key = (loop, host, port)
+    options = (connect_timeout, send_rate, send_burst, log_budget, clock, transport)
+    if (connection := _REGISTRY.get(key)) is None:
+        connection = Connection(host, port, *options)
+        connection._registry_key = key
+        _REGISTRY[key] = connection
+    elif connection._options != options:
+        _LOGGER.warning(
+            "Shared connection to %s:%s already exists with other options, "
+            "ignoring options of new client",
+            host,
+            port,
+        )
+    return connection
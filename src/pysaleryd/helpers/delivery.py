@@ -0,0 +1,107 @@
+"""Delivery tracking of outgoing messages"""
+
+from __future__ import annotations
+
+import asyncio
+
+from ..const import CommandPriority, DeliveryStatus
+from .clock import DEFAULT_CLOCK, Clock
+
+_FINAL = frozenset(
+    {
+        DeliveryStatus.ACKNOWLEDGED,
+        DeliveryStatus.REJECTED,
+        DeliveryStatus.EXPIRED,
+        DeliveryStatus.OVERFLOWED,
+    }
+)
+
+
+class Delivery:
+    """Outgoing message and its delivery status
+
+    Messages with an ack_key are kept until acknowledged by the unit and resent
+    after reconnect. Messages with a deadline are dropped once it has passed.
+    """
+
+    __slots__ = (
+        "message",
+        "priority",
+        "ack_key",
+        "deadline",
+        "status",
+        "_future",
+        "_clock",
+    )
+
+    def __init__(
+        self,
+        message: str,
+        priority: CommandPriority = CommandPriority.INTERACTIVE,
+        ack_key: str | None = None,
+        ttl: float | None = None,
+        clock: Clock = DEFAULT_CLOCK,
+    ) -> None:
+        """Initiate delivery
+
+        :param message: message to send
+        :type message: str
+        :param priority: priority class, defaults to CommandPriority.INTERACTIVE
+        :type priority: CommandPriority, optional
+        :param ack_key: key of acknowledgement, defaults to None (not tracked)
+        :type ack_key: str | None, optional
+        :param ttl: time to live in seconds, defaults to None (never expires)
+        :type ttl: float | None, optional
+        :param clock: clock of deadline and timeouts, defaults to DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        self.message = message
+        self.priority = priority
+        self.ack_key = ack_key
+        self._clock = clock
+        self.deadline = clock.time() + ttl if ttl is not None else None
+        self.status = DeliveryStatus.PENDING
+        self._future: asyncio.Future[DeliveryStatus] | None = None
+
+    def __repr__(self) -> str:
+        return f"Delivery({self.message!r}, status={self.status})"
+
+    @property
+    def expired(self) -> bool:
+        """Deadline has passed"""
+        return self.deadline is not None and self._clock.time() > self.deadline
+
+    @property
+    def done(self) -> bool:
+        """Delivery has reached a final status"""
+        return self.status in _FINAL or (
+            self.status == DeliveryStatus.SENT and self.ack_key is None
+        )
+
+    def set_status(self, status: DeliveryStatus) -> None:
+        """Update status and wake up waiters if final
+
+        :param status: new status
+        :type status: DeliveryStatus
+        """
+        self.status = status
+        if self.done and self._future is not None and not self._future.done():
+            self._future.set_result(status)
+
+    async def wait(self, timeout: float | None = None) -> DeliveryStatus:
+        """Wait for delivery to reach a final status
+
+        :param timeout: timeout in seconds, defaults to None
+        :type timeout: float | None, optional
+        :return: status, which is not final if timeout passed
+        :rtype: DeliveryStatus
+        """
+        if not self.done:
+            if self._future is None:
+                self._future = asyncio.get_running_loop().create_future()
+            try:
+                async with self._clock.timeout(timeout):
+                    await asyncio.shield(self._future)
+            except TimeoutError:
+                pass
+        return self.status
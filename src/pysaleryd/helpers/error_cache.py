@@ -1,36 +1,68 @@
 from __future__ import annotations
 
+import time
+from collections import deque
+
 from pysaleryd.data import DataKey, Message
 
+ERROR_FRAME_KEYS = frozenset(
+    {DataKey.ERROR_FRAME_START, DataKey.ERROR_MESSAGE, DataKey.ERROR_FRAME_END}
+)
+
+
+class ErrorChange:
+    """Change of active errors between two error frames"""
+
+    __slots__ = ("errors", "raised", "cleared", "timestamp")
+
+    def __init__(
+        self,
+        errors: tuple[str, ...],
+        raised: tuple[str, ...],
+        cleared: tuple[str, ...],
+        timestamp: float,
+    ) -> None:
+        self.errors = errors
+        self.raised = raised
+        self.cleared = cleared
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return (
+            f"ErrorChange(errors={self.errors}, raised={self.raised}, "
+            f"cleared={self.cleared})"
+        )
+
 
 class ErrorCache:
     """Error cache, caches previous data until frame is complete"""
 
-    def __init__(self) -> None:
-        self._current: list[str] = []
+    def __init__(self, history_size: int = 100) -> None:
+        self._current: tuple[str, ...] | None = None
         self._next: list[str] = []
         self._is_collecting = False
+        self.history: deque[ErrorChange] = deque(maxlen=history_size)
 
-    def handle(self, message: Message) -> list[str] | None:
-        """Handle error message, return error messages if frame is completed"""
+    def handle(self, message: Message) -> ErrorChange | None:
+        """Handle error message, return change if frame is completed and
+        differs from the previous frame"""
         if message.key == DataKey.ERROR_FRAME_START:
             self.__begin_frame()
         elif message.key == DataKey.ERROR_MESSAGE:
             self.__add(message.payload)
         elif message.key == DataKey.ERROR_FRAME_END:
-            self.__end_frame()
-            return self.data
-        # Not an error message
+            return self.__end_frame()
+        # Not an error message or frame not completed
         return None
 
     @property
-    def data(self):
+    def data(self) -> list[str]:
         """Return current error messages
 
         :return: error messages
         :rtype: list[str]
         """
-        return self._current
+        return list(self._current or ())
 
     def __add(self, message: str):
         """Add error message
@@ -38,15 +70,31 @@ class ErrorCache:
         :param message: error message
         :type message: str
         """
-        if self._is_collecting:
+        if self._is_collecting and message not in self._next:
             self._next.append(message)
 
-    def __end_frame(self):
-        """Mark data frame as complete"""
-        self._current = self._next
-        self._next = []
+    def __end_frame(self) -> ErrorChange | None:
+        """Mark data frame as complete, return change from previous frame"""
+        if not self._is_collecting:
+            return None
         self._is_collecting = False
+        errors = tuple(self._next)
+        self._next = []
+        previous = self._current
+        if errors == previous:
+            return None
+        self._current = errors
+        previous = previous or ()
+        change = ErrorChange(
+            errors,
+            tuple(e for e in errors if e not in previous),
+            tuple(e for e in previous if e not in errors),
+            time.time(),
+        )
+        self.history.append(change)
+        return change
 
     def __begin_frame(self):
         """Begin new frame"""
+        self._next = []
         self._is_collecting = True
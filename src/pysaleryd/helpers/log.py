@@ -0,0 +1,111 @@
+"""Logging helpers for the receive and send path"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+
+class LogBudget:
+    """Logging budget of a connection
+
+    Frame logging is only done when debug logging is enabled, and is then
+    sampled to every Nth frame and at most a number of frames per second.
+    Repeated warnings are logged at most once per interval, with a count of
+    the suppressed messages.
+    """
+
+    __slots__ = ("frame_every", "frames_per_second", "warning_interval")
+
+    def __init__(
+        self,
+        frame_every: int = 1,
+        frames_per_second: float | None = None,
+        warning_interval: float = 60.0,
+    ) -> None:
+        """Initiate budget
+
+        :param frame_every: log every Nth frame, defaults to 1
+        :type frame_every: int, optional
+        :param frames_per_second: max frames logged per second, defaults to None
+            (no limit)
+        :type frames_per_second: float | None, optional
+        :param warning_interval: min seconds between identical warnings,
+            defaults to 60.0
+        :type warning_interval: float, optional
+        """
+        self.frame_every = max(1, frame_every)
+        self.frames_per_second = frames_per_second
+        self.warning_interval = warning_interval
+
+
+class FrameSampler:
+    """Decide which frames to log"""
+
+    __slots__ = ("_every", "_per_second", "_count", "_second", "_logged")
+
+    def __init__(self, every: int = 1, per_second: float | None = None) -> None:
+        self._every = every
+        self._per_second = per_second
+        self._count = 0
+        self._second = 0
+        self._logged = 0
+
+    def sample(self) -> bool:
+        """Count frame, return True if it should be logged"""
+        self._count += 1
+        if self._count % self._every:
+            return False
+        if self._per_second is None:
+            return True
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second = second
+            self._logged = 0
+        if self._logged >= self._per_second:
+            return False
+        self._logged += 1
+        return True
+
+
+class ThrottledLogger:
+    """Log identical messages at most once per interval"""
+
+    def __init__(self, logger: logging.Logger, interval: float) -> None:
+        """Initiate logger
+
+        :param logger: logger to log to
+        :type logger: logging.Logger
+        :param interval: min seconds between identical messages
+        :type interval: float
+        """
+        self._logger = logger
+        self._interval = interval
+        # message template -> [time logged, suppressed count]
+        self._last: dict[tuple[int, str], list] = {}
+
+    def log(self, level: int, msg: str, *args) -> None:
+        """Log message unless it was logged within interval
+
+        :param level: log level
+        :type level: int
+        :param msg: message template, used to identify identical messages
+        :type msg: str
+        """
+        if not self._logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        key = (level, msg)
+        if (last := self._last.get(key)) is not None:
+            if now - last[0] < self._interval:
+                last[1] += 1
+                return
+            if last[1]:
+                msg += " (%s similar messages suppressed)"
+                args = (*args, last[1])
+        self._last[key] = [now, 0]
+        self._logger.log(level, msg, *args)
+
+    def warning(self, msg: str, *args) -> None:
+        """Log warning unless it was logged within interval"""
+        self.log(logging.WARNING, msg, *args)
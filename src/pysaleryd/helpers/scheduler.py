@@ -0,0 +1,161 @@
+"""Priority and rate aware scheduler for outgoing messages"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, Generic, TypeVar
+
+from ..const import CommandPriority
+from .clock import DEFAULT_CLOCK, Clock
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Token bucket rate limiter"""
+
+    def __init__(
+        self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Initiate bucket
+
+        :param rate: tokens added per second
+        :type rate: float
+        :param burst: maximum number of tokens, defaults to 1
+        :type burst: int, optional
+        :param clock: time source, defaults to time.monotonic
+        :type clock: Callable[[], float], optional
+        """
+        self._clock = clock
+        self._rate = rate
+        self._burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def delay(self) -> float:
+        """Time in seconds until a token is available"""
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def consume(self) -> None:
+        """Consume a token"""
+        self._refill()
+        self._tokens -= 1
+
+
+class QueueStats:
+    """Queue wait statistics for a priority class"""
+
+    __slots__ = ("count", "total_wait", "max_wait")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Mean time in seconds messages waited in queue"""
+        return self.total_wait / self.count if self.count else 0.0
+
+    def add(self, wait: float) -> None:
+        """Record wait time of a dequeued message"""
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def __repr__(self) -> str:
+        return (
+            f"QueueStats(count={self.count}, mean_wait={self.mean_wait:.4f}, "
+            f"max_wait={self.max_wait:.4f})"
+        )
+
+
+class MessageScheduler(Generic[T]):
+    """Queue of outgoing messages ordered by priority
+
+    Messages of the same priority are sent in order. All priorities except
+    :attr:`~pysaleryd.const.CommandPriority.CONTROL` share a token bucket, so
+    control messages are never delayed by the rate limit.
+    """
+
+    def __init__(
+        self, rate: float | None = None, burst: int = 1, clock: Clock = DEFAULT_CLOCK
+    ) -> None:
+        """Initiate scheduler
+
+        :param rate: maximum messages sent per second, defaults to None (no limit)
+        :type rate: float | None, optional
+        :param burst: number of messages that may be sent back to back, defaults to 1
+        :type burst: int, optional
+        :param clock: clock of rate limit and wait statistics, defaults to
+            DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        self._clock = clock
+        self._queue: list[tuple[int, int, float, T]] = []
+        self._counter = itertools.count()
+        self._bucket = TokenBucket(rate, burst, clock.time) if rate else None
+        self._has_items = asyncio.Event()
+        self.stats: dict[CommandPriority, QueueStats] = {
+            priority: QueueStats() for priority in CommandPriority
+        }
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(
+        self, message: T, priority: CommandPriority = CommandPriority.INTERACTIVE
+    ) -> None:
+        """Add message to queue
+
+        :param message: message to send
+        :type message: T
+        :param priority: priority class, defaults to CommandPriority.INTERACTIVE
+        :type priority: CommandPriority, optional
+        """
+        heapq.heappush(
+            self._queue, (priority, next(self._counter), self._clock.time(), message)
+        )
+        self._has_items.set()
+
+    async def get(self) -> T:
+        """Wait for next message that may be sent
+
+        :return: message
+        :rtype: T
+        """
+        while True:
+            if not self._queue:
+                self._has_items.clear()
+                await self._has_items.wait()
+                continue
+
+            priority = self._queue[0][0]
+            if self._bucket is not None and priority != CommandPriority.CONTROL:
+                if (delay := self._bucket.delay()) > 0:
+                    # Wake up early if a message of higher priority is added
+                    self._has_items.clear()
+                    try:
+                        async with self._clock.timeout(delay):
+                            await self._has_items.wait()
+                    except TimeoutError:
+                        pass
+                    continue
+                self._bucket.consume()
+
+            _, _, enqueued, message = heapq.heappop(self._queue)
+            self.stats[CommandPriority(priority)].add(self._clock.time() - enqueued)
+            return message
@@ -0,0 +1,83 @@
+"""Persist decoded data to disk for warm start"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+
+from ..const import DataKey
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(
+    path: str | os.PathLike,
+    data: dict[DataKey, str],
+    timestamps: dict[DataKey, float],
+) -> None:
+    """Atomically write data with timestamps to file
+
+    :param path: path of snapshot file
+    :type path: str | os.PathLike
+    :param data: data to save
+    :type data: dict[DataKey, str]
+    :param timestamps: time of last update for each key
+    :type timestamps: dict[DataKey, float]
+    """
+    content = {
+        "version": SNAPSHOT_VERSION,
+        "data": {
+            str(key): [payload, timestamps.get(key, 0.0)]
+            for key, payload in data.items()
+        },
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pysaleryd-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(content, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_snapshot(path: str | os.PathLike) -> dict[DataKey, tuple[str, float]]:
+    """Load data with timestamps from file
+
+    :param path: path of snapshot file
+    :type path: str | os.PathLike
+    :return: payload and time of last update for each key, empty if file is
+        missing or invalid
+    :rtype: dict[DataKey, tuple[str, float]]
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            content = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        _LOGGER.warning("Failed to read snapshot %s", path, exc_info=True)
+        return {}
+
+    if not isinstance(content, dict) or content.get("version") != SNAPSHOT_VERSION:
+        _LOGGER.warning("Unsupported snapshot format in %s", path)
+        return {}
+
+    result: dict[DataKey, tuple[str, float]] = {}
+    for key, value in content.get("data", {}).items():
+        try:
+            payload, timestamp = value
+            result[DataKey(key)] = (str(payload), float(timestamp))
+        except (TypeError, ValueError):
+            _LOGGER.debug("Skipping invalid snapshot entry %s", key)
+    return result
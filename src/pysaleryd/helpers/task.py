@@ -1,7 +1,9 @@
 import asyncio
 import logging
 from contextlib import asynccontextmanager
-from typing import Iterator
+from typing import Callable, Coroutine, Iterator
+
+from .clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,13 +34,25 @@ class TaskList:
 
     def __bool__(self) -> bool:
         """Check if there are tasks in the list"""
-        return bool(self.tasks)
+        return bool(self._tasks)
 
     def __len__(self) -> int:
-        return len(self.tasks)
+        return len(self._tasks)
+
+    def __init__(self, clock: Clock = DEFAULT_CLOCK) -> None:
+        """Initiate task list
 
-    def __init__(self) -> None:
-        self.tasks: list[asyncio.Task] = list()
+        :param clock: clock of task ages, defaults to DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        self._clock = clock
+        # task -> time added
+        self._tasks: dict[asyncio.Task, float] = {}
+
+    @property
+    def tasks(self) -> list[asyncio.Task]:
+        """Tasks in the list"""
+        return list(self._tasks)
 
     def add(self, *tasks: asyncio.Task, remove_when_done=True) -> None:
         """Add reference to tasks
@@ -48,10 +62,11 @@ class TaskList:
         :param remove_when_done: remove reference when task completes, defaults to True
         :type remove_when_done: bool, optional
         """
+        now = self._clock.time()
         for task in tasks:
+            self._tasks[task] = now
             if remove_when_done:
                 task.add_done_callback(self.remove)
-                self.tasks.append(task)
 
     def remove(self, *tasks: asyncio.Task) -> None:
         """Remove references to tasks
@@ -59,9 +74,7 @@ class TaskList:
         :type tasks: asyncio.Task
         """
         for task in tasks:
-            try:
-                self.tasks.remove(task)
-            except ValueError:
+            if self._tasks.pop(task, None) is None:
                 _LOGGER.debug("Failed to remove task %s", task)
 
     async def wait(self, *args, **kwargs) -> None:
@@ -74,10 +87,215 @@ class TaskList:
 
     async def cancel(self) -> None:
         """Cancel all tasks"""
-        for task in self.tasks:
+        for task in self._tasks:
             task.cancel()
-        await self.wait()
+        if self._tasks:
+            await self.wait()
 
     def clear(self) -> None:
         """Clear task list"""
-        self.tasks.clear()
+        self._tasks.clear()
+
+
+class RestartPolicy:
+    """Policy for restarting a supervised task when it fails"""
+
+    def __init__(
+        self,
+        max_restarts: int | None = None,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        restart_on_return: bool = False,
+        when: Callable[[BaseException | None], bool] | None = None,
+    ) -> None:
+        """Initiate policy
+
+        :param max_restarts: consecutive restarts before giving up, defaults to
+            None (no limit)
+        :type max_restarts: int | None, optional
+        :param backoff: delay before first restart, doubled for each consecutive
+            restart, defaults to 1.0
+        :type backoff: float, optional
+        :param max_backoff: max delay before restart. A task running longer than
+            this resets the backoff, defaults to 60.0
+        :type max_backoff: float, optional
+        :param restart_on_return: also restart task when it returns, defaults
+            to False
+        :type restart_on_return: bool, optional
+        :param when: predicate of the exception, or None if the task returned,
+            deciding whether to restart, defaults to None
+        :type when: Callable[[BaseException | None], bool] | None, optional
+        """
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.restart_on_return = restart_on_return
+        self.when = when
+
+    def should_restart(self, exc: BaseException | None, restarts: int) -> bool:
+        """Check if task should be restarted"""
+        if exc is None and not self.restart_on_return:
+            return False
+        if self.max_restarts is not None and restarts >= self.max_restarts:
+            return False
+        return self.when is None or self.when(exc)
+
+    def delay(self, restarts: int) -> float:
+        """Delay before restart"""
+        return min(self.backoff * 2**restarts, self.max_backoff)
+
+
+class _Supervised:
+    """Factory and restart state of a supervised task"""
+
+    __slots__ = ("factory", "name", "policy", "restarts", "started", "handle")
+
+    def __init__(
+        self,
+        factory: Callable[[], Coroutine],
+        name: str | None,
+        policy: RestartPolicy | None,
+    ) -> None:
+        self.factory = factory
+        self.name = name
+        self.policy = policy
+        self.restarts = 0
+        self.started = 0.0
+        self.handle: asyncio.TimerHandle | VirtualTimerHandle | None = None
+
+
+class TaskSupervisor(TaskList):
+    """Task list that restarts failed tasks according to a restart policy
+
+    Tasks are tracked in constant time. Failures of tasks without a policy are
+    logged so exceptions are never left unretrieved. In debug mode, tasks
+    ignoring cancellation are reported when the supervisor is cancelled.
+    """
+
+    def __init__(self, debug: bool | None = None, clock: Clock = DEFAULT_CLOCK) -> None:
+        """Initiate supervisor
+
+        :param debug: report leaked tasks, defaults to None (debug mode of the
+            event loop)
+        :type debug: bool | None, optional
+        :param clock: clock of restart backoff and task ages, defaults to
+            DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        super().__init__(clock)
+        self._debug = debug
+        self._supervised: dict[asyncio.Task, _Supervised] = {}
+        self._pending: set[_Supervised] = set()
+        self._closing = False
+
+    def __bool__(self) -> bool:
+        """Check if there are tasks or pending restarts"""
+        return bool(self._tasks or self._pending)
+
+    def spawn(
+        self,
+        factory: Callable[[], Coroutine],
+        name: str | None = None,
+        restart: RestartPolicy | None = None,
+    ) -> asyncio.Task:
+        """Create and supervise task
+
+        :param factory: function creating the coroutine to run, called again on
+            restart
+        :type factory: Callable[[], Coroutine]
+        :param name: name of task, defaults to None
+        :type name: str | None, optional
+        :param restart: restart policy, defaults to None (never restart)
+        :type restart: RestartPolicy | None, optional
+        :return: task
+        :rtype: asyncio.Task
+        """
+        return self._start(_Supervised(factory, name, restart))
+
+    def _start(self, supervised: _Supervised) -> asyncio.Task:
+        supervised.handle = None
+        supervised.started = self._clock.time()
+        task = asyncio.create_task(supervised.factory(), name=supervised.name)
+        self._supervised[task] = supervised
+        self.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        supervised = self._supervised.pop(task)
+        if task.cancelled() or self._closing:
+            return
+        exc = task.exception()
+        policy = supervised.policy
+        if policy is not None and self._clock.time() - supervised.started > (
+            policy.max_backoff
+        ):
+            supervised.restarts = 0
+        if policy is None or not policy.should_restart(exc, supervised.restarts):
+            if exc is not None:
+                _LOGGER.error("Task %s failed", task.get_name(), exc_info=exc)
+            return
+        delay = policy.delay(supervised.restarts)
+        supervised.restarts += 1
+        _LOGGER.warning(
+            "Task %s %s, restarting in %.1f s",
+            task.get_name(),
+            f"failed: {exc!r}" if exc is not None else "returned",
+            delay,
+        )
+        supervised.handle = self._clock.call_later(delay, self._restart, supervised)
+        self._pending.add(supervised)
+
+    def _restart(self, supervised: _Supervised) -> None:
+        self._pending.discard(supervised)
+        if not self._closing:
+            self._start(supervised)
+
+    @property
+    def ages(self) -> dict[str, float]:
+        """Age in seconds of live tasks by name"""
+        now = self._clock.time()
+        return {task.get_name(): now - added for task, added in self._tasks.items()}
+
+    @property
+    def restarts(self) -> dict[str, int]:
+        """Consecutive restarts of supervised tasks by name"""
+        return {
+            task.get_name(): supervised.restarts
+            for task, supervised in self._supervised.items()
+        }
+
+    async def cancel(self, timeout: float = 5.0) -> None:
+        """Cancel all tasks and pending restarts
+
+        :param timeout: seconds to wait for tasks to finish in debug mode,
+            defaults to 5.0
+        :type timeout: float, optional
+        """
+        self._closing = True
+        try:
+            for supervised in self._pending:
+                if supervised.handle is not None:
+                    supervised.handle.cancel()
+            self._pending.clear()
+            if not self._is_debug():
+                await super().cancel()
+                return
+            for task in self.tasks:
+                task.cancel()
+            if self._tasks:
+                await self.wait(timeout=timeout)
+            for task in self.tasks:
+                if not task.done():
+                    _LOGGER.warning(
+                        "Task %s leaked, still running %.1f s after cancel",
+                        task.get_name(),
+                        timeout,
+                    )
+        finally:
+            self._closing = False
+
+    def _is_debug(self) -> bool:
+        if self._debug is not None:
+            return self._debug
+        return asyncio.get_running_loop().get_debug()
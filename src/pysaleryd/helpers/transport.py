@@ -0,0 +1,134 @@
+"""Transport options of the websocket connection and event loop selection"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+from typing import Any, Iterable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TransportOptions:
+    """Options of the websocket transport
+
+    The defaults are tuned for the unit, which sends a steady stream of tiny
+    text frames: compression is disabled since deflating frames of a few bytes
+    only costs CPU, message size and write buffer are small and Nagle's
+    algorithm is disabled so commands are sent immediately.
+    """
+
+    __slots__ = (
+        "compression",
+        "max_queue",
+        "max_size",
+        "write_limit",
+        "nodelay",
+        "socket_options",
+    )
+
+    def __init__(
+        self,
+        compression: str | None = None,
+        max_queue: int | None = 16,
+        max_size: int | None = 2**16,
+        write_limit: int = 2**12,
+        nodelay: bool = True,
+        socket_options: Iterable[tuple[int, int, int]] = (),
+    ) -> None:
+        """Initiate options
+
+        :param compression: "deflate" to negotiate permessage-deflate, defaults
+            to None
+        :type compression: str | None, optional
+        :param max_queue: max received frames buffered before reading stops,
+            defaults to 16
+        :type max_queue: int | None, optional
+        :param max_size: max size of received messages in bytes, defaults to
+            2**16
+        :type max_size: int | None, optional
+        :param write_limit: high-water mark of write buffer in bytes, defaults
+            to 2**12
+        :type write_limit: int, optional
+        :param nodelay: disable Nagle's algorithm, defaults to True
+        :type nodelay: bool, optional
+        :param socket_options: additional (level, option, value) passed to
+            :meth:`socket.socket.setsockopt`, defaults to ()
+        :type socket_options: Iterable[tuple[int, int, int]], optional
+        """
+        self.compression = compression
+        self.max_queue = max_queue
+        self.max_size = max_size
+        self.write_limit = write_limit
+        self.nodelay = nodelay
+        self.socket_options = tuple(socket_options)
+
+    @classmethod
+    def library_defaults(cls) -> TransportOptions:
+        """Defaults of the websockets library, with compression enabled"""
+        return cls("deflate", 16, 2**20, 2**15, False)
+
+    def __repr__(self) -> str:
+        return (
+            f"TransportOptions(compression={self.compression!r}, "
+            f"max_queue={self.max_queue}, max_size={self.max_size}, "
+            f"write_limit={self.write_limit}, nodelay={self.nodelay})"
+        )
+
+    def connect_kwargs(self) -> dict[str, Any]:
+        """Keyword arguments of :func:`websockets.asyncio.client.connect`"""
+        return {
+            "compression": self.compression,
+            "max_queue": self.max_queue,
+            "max_size": self.max_size,
+            "write_limit": self.write_limit,
+        }
+
+    def apply(self, sock: socket.socket | None) -> None:
+        """Set socket options on connected socket
+
+        :param sock: socket of connection
+        :type sock: socket.socket | None
+        """
+        if sock is None:
+            return
+        options = list(self.socket_options)
+        if self.nodelay and sock.family in (socket.AF_INET, socket.AF_INET6):
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        for level, option, value in options:
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                _LOGGER.warning("Failed to set socket option %s", option)
+
+
+def new_event_loop(use_uvloop: bool = True) -> asyncio.AbstractEventLoop:
+    """Create event loop, using uvloop if requested and installed
+
+    :param use_uvloop: use uvloop if installed, defaults to True
+    :type use_uvloop: bool, optional
+    :return: event loop
+    :rtype: asyncio.AbstractEventLoop
+    """
+    if use_uvloop:
+        try:
+            import uvloop  # type: ignore[import-not-found]
+        except ImportError:
+            _LOGGER.debug("uvloop is not installed, using asyncio event loop")
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def run(coro, use_uvloop: bool = True) -> Any:
+    """Run coroutine in a new event loop, using uvloop if installed. Like
+    :func:`asyncio.run`
+
+    :param coro: coroutine to run
+    :param use_uvloop: use uvloop if installed, defaults to True
+    :type use_uvloop: bool, optional
+    :return: result of coroutine
+    """
+    with asyncio.Runner(loop_factory=lambda: new_event_loop(use_uvloop)) as runner:
+        return runner.run(coro)
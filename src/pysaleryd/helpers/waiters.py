@@ -0,0 +1,113 @@
+"""Awaitable predicates indexed by key"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Generic, Hashable, TypeVar
+
+from .clock import DEFAULT_CLOCK, Clock
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class Waiters(Generic[K, V]):
+    """Futures waiting for a value matching a predicate, indexed by key
+
+    Notifying a key only evaluates the predicates registered for that key.
+    """
+
+    def __init__(self, clock: Clock = DEFAULT_CLOCK) -> None:
+        """Initiate waiters
+
+        :param clock: clock of timeouts, defaults to DEFAULT_CLOCK
+        :type clock: Clock, optional
+        """
+        self._clock = clock
+        self._waiters: dict[K, dict[asyncio.Future[V], Callable[[V], bool] | None]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        """Check if there are waiters for key"""
+        return key in self._waiters
+
+    def __len__(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def add(
+        self, key: K, predicate: Callable[[V], bool] | None = None
+    ) -> asyncio.Future[V]:
+        """Add waiter for key
+
+        :param key: key to wait for
+        :type key: K
+        :param predicate: predicate the value must match, defaults to None
+        :type predicate: Callable[[V], bool] | None, optional
+        :return: future resolved with the matching value
+        :rtype: asyncio.Future[V]
+        """
+        future: asyncio.Future[V] = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, {})[future] = predicate
+        return future
+
+    def remove(self, key: K, future: asyncio.Future[V]) -> None:
+        """Remove waiter for key
+
+        :param key: key of waiter
+        :type key: K
+        :param future: future returned by :meth:`add`
+        :type future: asyncio.Future[V]
+        """
+        if (waiters := self._waiters.get(key)) is not None:
+            waiters.pop(future, None)
+            if not waiters:
+                del self._waiters[key]
+
+    def notify(self, key: K, value: V) -> None:
+        """Resolve waiters for key whose predicate matches value
+
+        :param key: updated key
+        :type key: K
+        :param value: new value
+        :type value: V
+        """
+        if (waiters := self._waiters.get(key)) is None:
+            return
+        for future, predicate in list(waiters.items()):
+            if future.done():
+                del waiters[future]
+                continue
+            try:
+                if predicate is not None and not predicate(value):
+                    continue
+            except Exception as e:  # pylint: disable=W0718
+                future.set_exception(e)
+            else:
+                future.set_result(value)
+            del waiters[future]
+        if not waiters:
+            del self._waiters[key]
+
+    async def wait(
+        self,
+        key: K,
+        predicate: Callable[[V], bool] | None = None,
+        timeout: float | None = None,
+    ) -> V:
+        """Wait for value matching predicate to be notified for key
+
+        :param key: key to wait for
+        :type key: K
+        :param predicate: predicate the value must match, defaults to None
+        :type predicate: Callable[[V], bool] | None, optional
+        :param timeout: timeout in seconds, defaults to None
+        :type timeout: float | None, optional
+        :raises asyncio.TimeoutError: if no matching value within timeout
+        :return: matching value
+        :rtype: V
+        """
+        future = self.add(key, predicate)
+        try:
+            async with self._clock.timeout(timeout):
+                return await future
+        finally:
+            self.remove(key, future)
@@ -1,6 +1,8 @@
 """Reconnecting websocket client"""
 
 import asyncio
+import heapq
+import itertools
 import logging
 from typing import Callable, Coroutine
 
@@ -8,10 +10,20 @@ from websockets.asyncio.client import ClientConnection, connect, process_excepti
 from websockets.exceptions import ConnectionClosed
 from websockets.protocol import State
 
-from .task import TaskList, task_manager
+from ..const import CommandPriority, DeliveryStatus
+from .clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
+from .delivery import Delivery
+from .log import FrameSampler, LogBudget, ThrottledLogger
+from .scheduler import MessageScheduler, QueueStats
+from .task import RestartPolicy, TaskSupervisor, task_manager
+from .transport import TransportOptions
 
 _LOGGER = logging.getLogger(__name__)
 
+# Sent messages awaiting acknowledgement, the oldest are no longer tracked
+# beyond this
+_MAX_IN_FLIGHT = 1024
+
 
 class ReconnectingWebsocketClient:
     """Reconnecting websocket client"""
@@ -26,18 +38,42 @@ class ReconnectingWebsocketClient:
         ) = None,
         on_connect: Callable[[], Coroutine[None, None, None]] | None = None,
         connect_timeout=15,
+        send_rate: float | None = None,
+        send_burst: int = 5,
+        log_budget: LogBudget | None = None,
+        clock: Clock = DEFAULT_CLOCK,
+        transport: TransportOptions | None = None,
     ):
         self._host = host
         self._port = port
         self._connect_timeout = connect_timeout
-        self._outgoing_queue: asyncio.Queue[str] = asyncio.Queue()
+        self._clock = clock
+        self._transport = transport or TransportOptions()
+        self._outgoing_queue: MessageScheduler[Delivery] = MessageScheduler(
+            send_rate, send_burst, clock
+        )
+        self._in_flight: list[Delivery] = []
+        self._deadlines: list[tuple[float, int, Delivery]] = []
+        self._counter = itertools.count()
+        self._expiry_timer: asyncio.TimerHandle | VirtualTimerHandle | None = None
+        self._expiry_due: float | None = None
+        log_budget = log_budget or LogBudget()
+        self._frame_sampler = FrameSampler(
+            log_budget.frame_every, log_budget.frames_per_second
+        )
+        self._throttled_logger = ThrottledLogger(_LOGGER, log_budget.warning_interval)
         self._on_message = on_message
         self._on_state_change = on_state_change
         self._on_connect = on_connect
-        self._tasks = TaskList()
+        self._tasks = TaskSupervisor(clock=clock)
         self._ws = None
         self._initial_connect = asyncio.Event()
 
+    @property
+    def tasks(self) -> dict[str, float]:
+        """Age in seconds of live tasks by name"""
+        return self._tasks.ages
+
     @property
     def state(self) -> State | None:
         """State of connection"""
@@ -69,9 +105,108 @@ class ReconnectingWebsocketClient:
         except BaseException:
             _LOGGER.exception("Error calling on_connect")
 
-    async def send(self, message: str) -> None:
-        """Add message to send queue"""
-        await self._outgoing_queue.put(message)
+    @property
+    def queue_stats(self) -> dict[CommandPriority, QueueStats]:
+        """Send queue wait statistics by priority class"""
+        return self._outgoing_queue.stats
+
+    async def send(
+        self,
+        message: str,
+        priority: CommandPriority = CommandPriority.INTERACTIVE,
+        ack_key: str | None = None,
+        ttl: float | None = None,
+    ) -> Delivery:
+        """Add message to send queue
+
+        :param message: message to send
+        :type message: str
+        :param priority: priority class, defaults to CommandPriority.INTERACTIVE
+        :type priority: CommandPriority, optional
+        :param ack_key: key of acknowledgement. Message is resent after reconnect
+            until acknowledged, defaults to None
+        :type ack_key: str | None, optional
+        :param ttl: time to live in seconds, defaults to None (never expires)
+        :type ttl: float | None, optional
+        :return: delivery of message
+        :rtype: Delivery
+        """
+        delivery = Delivery(message, priority, ack_key, ttl, clock=self._clock)
+        if delivery.deadline is not None:
+            heapq.heappush(
+                self._deadlines, (delivery.deadline, next(self._counter), delivery)
+            )
+            self.__arm_expiry()
+        self._outgoing_queue.put(delivery, priority)
+        return delivery
+
+    def acknowledge(self, ack_key: str, ok: bool = True) -> Delivery | None:
+        """Mark oldest message sent with ack_key as acknowledged
+
+        :param ack_key: key of acknowledgement
+        :type ack_key: str
+        :param ok: acknowledged successfully, defaults to True
+        :type ok: bool, optional
+        :return: acknowledged delivery if any
+        :rtype: Delivery | None
+        """
+        for i, delivery in enumerate(self._in_flight):
+            if delivery.ack_key == ack_key:
+                del self._in_flight[i]
+                delivery.set_status(
+                    DeliveryStatus.ACKNOWLEDGED if ok else DeliveryStatus.REJECTED
+                )
+                return delivery
+        return None
+
+    def __expire(self, delivery: Delivery) -> None:
+        self._throttled_logger.warning("Dropping expired message %s", delivery.message)
+        if delivery in self._in_flight:
+            self._in_flight.remove(delivery)
+        delivery.set_status(DeliveryStatus.EXPIRED)
+
+    def __overflow(self, delivery: Delivery) -> None:
+        self._throttled_logger.warning(
+            "Too many unacknowledged messages, no longer tracking %s",
+            delivery.message,
+        )
+        self._in_flight.remove(delivery)
+        delivery.set_status(DeliveryStatus.OVERFLOWED)
+
+    def __arm_expiry(self) -> None:
+        """Arm one timer for the earliest deadline of unfinished messages"""
+        while self._deadlines and self._deadlines[0][2].done:
+            heapq.heappop(self._deadlines)
+        if not self._deadlines:
+            return
+        due = self._deadlines[0][0]
+        if self._expiry_due is not None and self._expiry_due <= due:
+            return
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+        self._expiry_due = due
+        self._expiry_timer = self._clock.call_later(
+            due - self._clock.time(), self.__on_expiry_timer
+        )
+
+    def __on_expiry_timer(self) -> None:
+        """Expire queued and sent messages whose deadline has passed"""
+        self._expiry_timer = None
+        self._expiry_due = None
+        now = self._clock.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, delivery = heapq.heappop(self._deadlines)
+            if not delivery.done:
+                self.__expire(delivery)
+        self.__arm_expiry()
+
+    def __resend_in_flight(self) -> None:
+        """Queue messages not acknowledged before connection was lost"""
+        in_flight, self._in_flight = self._in_flight, []
+        for delivery in in_flight:
+            _LOGGER.debug("Resending message %s", delivery.message)
+            delivery.set_status(DeliveryStatus.PENDING)
+            self._outgoing_queue.put(delivery, delivery.priority)
 
     def __process_websocket_exception(self, e: Exception) -> Exception | None:
         if not self._initial_connect.is_set():
@@ -79,7 +214,14 @@ class ReconnectingWebsocketClient:
             _LOGGER.debug("Initial connection failed: %s", e)
             return e
         else:
-            return process_exception(e)
+            if (result := process_exception(e)) is None:
+                self._throttled_logger.warning(
+                    "Connection to %s:%s failed: %s, will retry",
+                    self._host,
+                    self._port,
+                    e,
+                )
+            return result
 
     async def __runner(self):
         """Send and receive messages on websocket"""
@@ -91,17 +233,20 @@ class ReconnectingWebsocketClient:
                 open_timeout=self._connect_timeout,
                 ping_interval=None,
                 process_exception=self.__process_websocket_exception,
+                **self._transport.connect_kwargs(),
             ):
                 try:
                     self._ws = websocket
-                    _LOGGER.info("Connection established to %s", uri)
+                    self._transport.apply(websocket.transport.get_extra_info("socket"))
+                    self._throttled_logger.log(
+                        logging.INFO, "Connection established to %s", uri
+                    )
                     self._initial_connect.set()
                     await self.__do_on_connect()
+                    self.__resend_in_flight()
                     await self.__do_on_state_change()
                     async with task_manager(cancel_on_exit=True) as ws_tasks:
-                        pong_task = asyncio.create_task(
-                            self.__keepalive(websocket), name="pong"
-                        )
+                        pong_task = asyncio.create_task(self.__keepalive(), name="pong")
                         consumer_task = asyncio.create_task(
                             self.__consumer(websocket), name="consumer"
                         )
@@ -111,7 +256,7 @@ class ReconnectingWebsocketClient:
                         ws_tasks.add(consumer_task, producer_task, pong_task)
                         await ws_tasks.wait(return_when=asyncio.FIRST_COMPLETED)
                 except ConnectionClosed as e:  # pylint: disable=W0718
-                    _LOGGER.warning(
+                    self._throttled_logger.warning(
                         "Connection to %s closed by remote host: %s, will retry",
                         uri,
                         e.reason,
@@ -133,7 +278,11 @@ class ReconnectingWebsocketClient:
         try:
             async for message in ws:
                 if isinstance(message, str):
-                    _LOGGER.debug("Message received %s", message)
+                    if (
+                        _LOGGER.isEnabledFor(logging.DEBUG)
+                        and self._frame_sampler.sample()
+                    ):
+                        _LOGGER.debug("Message received %s", message)
                     await self.__do_on_message(message)
         except asyncio.CancelledError:
             _LOGGER.debug("Consumer was cancelled")
@@ -143,39 +292,46 @@ class ReconnectingWebsocketClient:
         """Send queued messages on websocket"""
         try:
             while True:
-                message = await self._outgoing_queue.get()
-                _LOGGER.debug("Sending message %s", message)
-                await ws.send(message)
-                self._outgoing_queue.task_done()
+                delivery = await self._outgoing_queue.get()
+                if delivery.done:
+                    # Expired while queued
+                    continue
+                if delivery.expired:
+                    self.__expire(delivery)
+                    continue
+                if delivery.ack_key is not None:
+                    if len(self._in_flight) >= _MAX_IN_FLIGHT:
+                        self.__overflow(self._in_flight[0])
+                    # Track before sending to resend if connection is lost
+                    self._in_flight.append(delivery)
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    _LOGGER.debug("Sending message %s", delivery.message)
+                await ws.send(delivery.message)
+                # Might have been acknowledged or expired while sending
+                if delivery.status == DeliveryStatus.PENDING:
+                    delivery.set_status(DeliveryStatus.SENT)
         except asyncio.CancelledError:
             _LOGGER.debug("Producer cancelled")
             raise
 
-    async def __keepalive(self, websocket, pong_interval=float(30)) -> None:
+    async def __keepalive(self, pong_interval=float(30)) -> None:
         while True:
-            await asyncio.sleep(pong_interval)
-            try:
-                _LOGGER.debug("Sending keepalive PONG")
-                await websocket.send("PONG\r")
-            except ConnectionClosed:
-                _LOGGER.warning("Connection closed during keepalive, stopping")
-                raise
+            await self._clock.sleep(pong_interval)
+            _LOGGER.debug("Queueing keepalive PONG")
+            await self.send("PONG\r", CommandPriority.CONTROL)
 
     async def connect(self) -> None:
         """Connect to server"""
-
-        async def waiter(did_connect: asyncio.Event):
-            async with asyncio.timeout(self._connect_timeout + 1):
-                """Wait for connection to be established"""
-                while True:
-                    if did_connect.is_set():
-                        break
-                    await asyncio.sleep(1)
-
         if not self._tasks:
-            runner_task = asyncio.create_task(self.__runner(), name="runner")
-            self._tasks.add(runner_task)
-            await asyncio.create_task(waiter(self._initial_connect), name="waiter")
+            # Restart runner if it fails after the initial connect, failing to
+            # connect is reported by the timeout below
+            self._tasks.spawn(
+                self.__runner,
+                name="runner",
+                restart=RestartPolicy(when=lambda _: self._initial_connect.is_set()),
+            )
+            async with self._clock.timeout(self._connect_timeout + 1):
+                await self._initial_connect.wait()
         else:
             _LOGGER.warning("Already connected to %s:%s", self._host, self._port)
 
@@ -184,6 +340,10 @@ class ReconnectingWebsocketClient:
         await self._tasks.cancel()
         self._tasks.clear()
         self._ws = None
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+        self._expiry_timer = None
+        self._expiry_due = None
 
     async def __aenter__(self):
         await self.connect()
@@ -0,0 +1,333 @@
+"""Threshold and alarm rules evaluated on incoming updates"""
+
+from __future__ import annotations
+
+import logging
+import operator
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+from .const import DataKey
+from .data import SystemProperty
+from .helpers.clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
+from .helpers.error_cache import ERROR_FRAME_KEYS, ErrorChange
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from .client import Client
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_FIELDS = ("value", "min_value", "max_value", "extra", "payload")
+
+
+class Condition:
+    """Comparison of a field of a key against a threshold
+
+    With hysteresis, a condition that holds for ``<`` or ``<=`` keeps holding
+    until the value rises above threshold + hysteresis, and for ``>`` or ``>=``
+    until it falls below threshold - hysteresis.
+    """
+
+    __slots__ = ("key", "op", "threshold", "field", "hysteresis")
+
+    def __init__(
+        self,
+        key: DataKey,
+        op: str,
+        threshold: Any,
+        field: str = "value",
+        hysteresis: float = 0.0,
+    ) -> None:
+        """Initiate condition
+
+        :param key: key to evaluate
+        :type key: DataKey
+        :param op: comparison operator, one of ``< <= > >= == !=``
+        :type op: str
+        :param threshold: value to compare with
+        :type threshold: Any
+        :param field: field of :class:`~pysaleryd.data.SystemProperty` to compare,
+            or "payload" for the raw payload, defaults to "value"
+        :type field: str, optional
+        :param hysteresis: hysteresis for ordering operators, defaults to 0.0
+        :type hysteresis: float, optional
+        """
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator {op}")
+        if field not in _FIELDS:
+            raise ValueError(f"Unsupported field {field}")
+        self.key = key
+        self.op = op
+        self.threshold = threshold
+        self.field = field
+        self.hysteresis = hysteresis
+
+    def compile(self) -> Callable[[SystemProperty, str, bool], bool]:
+        """Compile condition to a function of property, payload and whether the
+        condition currently holds"""
+        compare = _OPERATORS[self.op]
+        threshold = self.threshold
+        field = self.field
+        release: Callable[[Any, Any], bool] | None = None
+        limit = threshold
+        if self.hysteresis and self.op in ("<", "<="):
+            release, limit = operator.gt, threshold + self.hysteresis
+        elif self.hysteresis and self.op in (">", ">="):
+            release, limit = operator.lt, threshold - self.hysteresis
+
+        def evaluate(prop: SystemProperty, payload: str, holds: bool) -> bool:
+            value = payload if field == "payload" else getattr(prop, field)
+            try:
+                if holds and release is not None:
+                    return not release(value, limit)
+                return compare(value, threshold)
+            except TypeError:
+                return False
+
+        return evaluate
+
+    def __repr__(self) -> str:
+        return f"Condition({self.key!r}, {self.op!r}, {self.threshold!r})"
+
+
+class Rule:
+    """Named rule that is active while all conditions hold, optionally for a
+    minimum duration"""
+
+    __slots__ = ("name", "conditions", "duration")
+
+    def __init__(self, name: str, *conditions: Condition, duration: float = 0.0):
+        """Initiate rule
+
+        :param name: name of rule
+        :type name: str
+        :param conditions: conditions that must all hold
+        :type conditions: Condition
+        :param duration: seconds conditions must hold before rule is active,
+            defaults to 0.0
+        :type duration: float, optional
+        """
+        if not conditions:
+            raise ValueError("Rule must have at least one condition")
+        self.name = name
+        self.conditions = conditions
+        self.duration = duration
+
+
+class RuleEvent:
+    """Rule became active or inactive"""
+
+    __slots__ = ("rule", "active", "timestamp")
+
+    def __init__(self, rule: Rule, active: bool, timestamp: float) -> None:
+        self.rule = rule
+        self.active = active
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return f"RuleEvent({self.rule.name!r}, active={self.active})"
+
+
+class _CompiledRule:
+    __slots__ = ("rule", "evaluators", "holds", "active", "since", "timer")
+
+    def __init__(self, rule: Rule) -> None:
+        self.rule = rule
+        self.evaluators = [condition.compile() for condition in rule.conditions]
+        self.holds = [False] * len(rule.conditions)
+        self.active = False
+        self.since: float | None = None
+        self.timer: asyncio.TimerHandle | VirtualTimerHandle | None = None
+
+
+class RuleEngine:
+    """Evaluate rules on updates of attached clients
+
+    Rules are compiled when added and indexed by the keys of their conditions,
+    so an update only evaluates rules referencing its key. Handlers receive a
+    :class:`RuleEvent` when a rule becomes active or inactive. Rule state is
+    of one unit, so an engine is attached to one client. Conditions on
+    :attr:`~pysaleryd.const.DataKey.ERROR_MESSAGE` compare the list of active
+    errors, like ``"['Filter']"`` or ``"[]"``.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Rule] = (),
+        clock: Clock = DEFAULT_CLOCK,
+    ) -> None:
+        """Initiate engine
+
+        :param rules: rules to add, defaults to ()
+        :type rules: Iterable[Rule], optional
+        :param clock: clock of duration timers, defaults to real time
+        :type clock: Clock, optional
+        """
+        self._clock = clock
+        self._rules: dict[str, _CompiledRule] = {}
+        self._index: dict[DataKey, list[tuple[_CompiledRule, int]]] = {}
+        self._handlers: set[Callable[[RuleEvent], None]] = set()
+        self._client: Client | None = None
+        for rule in rules:
+            self.add_rule(rule)
+
+    @property
+    def active(self) -> set[str]:
+        """Names of active rules"""
+        return {name for name, compiled in self._rules.items() if compiled.active}
+
+    def add_rule(self, rule: Rule) -> None:
+        """Compile and add rule
+
+        :param rule: rule
+        :type rule: Rule
+        """
+        if rule.name in self._rules:
+            raise ValueError(f"Rule {rule.name} already exists")
+        compiled = _CompiledRule(rule)
+        self._rules[rule.name] = compiled
+        for i, condition in enumerate(rule.conditions):
+            self._index.setdefault(condition.key, []).append((compiled, i))
+
+    def remove_rule(self, name: str) -> None:
+        """Remove rule
+
+        :param name: name of rule
+        :type name: str
+        """
+        compiled = self._rules.pop(name)
+        if compiled.timer is not None:
+            compiled.timer.cancel()
+        for key in {condition.key for condition in compiled.rule.conditions}:
+            entries = [e for e in self._index[key] if e[0] is not compiled]
+            if entries:
+                self._index[key] = entries
+            else:
+                del self._index[key]
+
+    def attach(self, client: Client) -> None:
+        """Evaluate rules on updates received by client
+
+        :param client: client
+        :type client: Client
+        :raises RuntimeError: if another client is attached
+        """
+        if self._client is not None:
+            raise RuntimeError("Rule engine is already attached to a client")
+        client.add_update_handler(self._on_update)
+        client.add_error_handler(self._on_error_change)
+        self._client = client
+
+    def detach(self, client: Client) -> None:
+        """Stop evaluating rules on updates received by client
+
+        :param client: client
+        :type client: Client
+        """
+        if client is not self._client:
+            raise ValueError("Client is not attached to rule engine")
+        client.remove_update_handler(self._on_update)
+        client.remove_error_handler(self._on_error_change)
+        self._client = None
+
+    def add_handler(self, handler: Callable[[RuleEvent], None]) -> None:
+        """Add handler called when a rule becomes active or inactive
+
+        :param handler: handler function. Must be safe to call from event loop
+        :type handler: Callable[[RuleEvent], None]
+        """
+        self._handlers.add(handler)
+
+    def remove_handler(self, handler: Callable[[RuleEvent], None]) -> None:
+        """Remove handler
+
+        :param handler: handler to remove
+        :type handler: Callable[[RuleEvent], None]
+        """
+        self._handlers.remove(handler)
+
+    def _on_update(self, key: DataKey, payload: str) -> None:
+        # Error frames are evaluated once complete, see _on_error_change
+        if key not in ERROR_FRAME_KEYS:
+            self.add(key, payload)
+
+    def _on_error_change(self, change: ErrorChange) -> None:
+        self.add(DataKey.ERROR_MESSAGE, str(list(change.errors)))
+
+    def add(self, key: DataKey, payload: str) -> None:
+        """Evaluate rules referencing key
+
+        :param key: updated key
+        :type key: DataKey
+        :param payload: payload
+        :type payload: str
+        """
+        if (entries := self._index.get(key)) is None:
+            return
+        prop = SystemProperty.from_str(key, payload)
+        now = self._clock.time()
+        for compiled, i in entries:
+            compiled.holds[i] = compiled.evaluators[i](prop, payload, compiled.holds[i])
+            self._evaluate(compiled, now)
+
+    def check(self) -> None:
+        """Activate rules whose duration has passed. Called automatically when
+        running in an event loop"""
+        now = self._clock.time()
+        for compiled in self._rules.values():
+            self._evaluate(compiled, now)
+
+    def _evaluate(self, compiled: _CompiledRule, now: float) -> None:
+        if not all(compiled.holds):
+            compiled.since = None
+            if compiled.timer is not None:
+                compiled.timer.cancel()
+                compiled.timer = None
+            if compiled.active:
+                self._set_active(compiled, False, now)
+            return
+
+        if compiled.active:
+            return
+        if compiled.since is None:
+            compiled.since = now
+        remaining = compiled.rule.duration - (now - compiled.since)
+        if remaining <= 0:
+            if compiled.timer is not None:
+                compiled.timer.cancel()
+                compiled.timer = None
+            self._set_active(compiled, True, now)
+        elif compiled.timer is None:
+            self._schedule(compiled, remaining)
+
+    def _schedule(self, compiled: _CompiledRule, delay: float) -> None:
+        try:
+            compiled.timer = self._clock.call_later(delay, self._on_timer, compiled)
+        except RuntimeError:
+            # No running event loop, checked on next update or call to check()
+            pass
+
+    def _on_timer(self, compiled: _CompiledRule) -> None:
+        compiled.timer = None
+        if self._rules.get(compiled.rule.name) is compiled:
+            self._evaluate(compiled, self._clock.time())
+
+    def _set_active(self, compiled: _CompiledRule, active: bool, now: float) -> None:
+        compiled.active = active
+        event = RuleEvent(compiled.rule, active, now)
+        _LOGGER.debug("%s", event)
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                _LOGGER.exception("Failed to call handler %s", handler)
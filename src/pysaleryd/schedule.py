@@ -0,0 +1,463 @@
+"""Timed command profiles for many units, driven by one timer heap"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from .const import DEFAULT, CommandPriority, DataKey, DefaultType
+from .helpers.clock import DEFAULT_CLOCK, Clock, VirtualTimerHandle
+from .helpers.delivery import Delivery
+from .helpers.task import TaskSupervisor
+
+if TYPE_CHECKING:
+    from .client import Client
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+EVERY_DAY = (0, 1, 2, 3, 4, 5, 6)
+"""Days of :class:`Weekly`, Monday is 0"""
+WEEKDAYS = (0, 1, 2, 3, 4)
+WEEKEND = (5, 6)
+
+CATCH_UP = ("none", "last", "all")
+"""Catch up policies of missed occurrences"""
+
+# Timers are re-armed at least this often to follow changes of wall clock
+_RESYNC_INTERVAL = 300.0
+
+
+class CommandProfile:
+    """Named set of commands sent together, e.g. boost or economy"""
+
+    __slots__ = ("name", "commands", "priority", "ttl")
+
+    def __init__(
+        self,
+        name: str,
+        commands: dict[DataKey, str | int],
+        priority: CommandPriority = CommandPriority.BULK,
+        ttl: float | None | DefaultType = DEFAULT,
+    ) -> None:
+        """Initiate profile
+
+        :param name: name of profile
+        :type name: str
+        :param commands: payload by key, sent in order
+        :type commands: dict[DataKey, str | int]
+        :param priority: priority class, defaults to CommandPriority.BULK
+        :type priority: CommandPriority, optional
+        :param ttl: time to live of commands in seconds, None never expires,
+            defaults to command_ttl of client
+        :type ttl: float | None | DefaultType, optional
+        """
+        if not commands:
+            raise ValueError("Profile must have at least one command")
+        self.name = name
+        self.commands = dict(commands)
+        self.priority = priority
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"CommandProfile({self.name!r})"
+
+
+class Weekly:
+    """Recurring at a time of day on days of week"""
+
+    __slots__ = ("at", "days", "tz")
+
+    def __init__(
+        self,
+        at: dt.time | str,
+        days: Iterable[int] = EVERY_DAY,
+        tz: dt.tzinfo | None = None,
+    ) -> None:
+        """Initiate timing
+
+        :param at: time of day, e.g. "06:30"
+        :type at: dt.time | str
+        :param days: days of week, Monday is 0, defaults to EVERY_DAY
+        :type days: Iterable[int], optional
+        :param tz: time zone, defaults to None (local time)
+        :type tz: dt.tzinfo | None, optional
+        """
+        self.at = dt.time.fromisoformat(at) if isinstance(at, str) else at
+        self.days = frozenset(days)
+        if not self.days or not self.days <= set(EVERY_DAY):
+            raise ValueError(f"Invalid days {sorted(self.days)}")
+        self.tz = tz
+
+    def __repr__(self) -> str:
+        return f"Weekly({self.at.isoformat()!r}, days={sorted(self.days)})"
+
+    def next_after(self, timestamp: float) -> float | None:
+        """First occurrence after timestamp
+
+        :param timestamp: POSIX timestamp
+        :type timestamp: float
+        :return: POSIX timestamp of occurrence
+        :rtype: float | None
+        """
+        date = dt.datetime.fromtimestamp(timestamp, self.tz).date()
+        for offset in range(8):
+            day = date + dt.timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            occurrence = dt.datetime.combine(day, self.at, self.tz).timestamp()
+            if occurrence > timestamp:
+                return occurrence
+        return None
+
+
+class Once:
+    """One-shot at a point in time"""
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: dt.datetime | float) -> None:
+        """Initiate timing
+
+        :param at: time, naive datetimes are local time
+        :type at: dt.datetime | float
+        """
+        self.at = at.timestamp() if isinstance(at, dt.datetime) else float(at)
+
+    def __repr__(self) -> str:
+        return f"Once({self.at})"
+
+    def next_after(self, timestamp: float) -> float | None:
+        """Occurrence if after timestamp
+
+        :param timestamp: POSIX timestamp
+        :type timestamp: float
+        :return: POSIX timestamp of occurrence
+        :rtype: float | None
+        """
+        return self.at if self.at > timestamp else None
+
+
+class Schedule:
+    """Profile sent to a unit on a timing
+
+    Occurrences missed by more than the grace of the engine, because the
+    engine was not running or the host was suspended, are handled by the catch
+    up policy: "none" skips them, "last" sends the latest of them and "all"
+    sends each of them.
+    """
+
+    __slots__ = ("client", "profile", "timing", "catch_up")
+
+    def __init__(
+        self,
+        client: Client,
+        profile: CommandProfile,
+        timing: Weekly | Once,
+        catch_up: str = "last",
+    ) -> None:
+        """Initiate schedule
+
+        :param client: client of unit
+        :type client: Client
+        :param profile: profile to send
+        :type profile: CommandProfile
+        :param timing: when to send
+        :type timing: Weekly | Once
+        :param catch_up: policy of missed occurrences, one of CATCH_UP,
+            defaults to "last"
+        :type catch_up: str, optional
+        """
+        if catch_up not in CATCH_UP:
+            raise ValueError(f"Invalid catch up policy {catch_up}")
+        self.client = client
+        self.profile = profile
+        self.timing = timing
+        self.catch_up = catch_up
+
+    def __repr__(self) -> str:
+        return f"Schedule({self.profile!r}, {self.timing!r})"
+
+
+class ScheduleEvent:
+    """Profile of schedule was sent"""
+
+    __slots__ = ("schedule", "due", "sent", "deliveries")
+
+    def __init__(
+        self,
+        schedule: Schedule,
+        due: float,
+        sent: float,
+        deliveries: list[Delivery],
+    ) -> None:
+        self.schedule = schedule
+        self.due = due
+        self.sent = sent
+        self.deliveries = deliveries
+
+    @property
+    def late(self) -> float:
+        """Seconds between occurrence and sending"""
+        return self.sent - self.due
+
+    def __repr__(self) -> str:
+        return f"ScheduleEvent({self.schedule!r}, due={self.due}, late={self.late:.3f})"
+
+
+class _Entry:
+    __slots__ = ("schedule", "seq", "due")
+
+    def __init__(self, schedule: Schedule, seq: int) -> None:
+        self.schedule = schedule
+        self.seq = seq
+        self.due: float | None = None
+
+
+class ScheduleEngine:
+    """Send profiles of schedules of any number of clients
+
+    All schedules share one heap of occurrences and one timer armed for the
+    earliest, so no task is kept per schedule. Profiles are sent in order of
+    occurrence, then order of adding, one after the other per client and
+    concurrently across clients.
+
+    Catching up is deterministic: pass the :attr:`checkpoint` saved before
+    shutdown to :meth:`start` and occurrences since then are handled by the
+    catch up policy of each schedule, in order of occurrence. Profiles not
+    yet sent when the engine is closed are caught up too.
+    """
+
+    def __init__(
+        self,
+        schedules: Iterable[Schedule] = (),
+        clock: Clock = DEFAULT_CLOCK,
+        wall_time: Callable[[], float] = time.time,
+        grace: float = 60.0,
+    ) -> None:
+        """Initiate engine
+
+        :param schedules: schedules to add, defaults to ()
+        :type schedules: Iterable[Schedule], optional
+        :param clock: clock of timers, defaults to DEFAULT_CLOCK
+        :type clock: Clock, optional
+        :param wall_time: POSIX time source, defaults to time.time
+        :type wall_time: Callable[[], float], optional
+        :param grace: seconds an occurrence may be late before it counts as
+            missed, defaults to 60.0
+        :type grace: float, optional
+        """
+        self._clock = clock
+        self._wall_time = wall_time
+        self._grace = grace
+        self._entries: dict[Schedule, _Entry] = {}
+        self._heap: list[tuple[float, int, _Entry]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | VirtualTimerHandle | None = None
+        self._running = False
+        self._checkpoint: float | None = None
+        # Number of queued or sending profiles by occurrence
+        self._unsent: dict[float, int] = {}
+        self._queue: deque[tuple[float, Schedule]] = deque()
+        self._sending = False
+        self._tasks = TaskSupervisor(clock=clock)
+        self._handlers: set[Callable[[ScheduleEvent], None]] = set()
+        for schedule in schedules:
+            self.add(schedule)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def schedules(self) -> list[Schedule]:
+        """Schedules with occurrences left"""
+        return list(self._entries)
+
+    @property
+    def checkpoint(self) -> float | None:
+        """POSIX time occurrences have been handled up to, persist it to catch
+        up after downtime. Kept before the earliest profile not yet sent"""
+        if self._checkpoint is None or not self._unsent:
+            return self._checkpoint
+        return min(self._checkpoint, math.nextafter(min(self._unsent), -math.inf))
+
+    @property
+    def next_due(self) -> float | None:
+        """POSIX time of earliest occurrence"""
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def add(self, schedule: Schedule) -> None:
+        """Add schedule, handled from now if engine is running
+
+        :param schedule: schedule
+        :type schedule: Schedule
+        """
+        if schedule in self._entries:
+            raise ValueError(f"{schedule} already added")
+        entry = _Entry(schedule, next(self._counter))
+        self._entries[schedule] = entry
+        if self._running:
+            self._push(entry, schedule.timing.next_after(self._wall_time()))
+            self._arm()
+
+    def remove(self, schedule: Schedule) -> None:
+        """Remove schedule
+
+        :param schedule: schedule
+        :type schedule: Schedule
+        """
+        self._entries.pop(schedule).due = None
+
+    def add_handler(self, handler: Callable[[ScheduleEvent], None]) -> None:
+        """Add handler called when a profile has been sent
+
+        :param handler: handler function. Must be safe to call from event loop
+        :type handler: Callable[[ScheduleEvent], None]
+        """
+        self._handlers.add(handler)
+
+    def remove_handler(self, handler: Callable[[ScheduleEvent], None]) -> None:
+        """Remove handler
+
+        :param handler: handler to remove
+        :type handler: Callable[[ScheduleEvent], None]
+        """
+        self._handlers.remove(handler)
+
+    def start(self, since: float | None = None) -> None:
+        """Start sending profiles
+
+        :param since: catch up occurrences after this POSIX time, usually a
+            saved :attr:`checkpoint`, defaults to None (from now)
+        :type since: float | None, optional
+        """
+        if self._running:
+            return
+        self._running = True
+        now = self._wall_time()
+        self._checkpoint = now if since is None else since
+        self._unsent.clear()
+        for entry in list(self._entries.values()):
+            self._push(entry, entry.schedule.timing.next_after(self._checkpoint))
+        self._arm()
+
+    async def close(self) -> None:
+        """Stop sending profiles, cancelling profiles being sent. Profiles not
+        sent stay after :attr:`checkpoint`"""
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._heap.clear()
+        self._queue.clear()
+        await self._tasks.cancel()
+
+    async def __aenter__(self) -> ScheduleEngine:
+        self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def _push(self, entry: _Entry, due: float | None) -> None:
+        entry.due = due
+        if due is None:
+            # One-shot done
+            self._entries.pop(entry.schedule, None)
+            return
+        heapq.heappush(self._heap, (due, entry.seq, entry))
+
+    def _prune(self) -> None:
+        """Drop removed and rescheduled entries from top of heap"""
+        while self._heap and self._heap[0][2].due != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _arm(self) -> None:
+        """Arm timer for earliest occurrence"""
+        if not self._running:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._prune()
+        if not self._heap:
+            return
+        delay = min(self._heap[0][0] - self._wall_time(), _RESYNC_INTERVAL)
+        self._timer = self._clock.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        now = self._wall_time()
+        firings: list[tuple[float, int, Schedule]] = []
+        while self._heap and self._heap[0][0] <= now:
+            due, seq, entry = heapq.heappop(self._heap)
+            if entry.due != due:
+                continue
+            schedule = entry.schedule
+            occurrences = [due]
+            next_due = schedule.timing.next_after(due)
+            while next_due is not None and next_due <= now:
+                occurrences.append(next_due)
+                next_due = schedule.timing.next_after(next_due)
+            if schedule.catch_up == "last":
+                occurrences = occurrences[-1:]
+            elif schedule.catch_up == "none":
+                occurrences = [t for t in occurrences if now - t <= self._grace]
+            firings.extend((t, seq, schedule) for t in occurrences)
+            self._push(entry, next_due)
+        self._checkpoint = max(self._checkpoint or now, now)
+        if firings:
+            firings.sort(key=lambda firing: firing[:2])
+            for due, _, schedule in firings:
+                self._queue.append((due, schedule))
+                self._unsent[due] = self._unsent.get(due, 0) + 1
+            if not self._sending:
+                self._sending = True
+                self._tasks.spawn(self._send, name="send_scheduled")
+        self._arm()
+
+    async def _send(self) -> None:
+        """Send queued profiles, in order per client"""
+        try:
+            while self._queue:
+                by_client: dict[Client, list[tuple[float, Schedule]]] = {}
+                while self._queue:
+                    due, schedule = self._queue.popleft()
+                    by_client.setdefault(schedule.client, []).append((due, schedule))
+                await asyncio.gather(
+                    *(self._send_client(firings) for firings in by_client.values())
+                )
+        finally:
+            self._sending = False
+
+    async def _send_client(self, firings: list[tuple[float, Schedule]]) -> None:
+        for due, schedule in firings:
+            profile = schedule.profile
+            deliveries = []
+            for key, payload in profile.commands.items():
+                try:
+                    deliveries.append(
+                        await schedule.client.send_command(
+                            key, payload, profile.priority, profile.ttl
+                        )
+                    )
+                except Exception:
+                    _LOGGER.exception("Failed to send %s of %s", key, schedule)
+            if self._unsent[due] == 1:
+                del self._unsent[due]
+            else:
+                self._unsent[due] -= 1
+            event = ScheduleEvent(schedule, due, self._wall_time(), deliveries)
+            _LOGGER.debug("%s", event)
+            for handler in self._handlers:
+                try:
+                    handler(event)
+                except Exception:
+                    _LOGGER.exception("Failed to call handler %s", handler)
@@ -0,0 +1,269 @@
+"""Synchronous HRV System client"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Coroutine, TypeVar
+
+from websockets.protocol import State
+
+from .client import Client
+from .const import DEFAULT, CommandPriority, DataKey, DefaultType
+from .data import DataSnapshot, Message, SystemProperty
+from .helpers.delivery import Delivery
+from .helpers.transport import new_event_loop
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Background loop of shared clients, so they share one connection
+_shared_loop: tuple[asyncio.AbstractEventLoop, threading.Thread] | None = None
+_shared_users = 0
+_shared_lock = threading.Lock()
+
+
+def _start_loop(
+    use_uvloop: bool, name: str
+) -> tuple[asyncio.AbstractEventLoop, threading.Thread]:
+    """Start event loop running forever on a daemon thread"""
+    loop = new_event_loop(use_uvloop)
+    thread = threading.Thread(target=loop.run_forever, name=name, daemon=True)
+    thread.start()
+    return loop, thread
+
+
+async def _shutdown() -> None:
+    """Cancel remaining tasks, then finalize async generators, like asyncio.run"""
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            loop.call_exception_handler(
+                {
+                    "message": "unhandled exception during SyncClient shutdown",
+                    "exception": task.exception(),
+                    "task": task,
+                }
+            )
+    await loop.shutdown_asyncgens()
+
+
+def _stop_loop(loop: asyncio.AbstractEventLoop, thread: threading.Thread) -> None:
+    """Stop event loop started by :func:`_start_loop` and wait for its thread"""
+    if thread.is_alive():
+        asyncio.run_coroutine_threadsafe(_shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _acquire_shared_loop(
+    use_uvloop: bool,
+) -> tuple[asyncio.AbstractEventLoop, threading.Thread]:
+    """Get background loop of shared clients, starting it for the first user"""
+    global _shared_loop, _shared_users
+    with _shared_lock:
+        if _shared_loop is None:
+            _shared_loop = _start_loop(use_uvloop, "pysaleryd-shared")
+        _shared_users += 1
+        return _shared_loop
+
+
+class _PublishingClient(Client):
+    """Client publishing a snapshot of data after updates"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.published = DataSnapshot()
+        self._publish_scheduled = False
+
+    def _schedule_publish(self) -> None:
+        # Coalesce updates received in the same loop iteration
+        if not self._publish_scheduled:
+            self._publish_scheduled = True
+            asyncio.get_running_loop().call_soon(self._publish)
+
+    def _publish(self) -> None:
+        self._publish_scheduled = False
+        self.published = self.data
+
+    async def _on_message(self, message: Message) -> None:
+        await super()._on_message(message)
+        self._schedule_publish()
+
+    async def _on_state_change(self, state) -> None:
+        await super()._on_state_change(state)
+        self._schedule_publish()
+
+
+class SyncClient:
+    """Thread safe synchronous client running :class:`~pysaleryd.client.Client`
+    on a background event loop
+
+    Blocking methods may be called from any thread. Reading :attr:`data` never
+    blocks, it returns the latest immutable snapshot published by the loop.
+    Clients created with ``shared=True`` run on one background loop of the
+    process, so clients of the same unit share a connection.
+    """
+
+    def __init__(
+        self, ip: str, port: int = 3001, use_uvloop: bool = False, **kwargs
+    ) -> None:
+        """Initiate client
+
+        :param ip: ip address of the unit
+        :type ip: str
+        :param port: port
+        :type port: int
+        :param use_uvloop: run background loop on uvloop if installed, defaults
+            to False
+        :type use_uvloop: bool, optional
+        :param kwargs: options passed to :class:`~pysaleryd.client.Client`
+        """
+        self._ip = ip
+        self._port = port
+        self._use_uvloop = use_uvloop
+        self._kwargs = kwargs
+        self._shared = bool(kwargs.get("shared", False))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._client: _PublishingClient | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> State | None:
+        """State of the underlying websocket connection"""
+        return self._client.state if self._client is not None else None
+
+    @property
+    def data(self) -> DataSnapshot:
+        """Latest snapshot of data from system"""
+        return self._client.published if self._client is not None else DataSnapshot()
+
+    def _run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run coroutine on background loop and wait for result"""
+        if self._loop is None:
+            coro.close()
+            raise RuntimeError("Client is not connected")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def connect(self) -> None:
+        """Start background loop, connect to HRV and begin receiving"""
+        with self._lock:
+            if self._loop is not None:
+                _LOGGER.warning("Already connected to %s:%s", self._ip, self._port)
+                return
+            if self._shared:
+                self._loop, self._thread = _acquire_shared_loop(self._use_uvloop)
+            else:
+                self._loop, self._thread = _start_loop(
+                    self._use_uvloop, f"pysaleryd-{self._ip}"
+                )
+
+            async def connect() -> _PublishingClient:
+                client = _PublishingClient(self._ip, self._port, **self._kwargs)
+                await client.connect()
+                return client
+
+            try:
+                self._client = self._run(connect())
+            except BaseException:
+                self._stop_loop()
+                raise
+
+    def close(self) -> None:
+        """Disconnect from system and stop background loop"""
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._client is not None:
+                self._run(self._client.close())
+                self._client = None
+            self._stop_loop()
+
+    def _stop_loop(self) -> None:
+        global _shared_loop, _shared_users
+        loop, thread = self._loop, self._thread
+        self._loop = None
+        self._thread = None
+        if loop is None or thread is None:
+            return
+        if self._shared:
+            with _shared_lock:
+                _shared_users -= 1
+                if _shared_users:
+                    return
+                _shared_loop = None
+        _stop_loop(loop, thread)
+
+    def _get_client(self) -> _PublishingClient:
+        if self._client is None:
+            raise RuntimeError("Client is not connected")
+        return self._client
+
+    def send_command(
+        self,
+        key: DataKey,
+        payload: str | int,
+        priority: CommandPriority = CommandPriority.INTERACTIVE,
+        ttl: float | None | DefaultType = DEFAULT,
+    ) -> Delivery:
+        """Send command to HRV unit. See :meth:`~pysaleryd.client.Client.send_command`
+
+        :param key: message type key
+        :type key: DataKey
+        :param payload: payload
+        :type payload: str | int
+        :param priority: priority class, defaults to CommandPriority.INTERACTIVE
+        :type priority: CommandPriority, optional
+        :param ttl: time to live in seconds, None never expires, defaults to
+            command_ttl of client
+        :type ttl: float | None | DefaultType, optional
+        :return: delivery of command
+        :rtype: Delivery
+        """
+        return self._run(self._get_client().send_command(key, payload, priority, ttl))
+
+    def wait_for(
+        self,
+        key: DataKey,
+        predicate: Callable[[SystemProperty], bool] | None = None,
+        timeout: float | None = None,
+    ) -> SystemProperty:
+        """Block until value of key matches predicate.
+        See :meth:`~pysaleryd.client.Client.wait_for`. The predicate is called
+        from the background loop thread.
+
+        :raises asyncio.TimeoutError: if no matching value within timeout
+        """
+        return self._run(self._get_client().wait_for(key, predicate, timeout))
+
+    def wait_for_state(self, state: State | None, timeout: float | None = None):
+        """Block until connection reaches state.
+        See :meth:`~pysaleryd.client.Client.wait_for_state`
+
+        :raises asyncio.TimeoutError: if state is not reached within timeout
+        """
+        self._run(self._get_client().wait_for_state(state, timeout))
+
+    def ready(self, timeout: float | None = None) -> None:
+        """Block until initial sync is complete.
+        See :meth:`~pysaleryd.client.Client.ready`
+
+        :raises asyncio.TimeoutError: if sync is not complete within timeout
+        """
+        self._run(self._get_client().ready(timeout))
+
+    def __enter__(self) -> SyncClient:
+        self.connect()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        self.close()
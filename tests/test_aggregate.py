@@ -0,0 +1,60 @@
+"""Aggregate tests"""
+
+import math
+
+import pytest
+
+from pysaleryd.aggregate import Aggregator, RollingWindow
+from pysaleryd.client import Client
+from pysaleryd.const import DataKey
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+def test_rolling_window():
+    """Test values older than window are dropped"""
+    window = RollingWindow(60, buckets=6)
+    window.add(0, 10)
+    window.add(30, 20)
+    window.add(59, 30)
+    assert window.stats(59) == (3, 60.0, 10, 30)
+    assert window.stats(75) == (2, 50.0, 20, 30)
+    assert window.stats(200) == (0, 0.0, math.inf, -math.inf)
+
+
+def test_aggregator():
+    """Test rolling statistics and window records"""
+    now = 0.0
+    records = []
+    aggregator = Aggregator(windows=(60, 300), clock=lambda: now)
+    aggregator.add_handler(records.append)
+
+    for now, temperature in [(1, "20"), (30, "22+ 0+ 40"), (59, "24")]:
+        aggregator.add(DataKey.AIR_TEMPERATURE_SUPPLY, temperature)
+    aggregator.add(DataKey.MODEL_NAME, "TestModel")
+
+    stats = aggregator.get(DataKey.AIR_TEMPERATURE_SUPPLY, 60)
+    assert (stats.count, stats.mean, stats.min, stats.max) == (3, 22.0, 20, 24)
+    assert aggregator.get(DataKey.MODEL_NAME, 60) is None
+    assert records == []
+
+    now = 61
+    aggregator.add(DataKey.AIR_TEMPERATURE_SUPPLY, "30")
+    assert len(records) == 1
+    assert (records[0].window, records[0].start, records[0].count) == (60, 0, 3)
+    assert aggregator.get(DataKey.AIR_TEMPERATURE_SUPPLY, 300).count == 4
+
+
+def test_aggregator_single_client():
+    """Test aggregator aggregates updates of one client only"""
+    client_1 = Client("localhost", 3001)
+    client_2 = Client("localhost", 3001)
+    aggregator = Aggregator()
+    aggregator.attach(client_1)
+    with pytest.raises(RuntimeError):
+        aggregator.attach(client_2)
+    aggregator.detach(client_1)
+    assert not client_1._on_update_handlers
+    aggregator.attach(client_2)
@@ -0,0 +1,81 @@
+"""Bulk parser tests"""
+
+import io
+import json
+import math
+
+import pytest
+
+from pysaleryd.bulk import parse_frame_log
+from pysaleryd.const import DataKey
+from pysaleryd.data import Message, SystemProperty
+
+np = pytest.importorskip("numpy")
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+FRAMES = [
+    "#MF: 1+ 0+ 2+30\r",
+    "#*TC: 21.5+ 0+ 100+0\r",
+    "#$MF: 2\r",
+    "#!IA:\r",
+    "#*SC: 4.1.2\r",
+    "#IA:  7 + 1 2+ .5+4.+9\r",
+    "#ZZ: 1\r",
+    "not a frame\r",
+    "#MF: 0.3+ -1\r",
+]
+
+
+def decode(frames: list[str]) -> dict[DataKey, list[list[float]]]:
+    """Values decoded frame by frame"""
+    result: dict[DataKey, list[list[float]]] = {}
+    for frame in frames:
+        try:
+            message = Message.decode(frame)
+        except BaseException:
+            continue
+        prop = SystemProperty.from_str(message.key, message.payload)
+        values = (prop.value, prop.min_value, prop.max_value, prop.extra)
+        result.setdefault(message.key, []).append(
+            [float(v) if isinstance(v, (int, float)) else math.nan for v in values]
+        )
+    return result
+
+
+@pytest.mark.parametrize("chunk_size", [5, 64, 1 << 20])
+def test_parse_frames(chunk_size: int):
+    """Test columns equal values decoded frame by frame"""
+    columns = parse_frame_log("".join(FRAMES).encode(), chunk_size)
+    expected = decode(FRAMES)
+    assert set(columns) == set(expected)
+    for key, rows in expected.items():
+        column = columns[key]
+        actual = np.column_stack(
+            [column.value, column.min_value, column.max_value, column.extra]
+        )
+        np.testing.assert_array_equal(actual, rows)
+        assert np.isnan(column.timestamp).all()
+        assert column.value.dtype == np.float64
+    assert columns[DataKey.MODE_FAN].index.tolist() == [0, 2, 7]
+
+
+def test_parse_recording(tmp_path):
+    """Test JSON lines written by record are read with timestamps"""
+    path = tmp_path / "frames.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i, frame in enumerate(FRAMES * 100):
+            f.write(json.dumps({"t": i * 0.25, "frame": frame}) + "\n")
+
+    columns = parse_frame_log(path, chunk_size=256)
+    fan = columns[DataKey.MODE_FAN]
+    assert len(fan) == 300
+    assert fan.timestamp[:3].tolist() == [0.0, 0.5, 2.0]
+    assert fan.value[:3].tolist() == [1.0, 2.0, 0.3]
+
+    with open(path, encoding="utf-8") as f:
+        streamed = parse_frame_log(f)
+    np.testing.assert_array_equal(streamed[DataKey.MODE_FAN].timestamp, fan.timestamp)
+    assert parse_frame_log(io.BytesIO(b"")) == {}
@@ -0,0 +1,73 @@
+"""Command line interface tests"""
+
+import asyncio
+import json
+import subprocess
+import sys
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pysaleryd.cli import main
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+def test_help_is_lazy():
+    """Test building the parser does not import the client"""
+    code = (
+        "import sys; from pysaleryd.cli import build_parser; build_parser(); "
+        "print(sorted(m for m in ('pysaleryd.client', 'websockets') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.asyncio
+async def test_send(ws_server: "TestServer", capsys):
+    """Test send waits for acknowledgement"""
+    assert await asyncio.to_thread(main, ["send", "localhost", "MODE_FAN", "0"]) == 0
+    assert capsys.readouterr().out.strip() == "ACKNOWLEDGED"
+
+
+def test_unknown_key(capsys):
+    """Test unknown key is a usage error"""
+    with pytest.raises(SystemExit) as exc_info:
+        main(["send", "localhost", "NOT_A_KEY", "0"])
+    assert exc_info.value.code == 2
+    assert "unknown key 'NOT_A_KEY'" in capsys.readouterr().err
+
+
+@pytest.mark.asyncio
+async def test_record_replay_monitor(ws_server: "TestServer", tmp_path, capsys):
+    """Test recorded frames are replayed to a monitoring client"""
+    recording = tmp_path / "frames.jsonl"
+    await asyncio.to_thread(
+        main, ["record", "localhost", "-o", str(recording), "-d", "1.5"]
+    )
+    frames = [json.loads(line) for line in recording.read_text().splitlines()]
+    assert frames and all(f["frame"].startswith("#MF") for f in frames)
+
+    replay = asyncio.create_task(
+        asyncio.to_thread(
+            main, ["replay", str(recording), "-p", "3021", "--loop", "-d", "3"]
+        )
+    )
+    await asyncio.sleep(0.5)
+    await asyncio.to_thread(main, ["monitor", "localhost", "-p", "3021", "-d", "1"])
+    await replay
+    updates = [
+        json.loads(line)
+        for line in capsys.readouterr().out.splitlines()
+        if line.startswith("{")
+    ]
+    assert updates and updates[0]["name"] == "MODE_FAN"
+    assert updates[0]["value"] == 1
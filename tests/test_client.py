@@ -2,6 +2,7 @@
 
 import asyncio
 import logging
+import time
 from typing import TYPE_CHECKING
 
 import pytest
@@ -9,7 +10,12 @@ import pytest_asyncio
 from websockets.protocol import State
 
 from pysaleryd.client import Client
+from pysaleryd.const import DeliveryStatus
 from pysaleryd.data import DataKey
+from pysaleryd.helpers.cadence import Cadence
+from pysaleryd.helpers.clock import VirtualClock
+from pysaleryd.helpers.connection import get_connection
+from pysaleryd.helpers.snapshot import load_snapshot, save_snapshot
 
 if TYPE_CHECKING:
     from tests.utils.test_server import TestServer
@@ -110,11 +116,11 @@ async def test_reconnect(hrv_client: "Client", ws_server: "TestServer", caplog):
     """Test reconnect"""
     caplog.set_level(logging.DEBUG)
 
-    await asyncio.wait_for(has_state(hrv_client, State.OPEN), 15)
+    await hrv_client.wait_for_state(State.OPEN, timeout=15)
     await ws_server.close()
-    await asyncio.wait_for(has_state(hrv_client, State.CLOSED), 15)
+    await hrv_client.wait_for_state(State.CLOSED, timeout=15)
     await ws_server.start()
-    await asyncio.wait_for(has_state(hrv_client, State.OPEN), 15)
+    await hrv_client.wait_for_state(State.OPEN, timeout=15)
 
 
 @pytest.mark.asyncio
@@ -135,7 +141,57 @@ async def test_connect_unresponsive(ws_server: "TestServer", caplog):
 @pytest.mark.asyncio
 async def test_send_command(hrv_client: "Client"):
     """Test send command"""
-    await hrv_client.send_command(DataKey.MODE_FAN, 0)
+    delivery = await hrv_client.send_command(DataKey.MODE_FAN, 0)
+    assert delivery.status == DeliveryStatus.ACKNOWLEDGED
+    assert hrv_client.data[DataKey.MODE_FAN] == "0"
+
+
+@pytest.mark.asyncio
+async def test_send_command_expired(ws_server: "TestServer"):
+    """Test command is dropped when deadline passes before it is sent"""
+    client = Client("localhost", 3001, 3, 10)
+    delivery = await client._websocket.send("#MF:0\r", ack_key="MF", ttl=0)
+    async with client:
+        assert await delivery.wait(2) == DeliveryStatus.EXPIRED
+
+
+@pytest.mark.asyncio
+async def test_sent_command_expires(ws_server: "TestServer"):
+    """Test sent command never acknowledged expires on its deadline"""
+    async with Client("localhost", 3001, 3, 10) as client:
+        # Acknowledgement of MF does not match, so deliveries stay in flight
+        delivery = await client._websocket.send("#MF:0\r", ack_key="XX", ttl=1)
+        forever = await client._websocket.send("#MF:0\r", ack_key="XX", ttl=None)
+        await asyncio.sleep(0.5)
+        assert delivery.status == DeliveryStatus.SENT
+        assert await asyncio.wait_for(delivery.wait(), 2) == DeliveryStatus.EXPIRED
+        assert forever.status == DeliveryStatus.SENT
+        assert client._websocket.acknowledge("XX") is forever
+
+
+@pytest.mark.asyncio
+async def test_in_flight_overflow(ws_server: "TestServer", monkeypatch, caplog):
+    """Test oldest unacknowledged message is no longer tracked on overflow"""
+    monkeypatch.setattr("pysaleryd.helpers.websocket._MAX_IN_FLIGHT", 2)
+    async with Client("localhost", 3001, 3, 10) as client:
+        deliveries = [
+            await client._websocket.send("#MF:0\r", ack_key="XX", ttl=None)
+            for _ in range(3)
+        ]
+        assert await deliveries[0].wait(2) == DeliveryStatus.OVERFLOWED
+        await asyncio.sleep(0.1)
+        assert [d.status for d in deliveries[1:]] == [DeliveryStatus.SENT] * 2
+    assert "Too many unacknowledged messages" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_send_command_without_ttl(ws_server: "TestServer"):
+    """Test command can opt out of command_ttl of client"""
+    async with Client("localhost", 3001, 3, 10, command_ttl=0) as client:
+        delivery = await client.send_command(DataKey.MODE_FAN, 0)
+        assert await delivery.wait(2) == DeliveryStatus.EXPIRED
+        delivery = await client.send_command(DataKey.MODE_FAN, 0, ttl=None)
+        assert await delivery.wait(2) == DeliveryStatus.ACKNOWLEDGED
 
 
 @pytest.mark.asyncio
@@ -147,3 +203,237 @@ async def test_disconnect(hrv_client: "Client", caplog):
     await hrv_client.close()
     await asyncio.sleep(5)
     await has_state(hrv_client, None)
+
+
+@pytest.mark.asyncio
+async def test_shared_connection(ws_server: "TestServer"):
+    """Test clients for the same host share connection and data"""
+    client_1 = Client("localhost", 3001, 3, 10, shared=True)
+    client_2 = Client("localhost", 3001, 3, 10, shared=True)
+    assert client_1._websocket is client_2._websocket
+    assert client_1._connection is client_2._connection
+
+    await client_1.connect()
+    await client_2.connect()
+    await has_state(client_2, State.OPEN)
+
+    await client_1.close()
+    await asyncio.sleep(1)
+    assert client_2.state == State.OPEN
+
+    await client_2.close()
+    assert client_2.state is None
+    assert get_connection("localhost", 3001) is not client_1._connection
+
+
+@pytest.mark.asyncio
+async def test_shared_connection_options(caplog):
+    """Test differing options of shared connection are reported"""
+    client_1 = Client("localhost", 3001, 3, 10, shared=True)
+    with caplog.at_level(logging.WARNING):
+        client_2 = Client("localhost", 3001, 3, 5, shared=True)
+    assert client_1._connection is client_2._connection
+    assert "other options" in caplog.text
+
+    connection = await asyncio.to_thread(get_connection, "localhost", 3001)
+    assert connection is not client_1._connection
+
+
+@pytest.mark.asyncio
+async def test_snapshot(ws_server: "TestServer", tmp_path):
+    """Test data is restored from and persisted to snapshot"""
+    path = tmp_path / "snapshot.json"
+    save_snapshot(
+        path,
+        {DataKey.MODEL_NAME: "TestModel", DataKey.MODE_FAN: "0+ 0+ 2+30"},
+        {DataKey.MODEL_NAME: 1.0, DataKey.MODE_FAN: 1.0},
+    )
+
+    async with Client("localhost", 3001, 3, 10, snapshot_path=path) as client:
+        assert client.data[DataKey.MODEL_NAME] == "TestModel"
+        assert DataKey.MODEL_NAME in client.stale
+        await asyncio.sleep(1)
+        assert DataKey.MODE_FAN not in client.stale
+        assert client.timestamps[DataKey.MODE_FAN] > 1.0
+
+    restored = load_snapshot(path)
+    assert restored[DataKey.MODE_FAN][0] == "1+ 1+ 1+1"
+    assert restored[DataKey.MODEL_NAME] == ("TestModel", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_ready(ws_server: "TestServer"):
+    """Test ready resolves when expected keys are received"""
+    async with Client(
+        "localhost", 3001, 3, 10, ready_keys={DataKey.MODE_FAN}
+    ) as client:
+        await client.ready(timeout=5)
+        assert client.is_ready
+        assert client.sync_duration is not None
+        assert DataKey.MODE_FAN in client.data
+
+    async with Client(
+        "localhost", 3001, 3, 10, ready_keys={DataKey.MODEL_NAME}
+    ) as client:
+        with pytest.raises(asyncio.TimeoutError):
+            await client.ready(timeout=1)
+        assert client.sync_duration is None
+
+
+@pytest.mark.asyncio
+async def test_wait_for(hrv_client: "Client"):
+    """Test waiting for value matching predicate"""
+    value = await hrv_client.wait_for(
+        DataKey.MODE_FAN, lambda v: v.value == 1, timeout=5
+    )
+    assert value.key == DataKey.MODE_FAN
+    assert value.max_value == 1
+
+    with pytest.raises(asyncio.TimeoutError):
+        await hrv_client.wait_for(DataKey.MODE_FAN, lambda v: v.value == 2, timeout=1)
+    assert len(hrv_client._key_waiters) == 0
+
+
+@pytest.mark.asyncio
+async def test_data_snapshot(hrv_client: "Client"):
+    """Test data snapshots are not modified by updates"""
+    await hrv_client.wait_for(DataKey.MODE_FAN, timeout=5)
+    snapshot = hrv_client.data
+    assert hrv_client.data is snapshot
+    await hrv_client._connection._on_message("#MF: 2+ 0+ 2+30\r")
+    assert snapshot[DataKey.MODE_FAN] == "1+ 1+ 1+1"
+    assert hrv_client.data[DataKey.MODE_FAN] == "2+ 0+ 2+30"
+    assert hrv_client.data.version > snapshot.version
+
+
+@pytest.mark.asyncio
+async def test_error_handler(hrv_client: "Client"):
+    """Test error changes are dispatched once per change"""
+    changes = []
+    hrv_client.add_error_handler(changes.append)
+    frames = [
+        ["Filter", "Fire"],
+        ["Filter", "Fire"],
+        ["Fire"],
+        [],
+    ]
+    for errors in frames:
+        messages = ["#*EA:\r", *[f"#*EB: {e}\r" for e in errors], "#*EZ:\r"]
+        for msg in messages:
+            await hrv_client._connection._on_message(msg)
+
+    assert [(c.raised, c.cleared) for c in changes] == [
+        (("Filter", "Fire"), ()),
+        ((), ("Filter",)),
+        ((), ("Fire",)),
+    ]
+    assert hrv_client.errors == []
+    assert len(hrv_client.error_history) == 3
+    assert hrv_client.data[DataKey.ERROR_MESSAGE] == "[]"
+
+
+@pytest.mark.asyncio
+async def test_wait_for_errors(hrv_client: "Client"):
+    """Test waiters of error message are notified with complete frames"""
+    waiter = asyncio.create_task(
+        hrv_client.wait_for(
+            DataKey.ERROR_MESSAGE,
+            lambda p: p.value == "['Filter', 'Fire']",
+            timeout=2,
+        )
+    )
+    first = asyncio.create_task(hrv_client.wait_for(DataKey.ERROR_MESSAGE, timeout=2))
+    await asyncio.sleep(0)
+    for msg in ["#*EA:\r", "#*EB: Filter\r", "#*EB: Fire\r", "#*EZ:\r"]:
+        await hrv_client._connection._on_message(msg)
+
+    assert (await first).value == "['Filter', 'Fire']"
+    assert (await waiter).value == hrv_client.data[DataKey.ERROR_MESSAGE]
+
+
+@pytest.mark.asyncio
+async def test_virtual_clock(ws_server: "TestServer", mocker):
+    """Test a day of timers runs in virtual time"""
+    clock = VirtualClock()
+    calls = []
+    async with Client("localhost", 3001, 30, 10, clock=clock) as client:
+        async with asyncio.timeout(5):
+            await client.wait_for(DataKey.MODE_FAN)
+        client.add_data_handler(calls.append)
+        send = mocker.spy(client._websocket, "send")
+
+        started = time.monotonic()
+        await clock.advance(24 * 3600)
+        assert time.monotonic() - started < 10
+        assert len(calls) == 24 * 3600 / 30
+        assert send.call_count == 24 * 3600 / 30
+
+        # Command acknowledgement wait runs in virtual time too
+        command = asyncio.create_task(client.send_command(DataKey.MODE_FAN, 0))
+        await clock.advance(0.5)
+        assert (await command).status == DeliveryStatus.ACKNOWLEDGED
+
+
+@pytest.mark.asyncio
+async def test_dispatch_window(ws_server: "TestServer"):
+    """Test acknowledgements within dispatch window are coalesced"""
+    calls = []
+    async with Client("localhost", 3001, 30, 10, dispatch_window=0.1) as client:
+        client.add_data_handler(calls.append)
+        deliveries = await asyncio.gather(
+            *(client.send_command(DataKey.MODE_FAN, i % 2) for i in range(10))
+        )
+        assert all(d.status == DeliveryStatus.ACKNOWLEDGED for d in deliveries)
+        await asyncio.sleep(0.2)
+        assert len(calls) == 1
+
+    calls.clear()
+    async with Client(
+        "localhost", 3001, 30, 10, dispatch_window=0.1, max_dispatch_delay=0.15
+    ) as client:
+        client.add_data_handler(calls.append)
+        for i in range(6):
+            await client.send_command(DataKey.MODE_FAN, i % 2)
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        # Calls are bounded by max_dispatch_delay despite a steady stream
+        assert 2 <= len(calls) <= 4
+
+
+@pytest.mark.asyncio
+async def test_data_handler_cadence(ws_server: "TestServer"):
+    """Test data handlers with cadence are called on it, not on updates"""
+    clock = VirtualClock()
+    default, fast, on_change = [], [], []
+    async with Client("localhost", 3001, 30, 10, clock=clock) as client:
+        async with asyncio.timeout(5):
+            await client.wait_for(DataKey.MODE_FAN)
+        client.add_data_handler(default.append)
+        client.add_data_handler(fast.append, Cadence(interval=1))
+        client.add_data_handler(on_change.append, Cadence(on_change=True))
+        await clock.advance(10)
+        assert not default
+        assert len(fast) == 10
+        assert not on_change
+
+        command = asyncio.create_task(client.send_command(DataKey.MODE_FAN, 0))
+        await clock.advance(0.5)
+        await command
+        assert len(default) == 1
+        assert len(on_change) == 1
+        assert on_change[-1][DataKey.MODE_FAN] == "0"
+
+        client.remove_data_handler(fast.append)
+        calls = len(fast)
+        await clock.advance(10)
+        assert len(fast) == calls
+
+
+@pytest.mark.asyncio
+async def test_data_handler_cadence_real_time(ws_server: "TestServer"):
+    """Test data handler with cadence is called in real time"""
+    calls = []
+    async with Client("localhost", 3001, 30, 10) as client:
+        client.add_data_handler(calls.append, Cadence(interval=0.1))
+        await asyncio.sleep(0.5)
+    assert calls
@@ -0,0 +1,94 @@
+"""Collector tests"""
+
+import asyncio
+import math
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pysaleryd.collector import NUMERIC_KEYS, Collector, SharedStateTable
+from pysaleryd.const import DataKey
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+def test_shared_state_table():
+    """Test values written are read from other attached table"""
+    table = SharedStateTable.create(2)
+    try:
+        reader = SharedStateTable.attach(table.name)
+        table.write(1, DataKey.MODE_FAN, 2, 100.0)
+        assert reader.read(0) == {}
+        assert reader.read(1) == {DataKey.MODE_FAN: 2.0}
+        updated, values = reader.read_row(1)
+        assert updated == 100.0
+        assert len(values) == len(NUMERIC_KEYS)
+        assert math.isnan(values[NUMERIC_KEYS.index(DataKey.MODE_TEMPERATURE)])
+        reader.close()
+    finally:
+        table.close()
+
+
+@pytest.mark.asyncio
+async def test_collector(ws_server: "TestServer"):
+    """Test values are collected and crashed workers are restarted"""
+    collector = Collector(
+        [("localhost", 3001)], workers=1, restart_backoff=0.1, connect_timeout=5
+    )
+    await asyncio.to_thread(collector.start)
+    try:
+        async with asyncio.timeout(20):
+            while DataKey.MODE_FAN not in collector.table.read(0):
+                await asyncio.sleep(0.2)
+
+        process = collector._workers[0].process
+        process.kill()
+        async with asyncio.timeout(10):
+            while collector._workers[0].process is process:
+                await asyncio.sleep(0.2)
+        assert collector._workers[0].restarts == 1
+
+        # Restarts are counted again after running longer than max backoff
+        collector._workers[0].started -= 60
+        process = collector._workers[0].process
+        process.kill()
+        async with asyncio.timeout(10):
+            while collector._workers[0].process is process:
+                await asyncio.sleep(0.2)
+        assert collector._workers[0].restarts == 1
+    finally:
+        await asyncio.to_thread(collector.close)
+
+
+@pytest.mark.asyncio
+async def test_collector_rebalance(ws_server: "TestServer"):
+    """Test units of failed worker move to running worker without restarting it"""
+    collector = Collector(
+        [("localhost", 3001)] * 2, workers=2, max_restarts=0, connect_timeout=5
+    )
+    await asyncio.to_thread(collector.start)
+    try:
+        async with asyncio.timeout(20):
+            while not all(DataKey.MODE_FAN in collector.table.read(i) for i in (0, 1)):
+                await asyncio.sleep(0.2)
+
+        process = collector._workers[1].process
+        collector._workers[0].process.kill()
+        async with asyncio.timeout(10):
+            while 0 in collector.assignments:
+                await asyncio.sleep(0.2)
+        assert collector.assignments == {1: [1, 0]}
+        assert collector._workers[1].process is process
+
+        updated, _ = collector.table.read_row(0)
+        async with asyncio.timeout(10):
+            while collector.table.read_row(0)[0] == updated:
+                await asyncio.sleep(0.2)
+        assert process.is_alive()
+    finally:
+        await asyncio.to_thread(collector.close)
@@ -0,0 +1,49 @@
+"""Discovery tests"""
+
+import asyncio
+
+import pytest
+
+from pysaleryd.const import DataKey
+from pysaleryd.discovery import DiscoveredUnit, discover
+from tests.utils import test_server
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+@pytest.mark.asyncio
+async def test_discover():
+    """Test units are confirmed by handshake on open ports"""
+    identity = {DataKey.MODEL_NAME: "LS-01", DataKey.CONTROL_SYSTEM_VERSION: "4.1.5"}
+
+    async def silent(reader, writer):
+        """Accept connection, never answer"""
+        await reader.read()
+        writer.close()
+
+    found = []
+    async with (
+        test_server.TestServer("127.0.0.1", 3011, identity=identity),
+        test_server.TestServer("127.0.0.1", 3012),
+        test_server.TestServer("127.0.0.1", 3013, identity=identity),
+    ):
+        tcp_server = await asyncio.start_server(silent, "127.0.0.1", 3014)
+        async with tcp_server:
+            units = await discover(
+                "127.0.0.1/32",
+                range(3010, 3016),
+                concurrency=2,
+                connect_timeout=0.5,
+                handshake_timeout=1,
+                on_found=found.append,
+            )
+
+    assert units == [
+        DiscoveredUnit("127.0.0.1", 3011, "LS-01", "4.1.5"),
+        DiscoveredUnit("127.0.0.1", 3013, "LS-01", "4.1.5"),
+    ]
+    assert sorted(found, key=lambda u: u.port) == units
+    assert set(found) == set(units)
+    assert units[0].config == {"ip": "127.0.0.1", "port": 3011}
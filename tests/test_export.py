@@ -0,0 +1,88 @@
+"""Export tests"""
+
+import math
+import sqlite3
+
+import pytest
+
+from pysaleryd.client import Client
+from pysaleryd.const import DataKey
+from pysaleryd.data import Message
+from pysaleryd.export import ColumnarFileSink, ExportSink, SQLiteSink, read_columnar
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sink(tmp_path):
+    """Test updates of client are written to SQLite in batches"""
+    path = tmp_path / "export.db"
+    client = Client("localhost", 3001)
+    with SQLiteSink(path, batch_size=2) as sink:
+        sink.attach(client)
+        for msg in ["#MF: 1+ 0+ 2+30\r", "#*SB: TestModel\r", "#*TC: 21\r"]:
+            await client._on_message(Message.decode(msg))
+    assert sink.stats.rows == 3
+    assert sink.stats.batches == 2
+    assert not client._on_update_handlers
+
+    with sqlite3.connect(path) as db:
+        rows = db.execute(
+            "SELECT k.name, u.value, u.max_value, u.payload FROM updates u "
+            "JOIN updates_keys k ON k.id = u.key ORDER BY u.rowid"
+        ).fetchall()
+    assert rows == [
+        ("MODE_FAN", 1.0, 2.0, "1+ 0+ 2+30"),
+        ("MODEL_NAME", None, None, "TestModel"),
+        ("AIR_TEMPERATURE_SUPPLY", 21.0, None, "21"),
+    ]
+
+
+def test_columnar_file_sink(tmp_path):
+    """Test updates are written as row groups and read back"""
+    path = tmp_path / "export.bin"
+    with ColumnarFileSink(path, batch_size=2) as sink:
+        sink.add(DataKey.MODE_FAN, "1+ 0+ 2+30")
+        sink.add(DataKey.MODEL_NAME, "TestModel")
+        sink.add(DataKey.AIR_TEMPERATURE_SUPPLY, "21")
+
+    groups = list(read_columnar(path))
+    assert [len(g["key"]) for g in groups] == [2, 1]
+    assert groups[0]["key"] == [DataKey.MODE_FAN, DataKey.MODEL_NAME]
+    assert groups[0]["max_value"][0] == 2.0
+    assert math.isnan(groups[0]["value"][1])
+    assert groups[0]["payload"] == ["1+ 0+ 2+30", "TestModel"]
+    assert groups[1]["value"] == [21.0]
+
+
+def test_sink_single_client(tmp_path):
+    """Test sink exports updates of one client only"""
+    client_1 = Client("localhost", 3001)
+    client_2 = Client("localhost", 3001)
+    sink = ColumnarFileSink(tmp_path / "export.bin")
+    sink.attach(client_1)
+    with pytest.raises(RuntimeError):
+        sink.attach(client_2)
+    sink.close()
+    assert not client_1._on_update_handlers
+
+
+class _FailingSink(ExportSink):
+    def _open(self) -> None:
+        raise OSError("Cannot open")
+
+    def _write(self, batch) -> None:
+        pass
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_sink_writer_died():
+    """Test close does not block when writer thread has died"""
+    sink = _FailingSink(max_pending=1)
+    sink.start()
+    sink._thread.join()
+    sink.add(DataKey.MODE_FAN, "1+ 0+ 2+30")
+    sink.close()
+    assert sink.stats.dropped_rows == 1
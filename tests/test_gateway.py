@@ -0,0 +1,109 @@
+"""Gateway tests"""
+
+import asyncio
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pysaleryd.client import Client
+from pysaleryd.data import DataKey
+from pysaleryd.gateway import Gateway
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+async def request(port, method, path, headers=None, body=b""):
+    """Send request and return status, headers and body"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Connection: close"]
+    head.append(f"Content-Length: {len(body)}")
+    head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write("\r\n".join(head).encode() + b"\r\n\r\n" + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), headers, body
+
+
+@pytest.mark.asyncio
+async def test_gateway_state(ws_server: "TestServer"):
+    """Test conditional and long-polling state requests"""
+    async with (
+        Client("localhost", 3001, 3, 10) as client,
+        Gateway(client, port=0) as gateway,
+    ):
+        await client.wait_for(DataKey.MODE_FAN, timeout=5)
+        status, headers, body = await request(gateway.port, "GET", "/state")
+        assert status == 200
+        state = json.loads(body)
+        assert state["state"] == "OPEN"
+        assert state["data"]["MF"]["value"] == 1
+        etag = headers["ETag"]
+        assert etag == f'"{state["version"]}"'
+
+        status, _, body = await request(
+            gateway.port, "GET", "/state", {"If-None-Match": etag}
+        )
+        assert status == 304
+        assert body == b""
+
+        # Long-poll is answered when a command changes the state
+        poll = asyncio.create_task(
+            request(gateway.port, "GET", f"/state?version={state['version']}&wait=5")
+        )
+        await asyncio.sleep(0.1)
+        assert not poll.done()
+        status, _, body = await request(
+            gateway.port, "POST", "/command", body=b'{"key": "MODE_FAN", "value": 0}'
+        )
+        assert status == 200
+        assert json.loads(body) == {"key": "MF", "status": "ACKNOWLEDGED"}
+        status, _, body = await poll
+        assert status == 200
+        assert json.loads(body)["version"] != state["version"]
+
+        status, _, _ = await request(
+            gateway.port, "POST", "/command", body=b'{"key": "XX"}'
+        )
+        assert status == 400
+
+    # Versions of a previous gateway do not match
+    async with (
+        Client("localhost", 3001, 3, 10) as client,
+        Gateway(client, port=0) as gateway,
+    ):
+        await client.wait_for(DataKey.MODE_FAN, timeout=5)
+        status, headers, _ = await request(
+            gateway.port, "GET", "/state", {"If-None-Match": etag}
+        )
+        assert status == 200
+        assert headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_gateway_events(ws_server: "TestServer"):
+    """Test state is streamed as server-sent events"""
+    async with (
+        Client("localhost", 3001, 3, 10) as client,
+        Gateway(client, port=0) as gateway,
+    ):
+        reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+        writer.write(b"GET /events HTTP/1.1\r\n\r\n")
+        async with asyncio.timeout(5):
+            assert b"text/event-stream" in await reader.readuntil(b"\r\n\r\n")
+            versions = []
+            while len(versions) < 2:
+                event = await reader.readuntil(b"\n\n")
+                assert event.startswith(b"id: ")
+                versions.append(json.loads(event.split(b"data: ", 1)[1])["version"])
+                await client.send_command(DataKey.MODE_FAN, 0)
+        assert versions[0] != versions[1]
+        writer.close()
@@ -0,0 +1,232 @@
+"""Helper tests"""
+
+import asyncio
+import logging
+import socket
+import time
+
+import pytest
+
+from pysaleryd.const import CommandPriority
+from pysaleryd.helpers.cadence import Cadence, CadenceScheduler
+from pysaleryd.helpers.clock import VirtualClock
+from pysaleryd.helpers.log import FrameSampler, ThrottledLogger
+from pysaleryd.helpers.scheduler import MessageScheduler
+from pysaleryd.helpers.task import RestartPolicy, TaskList, TaskSupervisor
+from pysaleryd.helpers.transport import TransportOptions, new_event_loop
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_priority():
+    """Test messages are sent by priority, then in order"""
+    scheduler = MessageScheduler()
+    scheduler.put("bulk", CommandPriority.BULK)
+    scheduler.put("interactive-1")
+    scheduler.put("pong", CommandPriority.CONTROL)
+    scheduler.put("interactive-2")
+
+    assert [await scheduler.get() for _ in range(4)] == [
+        "pong",
+        "interactive-1",
+        "interactive-2",
+        "bulk",
+    ]
+    assert scheduler.stats[CommandPriority.INTERACTIVE].count == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rate_limit():
+    """Test rate limit applies to all but control messages"""
+    scheduler = MessageScheduler(rate=10, burst=1)
+    for i in range(3):
+        scheduler.put(f"bulk-{i}", CommandPriority.BULK)
+
+    start = time.monotonic()
+    assert await scheduler.get() == "bulk-0"
+    get_task = asyncio.create_task(scheduler.get())
+    await asyncio.sleep(0.01)
+    scheduler.put("pong", CommandPriority.CONTROL)
+    assert await get_task == "pong"
+    assert await scheduler.get() == "bulk-1"
+    assert await scheduler.get() == "bulk-2"
+    assert time.monotonic() - start >= 0.18
+    assert scheduler.stats[CommandPriority.BULK].max_wait >= 0.18
+
+
+def test_frame_sampler():
+    """Test every Nth frame is sampled, limited per second"""
+    sampler = FrameSampler(every=3)
+    assert [sampler.sample() for _ in range(6)] == [False, False, True] * 2
+
+    sampler = FrameSampler(per_second=2)
+    assert sum(sampler.sample() for _ in range(100)) <= 4
+
+
+def test_throttled_logger(caplog):
+    """Test identical warnings are suppressed within interval"""
+    logger = ThrottledLogger(logging.getLogger(__name__), interval=0.1)
+    for _ in range(5):
+        logger.warning("Connection to %s failed", "a")
+    logger.warning("Other")
+    time.sleep(0.1)
+    logger.warning("Connection to %s failed", "b")
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "Connection to a failed",
+        "Other",
+        "Connection to b failed (4 similar messages suppressed)",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_task_list_keeps_tasks():
+    """Test tasks added without removal are kept"""
+    tasks = TaskList()
+    task = asyncio.create_task(asyncio.sleep(0))
+    tasks.add(task, remove_when_done=False)
+    await tasks.wait()
+    assert tasks.tasks == [task]
+    tasks.remove(task)
+    assert not tasks
+
+
+@pytest.mark.asyncio
+async def test_task_supervisor_restart(caplog):
+    """Test failed tasks are restarted with backoff until max_restarts"""
+    runs = []
+
+    async def fail():
+        runs.append(time.monotonic())
+        raise RuntimeError("failed")
+
+    supervisor = TaskSupervisor()
+    supervisor.spawn(
+        fail, name="fail", restart=RestartPolicy(max_restarts=2, backoff=0.1)
+    )
+    await asyncio.sleep(0.5)
+    assert len(runs) == 3
+    assert runs[2] - runs[1] >= runs[1] - runs[0] >= 0.1
+    assert not supervisor
+    # Final failure is logged with traceback
+    assert 'raise RuntimeError("failed")' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_task_supervisor_cancel(caplog):
+    """Test cancel stops pending restarts and reports leaked tasks"""
+
+    async def stubborn():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.5)
+
+    async def fail():
+        raise RuntimeError("failed")
+
+    supervisor = TaskSupervisor(debug=True)
+    supervisor.spawn(fail, name="fail", restart=RestartPolicy(backoff=0.1))
+    task = supervisor.spawn(stubborn, name="stubborn")
+    await asyncio.sleep(0.01)
+    assert set(supervisor.ages) == {"stubborn"}
+    assert supervisor
+
+    await supervisor.cancel(timeout=0.1)
+    assert "Task stubborn leaked" in caplog.text
+    await asyncio.sleep(0.2)
+    assert set(supervisor.ages) == {"stubborn"}
+    await task
+    assert not supervisor
+
+
+@pytest.mark.asyncio
+async def test_virtual_clock():
+    """Test timers fire in order when virtual time is advanced"""
+    clock = VirtualClock()
+    fired = []
+
+    async def sleeper(delay):
+        await clock.sleep(delay)
+        fired.append((delay, clock.time()))
+
+    tasks = [asyncio.create_task(sleeper(delay)) for delay in (30, 10, 20)]
+    await clock.advance(15)
+    assert fired == [(10, 10)]
+    await clock.advance(3600)
+    assert fired == [(10, 10), (20, 20), (30, 30)]
+    assert clock.time() == 3615
+    await asyncio.gather(*tasks)
+
+    with pytest.raises(TimeoutError):
+        async with clock.timeout(5):
+            await clock.advance(4)
+            await clock.advance(1)
+            await asyncio.sleep(0)
+    assert clock.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_cadence_scheduler():
+    """Test handlers are called on their own cadence from one timer"""
+    clock = VirtualClock()
+    calls = []
+    scheduler = CadenceScheduler(lambda handlers: calls.append(handlers), clock)
+    scheduler.add("fast", Cadence(interval=1))
+    scheduler.add("slow", Cadence(interval=5))
+    scheduler.add("change", Cadence(on_change=True, min_interval=2))
+    scheduler.add("stale", Cadence(on_change=True, max_staleness=3))
+    scheduler.start()
+
+    await clock.advance(10)
+    counts = {h: sum(h in c for c in calls) for h in ("fast", "slow", "change")}
+    assert counts == {"fast": 10, "slow": 2, "change": 0}
+    assert sum("stale" in c for c in calls) == 3
+    assert clock.pending == 1
+
+    calls.clear()
+    for _ in range(5):
+        scheduler.changed()
+        await clock.advance(0.5)
+    # First change is handled at once, the rest coalesced after min_interval
+    assert sum("change" in c for c in calls) == 2
+    # Without min_interval every change is handled
+    assert sum("stale" in c for c in calls) == 5
+
+    scheduler.remove("fast")
+    calls.clear()
+    await clock.advance(5)
+    assert not any("fast" in c for c in calls)
+    scheduler.stop()
+    assert clock.pending == 0
+
+    with pytest.raises(ValueError):
+        Cadence()
+
+
+def test_transport_options():
+    """Test transport options are passed to connect and applied to socket"""
+    options = TransportOptions(max_queue=8)
+    assert options.connect_kwargs() == {
+        "compression": None,
+        "max_queue": 8,
+        "max_size": 2**16,
+        "write_limit": 2**12,
+    }
+    assert TransportOptions.library_defaults().compression == "deflate"
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        options.apply(sock)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+
+def test_new_event_loop():
+    """Test asyncio loop is used unless uvloop is requested and installed"""
+    loop = new_event_loop(use_uvloop=False)
+    try:
+        assert isinstance(loop, asyncio.AbstractEventLoop)
+        assert type(loop).__module__.startswith("asyncio")
+    finally:
+        loop.close()
@@ -1,9 +1,15 @@
 import logging
+import pickle
 
 import pytest
 
 from pysaleryd.const import DataKey, MessageContext, MessageSeparator
-from pysaleryd.data import Message, SystemProperty, UnsupportedMessageType
+from pysaleryd.data import (
+    DataSnapshot,
+    Message,
+    SystemProperty,
+    UnsupportedMessageType,
+)
 
 __author__ = "Björn Dalfors"
 __copyright__ = "Björn Dalfors"
@@ -104,3 +110,15 @@ def test_parse_system_property_with_extra_and_no_value():
     assert parsed.min_value is None
     assert parsed.max_value is None
     assert parsed.extra is None
+
+
+def test_data_snapshot_is_immutable():
+    """Test DataSnapshot cannot be modified"""
+    snapshot = DataSnapshot({DataKey.MODE_FAN: "1+ 0+ 2+30"}, 3)
+    assert snapshot.version == 3
+    assert snapshot == {DataKey.MODE_FAN: "1+ 0+ 2+30"}
+    with pytest.raises(TypeError):
+        snapshot[DataKey.MODE_FAN] = "2"
+    with pytest.raises(TypeError):
+        snapshot.update({})
+    assert pickle.loads(pickle.dumps(snapshot)).version == 3
@@ -0,0 +1,111 @@
+"""Rule tests"""
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pysaleryd.client import Client
+from pysaleryd.const import DataKey
+from pysaleryd.helpers.clock import VirtualClock
+from pysaleryd.rules import Condition, Rule, RuleEngine
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+def test_rule_hysteresis():
+    """Test rule is edge triggered and released with hysteresis"""
+    events = []
+    engine = RuleEngine(
+        [
+            Rule(
+                "supply_cold",
+                Condition(DataKey.AIR_TEMPERATURE_SUPPLY, "<", 12, hysteresis=1),
+            ),
+            Rule("filter", Condition(DataKey.FILTER_MONTHS_LEFT, "==", 0)),
+        ]
+    )
+    engine.add_handler(events.append)
+
+    for temperature in ["13", "11", "10", "12.5", "13.5"]:
+        engine.add(DataKey.AIR_TEMPERATURE_SUPPLY, temperature)
+        if temperature == "12.5":
+            assert engine.active == {"supply_cold"}
+    engine.add(DataKey.FILTER_MONTHS_LEFT, "0")
+
+    assert [(e.rule.name, e.active) for e in events] == [
+        ("supply_cold", True),
+        ("supply_cold", False),
+        ("filter", True),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rule_duration():
+    """Test rule is active once conditions hold for duration"""
+    clock = VirtualClock()
+    engine = RuleEngine(clock=clock)
+    engine.add_rule(
+        Rule(
+            "cold_and_heater_off",
+            Condition(DataKey.AIR_TEMPERATURE_SUPPLY, "<", 12),
+            Condition(DataKey.MODE_HEATER, "==", 0),
+            duration=300,
+        )
+    )
+    engine.add(DataKey.AIR_TEMPERATURE_SUPPLY, "10")
+    engine.add(DataKey.MODE_HEATER, "0+ 0+ 1")
+    await clock.advance(299)
+    assert not engine.active
+    await clock.advance(1)
+    assert engine.active == {"cold_and_heater_off"}
+
+    engine.remove_rule("cold_and_heater_off")
+    assert not engine._index
+    assert not clock.pending
+
+
+@pytest.mark.asyncio
+async def test_rule_errors(ws_server: "TestServer"):
+    """Test error rule of client is activated by timer and cleared with errors"""
+    clock = VirtualClock()
+    events = []
+    engine = RuleEngine(
+        [
+            Rule(
+                "errors",
+                Condition(DataKey.ERROR_MESSAGE, "!=", "[]", "payload"),
+                duration=60,
+            )
+        ],
+        clock=clock,
+    )
+    engine.add_handler(events.append)
+    async with Client("localhost", 3001, 30, 10, clock=clock) as client:
+        engine.attach(client)
+        for errors in [["Filter"], []]:
+            messages = ["#*EA:\r", *[f"#*EB: {e}\r" for e in errors], "#*EZ:\r"]
+            for msg in messages:
+                await client._connection._on_message(msg)
+            await clock.advance(60)
+        engine.detach(client)
+
+    assert [(e.active, e.timestamp) for e in events] == [(True, 60), (False, 60)]
+
+
+def test_rule_engine_single_client():
+    """Test rule engine evaluates updates of one client only"""
+    client_1 = Client("localhost", 3001)
+    client_2 = Client("localhost", 3001)
+    engine = RuleEngine()
+    engine.attach(client_1)
+    with pytest.raises(RuntimeError):
+        engine.attach(client_2)
+    engine.detach(client_1)
+    assert not client_1._on_update_handlers
+    assert not client_1._on_error_handlers
+    engine.attach(client_2)
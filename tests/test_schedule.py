@@ -0,0 +1,173 @@
+"""Schedule engine tests"""
+
+import asyncio
+import datetime as dt
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pysaleryd.client import Client
+from pysaleryd.const import DataKey, DeliveryStatus
+from pysaleryd.helpers.clock import VirtualClock
+from pysaleryd.schedule import (
+    WEEKDAYS,
+    CommandProfile,
+    Once,
+    Schedule,
+    ScheduleEngine,
+    ScheduleEvent,
+    Weekly,
+)
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+# Monday
+START = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc).timestamp()
+HOUR = 3600
+DAY = 24 * HOUR
+
+BOOST = CommandProfile("boost", {DataKey.MODE_FAN: 2})
+ECONOMY = CommandProfile("economy", {DataKey.MODE_FAN: 0})
+FIREPLACE = CommandProfile("fireplace", {DataKey.FIREPLACE_MODE: 1})
+
+
+class RecordingClient:
+    """Client recording sent commands"""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.sent: list[tuple[float, DataKey, str | int]] = []
+
+    async def send_command(self, key, payload, priority=None, ttl=None):
+        self.sent.append((START + self.clock.time(), key, payload))
+
+
+def test_weekly():
+    """Test next occurrence on days of week"""
+    weekly = Weekly("06:30", WEEKDAYS, dt.timezone.utc)
+    assert weekly.next_after(START) == START + 6.5 * HOUR
+    assert weekly.next_after(START + 6.5 * HOUR) == START + DAY + 6.5 * HOUR
+    # Friday evening to Monday morning
+    assert weekly.next_after(START + 4 * DAY + 7 * HOUR) == START + 7 * DAY + 6.5 * HOUR
+    assert Once(START).next_after(START) is None
+    with pytest.raises(ValueError):
+        Weekly("06:30", [7])
+
+
+@pytest.mark.asyncio
+async def test_schedule_engine():
+    """Test a week of schedules runs from one timer"""
+    clock = VirtualClock()
+    engine = ScheduleEngine(clock=clock, wall_time=lambda: START + clock.time())
+    events: list[ScheduleEvent] = []
+    engine.add_handler(events.append)
+    units = [RecordingClient(clock) for _ in range(3)]
+    for unit in units:
+        engine.add(Schedule(unit, BOOST, Weekly("06:30", WEEKDAYS, dt.timezone.utc)))
+        engine.add(Schedule(unit, ECONOMY, Weekly("22:00", tz=dt.timezone.utc)))
+    engine.add(Schedule(units[0], FIREPLACE, Once(START + 18 * HOUR)))
+    for i in range(1000):
+        engine.add(Schedule(RecordingClient(clock), ECONOMY, Once(START + 8 * DAY + i)))
+
+    engine.start()
+    assert clock.pending == 1
+    await clock.advance(7 * DAY)
+    sent = units[0].sent
+    assert [payload for _, _, payload in sent[:3]] == [2, 1, 0]
+    assert sent[1] == (START + 18 * HOUR, DataKey.FIREPLACE_MODE, 1)
+    assert len(sent) == 5 + 7 + 1
+    assert all(len(unit.sent) == 12 for unit in units[1:])
+    assert len(events) == 3 * 12 + 1
+    assert all(event.late == 0 for event in events)
+    assert len(engine) == 1006
+
+    await clock.advance(DAY + 1000)
+    assert len(engine) == 6
+    await engine.close()
+    assert clock.pending == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "catch_up, expected",
+    [
+        ("none", []),
+        ("last", [(2, 54.5), (0, 70)]),
+        ("all", [(2, 6.5), (0, 22), (2, 30.5), (0, 46), (2, 54.5), (0, 70)]),
+    ],
+)
+async def test_schedule_catch_up(catch_up: str, expected: list):
+    """Test occurrences missed while stopped are sent in order on start"""
+    clock = VirtualClock(3 * DAY)
+    engine = ScheduleEngine(clock=clock, wall_time=lambda: START + clock.time())
+    events: list[ScheduleEvent] = []
+    engine.add_handler(events.append)
+    unit = RecordingClient(clock)
+    for profile, timing in (
+        (ECONOMY, Weekly("22:00", tz=dt.timezone.utc)),
+        (BOOST, Weekly("06:30", WEEKDAYS, dt.timezone.utc)),
+    ):
+        engine.add(Schedule(unit, profile, timing, catch_up))
+
+    engine.start(since=START)
+    await clock.advance(0)
+    assert [
+        (payload, (event.due - START) / HOUR)
+        for (_, _, payload), event in zip(unit.sent, events)
+    ] == expected
+    assert len(events) == len(expected)
+    assert engine.checkpoint == START + 3 * DAY
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_checkpoint_unsent():
+    """Test profiles not sent when closed are caught up from checkpoint"""
+    clock = VirtualClock()
+    engine = ScheduleEngine(clock=clock, wall_time=lambda: START + clock.time())
+    unit = RecordingClient(clock)
+    sending = asyncio.Event()
+
+    async def send_command(*args):
+        sending.set()
+        await asyncio.Event().wait()
+
+    blocked = RecordingClient(clock)
+    blocked.send_command = send_command
+    engine.add(Schedule(blocked, BOOST, Weekly("06:30", tz=dt.timezone.utc)))
+    engine.add(Schedule(unit, ECONOMY, Weekly("06:30", tz=dt.timezone.utc)))
+    engine.start()
+    await clock.advance(7 * HOUR)
+    assert sending.is_set()
+    assert len(unit.sent) == 1
+    await engine.close()
+    checkpoint = engine.checkpoint
+    assert checkpoint < START + 6.5 * HOUR
+
+    engine = ScheduleEngine(clock=clock, wall_time=lambda: START + clock.time())
+    events: list[ScheduleEvent] = []
+    engine.add_handler(events.append)
+    engine.add(Schedule(unit, BOOST, Weekly("06:30", tz=dt.timezone.utc), "all"))
+    engine.start(since=checkpoint)
+    await clock.advance(0)
+    assert [event.due for event in events] == [START + 6.5 * HOUR]
+    assert engine.checkpoint == START + 7 * HOUR
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_client(ws_server: "TestServer"):
+    """Test profile is sent through client"""
+    events: list[ScheduleEvent] = []
+    async with Client("localhost", 3001, 30, 10) as client:
+        async with ScheduleEngine() as engine:
+            engine.add_handler(events.append)
+            engine.add(Schedule(client, FIREPLACE, Once(engine.checkpoint + 0.2)))
+            await asyncio.sleep(1)
+    assert len(events) == 1
+    assert events[0].deliveries[0].status == DeliveryStatus.ACKNOWLEDGED
@@ -0,0 +1,62 @@
+"""Synchronous client tests"""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+import pytest
+from websockets.protocol import State
+
+from pysaleryd.const import DataKey, DeliveryStatus
+from pysaleryd.sync import SyncClient
+
+if TYPE_CHECKING:
+    from tests.utils.test_server import TestServer
+
+__author__ = "Björn Dalfors"
+__copyright__ = "Björn Dalfors"
+__license__ = "MIT"
+
+
+def run_sync_client() -> tuple:
+    with SyncClient("localhost", 3001, connect_timeout=10) as client:
+        client.wait_for_state(State.OPEN, timeout=5)
+        value = client.wait_for(DataKey.MODE_FAN, timeout=5)
+        delivery = client.send_command(DataKey.MODE_FAN, 0)
+        client.wait_for(DataKey.MODE_FAN, lambda v: v.value == 1, timeout=5)
+        data = client.data
+    assert client.state is None
+    assert client.data == {}
+    return value, delivery, data
+
+
+@pytest.mark.asyncio
+async def test_sync_client(ws_server: "TestServer", caplog):
+    """Test blocking calls from another thread"""
+    caplog.set_level(logging.ERROR)
+    value, delivery, data = await asyncio.to_thread(run_sync_client)
+    # Closing finalizes tasks and async generators without errors
+    assert not caplog.records
+    assert value.key == DataKey.MODE_FAN
+    assert delivery.status == DeliveryStatus.ACKNOWLEDGED
+    assert DataKey.MODE_FAN in data
+
+
+def run_shared_sync_clients() -> tuple:
+    client_1 = SyncClient("localhost", 3001, connect_timeout=10, shared=True)
+    client_2 = SyncClient("localhost", 3001, connect_timeout=10, shared=True)
+    with client_1, client_2:
+        shared = (
+            client_1._get_client()._connection is client_2._get_client()._connection
+        )
+        client_1.close()
+        value = client_2.wait_for(DataKey.MODE_FAN, timeout=5)
+    return shared, value
+
+
+@pytest.mark.asyncio
+async def test_shared_sync_clients(ws_server: "TestServer"):
+    """Test shared sync clients use one connection"""
+    shared, value = await asyncio.to_thread(run_shared_sync_clients)
+    assert shared
+    assert value.key == DataKey.MODE_FAN
@@ -11,6 +11,17 @@ from pysaleryd.helpers.task import task_manager
 _LOGGER = logging.getLogger(__name__)
 
 
+async def command_handler(ws: ServerConnection) -> None:
+    """Acknowledge commands received"""
+    try:
+        async for message in ws:
+            if isinstance(message, str) and message.startswith("#"):
+                key, _, payload = message[1:].strip().partition(":")
+                await ws.send(f"#${key}: {payload}\r")
+    except ConnectionClosed:
+        pass
+
+
 async def data_generator(ws: ServerConnection) -> None:
     """Generate data and push to queue"""
     while True:
@@ -29,14 +40,22 @@ class TestServer:
         async with task_manager(cancel_on_exit=True) as task_list:
             message = await websocket.recv()
             _LOGGER.debug("Received %s", message)
+            for key, value in self._identity.items():
+                await websocket.send(f"#{key}: {value}\r")
             task = self._loop.create_task(
                 data_generator(websocket), name="data_generator"
             )
             task_list.add(task)
+            task_list.add(
+                self._loop.create_task(
+                    command_handler(websocket), name="command_handler"
+                )
+            )
             await task_list.wait()
 
-    def __init__(self, host, port, loop=None) -> None:
+    def __init__(self, host, port, loop=None, identity=None) -> None:
         self.port = port
+        self._identity = identity or {}
         self.host = host
         self._stop = None
         self._server: asyncio.Server